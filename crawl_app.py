@@ -5,6 +5,7 @@ Script khởi chạy đơn giản cho ứng dụng CRAWL
 
 import sys
 import os
+import multiprocessing
 from pathlib import Path
 
 def main():
@@ -61,4 +62,6 @@ def main():
         return 1
 
 if __name__ == "__main__":
+    # Cần cho chế độ nhiều process khi đóng gói bằng PyInstaller
+    multiprocessing.freeze_support()
     sys.exit(main()) 
\ No newline at end of file
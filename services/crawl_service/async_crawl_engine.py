@@ -0,0 +1,383 @@
+try:
+    import random, asyncio
+    from urllib.parse import urlparse
+    from concurrent.futures import ThreadPoolExecutor
+    from playwright.async_api import async_playwright
+    from services.crawl_service.browser_pool import USER_AGENTS, STEALTH_INIT_SCRIPT
+    from services.crawl_service.http_fetcher import HttpFetcher
+    from services.crawl_service.request_blocker import RequestBlocker
+    from services.crawl_service.page_loader import (PhaseTimer, load_page_async,
+                                                    detect_block_page_async, looks_like_block_page)
+    from services.crawl_service.rate_limiter import ThrottledError, THROTTLE_STATUSES, link_domain
+    from utils.retry_policy import CircuitOpenError
+    from services.crawl_service.memory_monitor import (MB, JS_HEAP_SCRIPT, browser_root_pids,
+                                                       find_new_browser_pid, process_tree_rss)
+    from services.crawl_service.extractor import (EXTRACTION_HTML, extraction_mode,
+                                                  extract_in_page_async, format_extracted, image_selector_for)
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+
+class AsyncCrawlEngine:
+    """
+    Engine cào dữ liệu song song dựa trên playwright.async_api.
+
+    - Tối đa `max_concurrent` page chạy cùng lúc (semaphore toàn cục).
+    - Mỗi domain có thêm giới hạn riêng (`max_per_domain`, có thể ghi đè bằng
+      key `max_concurrent` của site trong crawl-config.json).
+    - Tốc độ từng domain do DomainRateLimiter quyết định; domain bị 429/503/captcha
+      được giảm tốc mà không chặn các domain khác.
+    - Kết quả được trả về theo thứ tự hoàn thành qua callback `on_result`,
+      callback chạy tuần tự trên một thread riêng để không chặn event loop.
+    - Link cần thử lại được đưa lại vào hàng đợi sau một khoảng chờ (không giữ slot nào
+      trong lúc chờ); domain bị circuit breaker mở mạch được hoãn tới khi mạch đóng lại.
+    - Context được thay mới theo ngưỡng trang / bộ nhớ của BrowserPool (page mới dùng
+      context mới, context cũ đóng khi page cuối cùng của nó xong) để bộ nhớ không tăng dần.
+    - Trình duyệt bị crash / mất kết nối được khởi động lại khi mở page tiếp theo; page đang
+      tải dở trên trình duyệt đã crash được cào lại một lần trên trình duyệt mới.
+    - RSS trình duyệt vượt `max_browser_rss_mb` thì trình duyệt được khởi động lại sau khi
+      các page đang chạy xong (page mới chờ trong lúc đó).
+
+    Tra cứu cấu hình site và bóc tách dữ liệu dùng lại CrawlWorker.
+    """
+
+    def __init__(self, crawl_worker, rate_limiter, max_concurrent: int = 5, max_per_domain: int = 2,
+                 headless: bool = True, circuit_breaker=None):
+        self.crawl_worker = crawl_worker
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_per_domain = max(1, int(max_per_domain))
+        self.headless = headless
+
+        self._global_semaphore = None
+        self._domain_semaphores: dict[str, asyncio.Semaphore] = {}
+        self._http_fetcher = None
+
+        self._playwright = None
+        self._browser = None
+        self._browser_pid = None
+        self._context = None
+        self._context_lock = None
+        self._context_pages = 0
+        self._context_stale = False
+        self._context_inflight = {}
+        self._browser_over_memory = None
+        self._pages_served = 0
+        self.browser_restarts = 0
+        self.context_recycles = 0
+        self.peak_browser_rss = 0
+
+    def _domain_semaphore(self, domain: str, site_config: dict | None) -> asyncio.Semaphore:
+        semaphore = self._domain_semaphores.get(domain)
+        if semaphore is None:
+            limit = self.max_per_domain
+            if site_config and site_config.get("max_concurrent"):
+                limit = max(1, int(site_config["max_concurrent"]))
+            semaphore = asyncio.Semaphore(limit)
+            self._domain_semaphores[domain] = semaphore
+        return semaphore
+
+    async def _launch_browser(self):
+        before = browser_root_pids()
+        self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        self._browser_pid = find_new_browser_pid(before)
+
+    async def _restart_browser(self, reason: str):
+        """Đóng trình duyệt hiện tại và khởi động trình duyệt mới (gọi khi đang giữ _context_lock)."""
+        print(f"[>] Khởi động lại trình duyệt: {reason}")
+        try:
+            await self._browser.close()
+        except Exception:
+            pass
+        # Context của trình duyệt cũ còn page đang chạy được bỏ khi page cuối cùng xong
+        self._context = None
+        self._context_stale = False
+        self._browser_over_memory = None
+        self._context_inflight = {context: count for context, count in self._context_inflight.items() if count}
+        await self._launch_browser()
+        self.browser_restarts += 1
+
+    async def _new_context(self):
+        context = await self._browser.new_context(
+            user_agent=random.choice(USER_AGENTS),
+            viewport={"width": 1920, "height": 1080},
+            locale="en-US",
+        )
+        await context.add_init_script(STEALTH_INIT_SCRIPT)
+        return context
+
+    async def _acquire_context(self):
+        """Lấy context hiện tại cho một page mới, thay context mới nếu context cũ đã quá ngưỡng."""
+        async with self._context_lock:
+            if not self._browser.is_connected():
+                await self._restart_browser("trình duyệt bị crash hoặc mất kết nối")
+            elif self._browser_over_memory:
+                # Chờ các page đang chạy xong rồi mới đóng trình duyệt; page mới chờ ở lock này
+                while any(self._context_inflight.values()):
+                    await asyncio.sleep(0.1)
+                await self._restart_browser(self._browser_over_memory)
+            if self._context is None or self._context_stale:
+                old_context = self._context
+                self._context = await self._new_context()
+                self._context_pages = 0
+                self._context_stale = False
+                if old_context is not None:
+                    self.context_recycles += 1
+                    if not self._context_inflight.get(old_context):
+                        self._context_inflight.pop(old_context, None)
+                        await self._close_context(old_context)
+
+            context = self._context
+            self._context_pages += 1
+            if self._context_pages >= self.crawl_worker.browser_pool.max_pages_per_context:
+                self._context_stale = True
+            self._context_inflight[context] = self._context_inflight.get(context, 0) + 1
+            return context
+
+    @staticmethod
+    async def _close_context(context):
+        try:
+            await context.close()
+        except Exception:
+            # Trình duyệt của context đã crash / đã đóng
+            pass
+
+    async def _release_context(self, context):
+        self._context_inflight[context] -= 1
+        if context is not self._context and self._context_inflight[context] == 0:
+            del self._context_inflight[context]
+            await self._close_context(context)
+
+    async def _check_memory(self, page):
+        """
+        Kiểm tra JS heap của page (vượt ngưỡng thì thay context) và RSS trình duyệt
+        (vượt ngưỡng thì khởi động lại trình duyệt).
+        """
+        pool = self.crawl_worker.browser_pool
+        if pool.max_context_heap:
+            try:
+                heap = await page.evaluate(JS_HEAP_SCRIPT)
+            except Exception:
+                heap = None
+            if heap and heap > pool.max_context_heap:
+                print(f"[>] JS heap {heap / MB:.0f} MB vượt ngưỡng, sẽ tạo context mới")
+                self._context_stale = True
+
+        rss = process_tree_rss(self._browser_pid) if self._browser_pid else None
+        if rss is not None:
+            self.peak_browser_rss = max(self.peak_browser_rss, rss)
+            if pool.max_browser_rss and rss > pool.max_browser_rss:
+                self._browser_over_memory = (f"RSS {rss / MB:.0f} MB vượt ngưỡng "
+                                             f"{pool.max_browser_rss / MB:.0f} MB")
+
+    async def _crawl_browser(self, url: str, site_config: dict, retry_on_crash: bool = True) -> dict | None:
+        product_selector = site_config["product_selector"]
+        mode = extraction_mode(site_config, self.crawl_worker.extraction_mode)
+        blocker = RequestBlocker.from_site_config(site_config)
+        timer = PhaseTimer()
+        html = None
+        extracted = None
+        blocked = False
+
+        context = await self._acquire_context()
+        browser = self._browser
+        page = None
+        crashed = False
+        try:
+            page = await context.new_page()
+            if blocker:
+                await page.route("**/*", blocker.handle_route_async)
+            status = await load_page_async(page, url, site_config, timer)
+            with timer.phase("extract"):
+                if mode == EXTRACTION_HTML or self.crawl_worker.wants_html_snapshot():
+                    html = await page.content()
+                if mode != EXTRACTION_HTML:
+                    extracted = await extract_in_page_async(page, product_selector, image_selector_for(site_config))
+                    blocked = extracted is None and await detect_block_page_async(page)
+        except Exception as e:
+            # "Target closed" do trình duyệt crash không phải lỗi của site: cào lại trên trình duyệt mới
+            crashed = retry_on_crash and not browser.is_connected()
+            if not crashed:
+                raise
+            print(f"[x] Trình duyệt bị crash khi tải {url}: {e}")
+        finally:
+            if page is not None:
+                self._pages_served += 1
+                if not crashed and self._pages_served % self.crawl_worker.browser_pool.memory_check_interval == 0:
+                    await self._check_memory(page)
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+            await self._release_context(context)
+            if blocker:
+                print(f"[>] {url}: {blocker.stats.summary()}")
+            print(f"[>] Thời gian tải {url}: {timer.summary()}")
+
+        if crashed:
+            return await self._crawl_browser(url, site_config, retry_on_crash=False)
+
+        if status in THROTTLE_STATUSES:
+            raise ThrottledError(urlparse(url).netloc, f"HTTP {status}")
+
+        if mode == EXTRACTION_HTML:
+            crawl_output = self.crawl_worker.extract_product_data(html, site_config, url)
+            blocked = crawl_output is None and looks_like_block_page(html)
+        else:
+            if extracted is None and not blocked:
+                print("[x] Không tìm thấy phần tử mô tả!")
+            crawl_output = format_extracted(extracted, url)
+
+        if blocked:
+            raise ThrottledError(urlparse(url).netloc, "captcha")
+
+        self.crawl_worker.save_snapshot(url, html, crawl_output, status)
+        return crawl_output
+
+    async def _crawl_http(self, url: str, site_config: dict) -> dict | None:
+        """Tải trực tiếp qua HTTP, trả về None để fallback sang trình duyệt."""
+        try:
+            html = await self._http_fetcher.fetch_async(url)
+        except ThrottledError:
+            raise
+        except Exception as e:
+            print(f"[x] Lỗi khi tải {url} qua HTTP: {e}")
+            return None
+        crawl_output = self.crawl_worker.extract_product_data(html, site_config, url)
+        if crawl_output:
+            self.crawl_worker.save_snapshot(url, html, crawl_output, 200)
+        return crawl_output
+
+    async def _crawl_one(self, link: dict, should_stop):
+        """Cào một link, trả về (link, crawl_output, error)."""
+        url = link["url"]
+        domain = urlparse(url).netloc
+        site_config = self.crawl_worker.get_site_config_by_domain(domain)
+
+        if not site_config:
+            print(f"[x] Không tìm thấy config cho domain: {domain}")
+            return link, None, None
+
+        product_selector = site_config.get("product_selector")
+        if not product_selector:
+            print("[x] Không có product_selector trong config")
+            return link, None, None
+
+        if self.crawl_worker.reads_snapshots():
+            crawl_output = self.crawl_worker.crawl_product_snapshot(url, site_config)
+            if crawl_output:
+                print(f"[v] Đã lấy dữ liệu {url} từ snapshot!")
+                return link, crawl_output, None
+
+        if self.circuit_breaker:
+            while (wait := self.circuit_breaker.retry_in(link_domain(link))) > 0:
+                if not self.circuit_breaker.defer(link):
+                    return link, None, CircuitOpenError(link_domain(link))
+                # Ngủ từng đoạn ngắn để vẫn phản hồi được yêu cầu dừng
+                while wait > 0:
+                    if should_stop():
+                        return link, None, None
+                    await asyncio.sleep(min(wait, 1))
+                    wait -= 1
+
+        async with self._domain_semaphore(domain, site_config):
+            # Chờ token của domain trước khi chiếm slot toàn cục
+            await self.rate_limiter.acquire_async(link_domain(link))
+            if should_stop():
+                return link, None, None
+
+            async with self._global_semaphore:
+                try:
+                    crawl_output = None
+                    if not site_config.get("requires_js", True):
+                        crawl_output = await self._crawl_http(url, site_config)
+                        if not crawl_output:
+                            print("[>] HTTP không lấy được selector, chuyển sang trình duyệt.")
+
+                    if not crawl_output:
+                        crawl_output = await self._crawl_browser(url, site_config)
+                except ThrottledError as e:
+                    backoff = self.rate_limiter.record_throttled(link_domain(link), e.retry_after)
+                    print(f"[x] {e}, tạm dừng domain {backoff:.0f} giây")
+                    return link, None, e
+                except Exception as e:
+                    return link, None, e
+
+        self.rate_limiter.record_success(link_domain(link))
+        if crawl_output:
+            print(f"[v] Đã cào dữ liệu từ {domain} thành công!")
+        return link, crawl_output, None
+
+    async def _retry_later(self, link: dict, delay: float, should_stop):
+        await asyncio.sleep(delay)
+        if "crawl_output" in link:
+            # Đã cào được, chỉ cần gọi lại bước xử lý kết quả
+            return link, link["crawl_output"], None
+        return await self._crawl_one(link, should_stop)
+
+    async def crawl(self, links: list[dict], on_result, should_stop=lambda: False, more_links=None):
+        """
+        Cào toàn bộ links song song.
+        :param on_result: callable(link, crawl_output, error) gọi theo thứ tự hoàn thành;
+            trả về số giây chờ nếu link cần thử lại (link đã có key `crawl_output` thì
+            không cào lại mà chỉ gọi lại on_result với dữ liệu đó), None nếu đã xong
+        :param should_stop: callable trả về True khi người dùng yêu cầu dừng
+        :param more_links: callable(limit) trả về các link mới tìm thấy trong lúc cào
+            (tối đa `limit`), None khi không còn link nào nữa
+        """
+        self._global_semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._domain_semaphores = {}
+        self._http_fetcher = HttpFetcher(max_connections=self.max_concurrent)
+        loop = asyncio.get_running_loop()
+
+        async with async_playwright() as p:
+            self._playwright = p
+            await self._launch_browser()
+            self._context_lock = asyncio.Lock()
+
+            pending = {asyncio.create_task(self._crawl_one(link, should_stop)) for link in links}
+            with ThreadPoolExecutor(max_workers=1) as result_executor:
+                try:
+                    # Chỉ giữ tối đa ngần này task chờ để link mới không dồn hết vào bộ nhớ
+                    max_pending = self.max_concurrent * 4
+                    while (pending or more_links) and not should_stop():
+                        if more_links and len(pending) < max_pending:
+                            new_links = more_links(max_pending - len(pending))
+                            if new_links is None:
+                                more_links = None
+                            else:
+                                pending.update(asyncio.create_task(self._crawl_one(link, should_stop))
+                                               for link in new_links)
+                        if not pending:
+                            await asyncio.sleep(0.2)
+                            continue
+                        done, pending = await asyncio.wait(pending, timeout=0.5 if more_links else None,
+                                                           return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            link, crawl_output, error = task.result()
+                            retry_delay = await loop.run_in_executor(result_executor, on_result,
+                                                                     link, crawl_output, error)
+                            if retry_delay is not None and not should_stop():
+                                pending.add(asyncio.create_task(
+                                    self._retry_later(link, retry_delay, should_stop)))
+                finally:
+                    for task in pending:
+                        task.cancel()
+                    await asyncio.gather(*pending, return_exceptions=True)
+                    await self._http_fetcher.close_async()
+                    try:
+                        await self._browser.close()
+                    except Exception:
+                        pass
+                    self._browser = self._context = None
+                    self._context_inflight = {}
+                    summary = (f"khởi động lại trình duyệt {self.browser_restarts} lần, "
+                               f"tạo lại context {self.context_recycles} lần")
+                    if self.peak_browser_rss:
+                        summary += f", RSS trình duyệt cao nhất {self.peak_browser_rss / MB:.0f} MB"
+                    print(f"[v] Đã đóng trình duyệt ({summary})")
+
+    def run(self, links: list[dict], on_result, should_stop=lambda: False, more_links=None):
+        """Chạy engine đồng bộ (dùng trong QThread)."""
+        asyncio.run(self.crawl(links, on_result, should_stop, more_links))
@@ -0,0 +1,224 @@
+try:
+    import random
+    from contextlib import contextmanager
+    from playwright.sync_api import sync_playwright, Error as PlaywrightError
+    from services.crawl_service.memory_monitor import (MB, JS_HEAP_SCRIPT, browser_root_pids,
+                                                       find_new_browser_pid, process_tree_rss)
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15 Safari/605.1.15",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/117.0",
+]
+
+STEALTH_INIT_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
+    Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3, 4, 5] });
+    Object.defineProperty(navigator, 'languages', { get: () => ['en-US', 'en'] });
+"""
+
+
+class BrowserSlot:
+    """Một trình duyệt Chromium đang chạy cùng các context được tái sử dụng."""
+
+    def __init__(self, browser, contexts_per_browser: int, pid: int | None = None):
+        self.browser = browser
+        self.pid = pid
+        self.contexts = [new_stealth_context(browser) for _ in range(contexts_per_browser)]
+        self.context_pages = [0] * contexts_per_browser
+        self.context_over_memory = [False] * contexts_per_browser
+        self.pages_served = 0
+        self.next_context = 0
+        self.peak_rss = 0
+
+    def is_alive(self) -> bool:
+        return self.browser.is_connected()
+
+    def rss(self) -> int | None:
+        """RSS của process trình duyệt và các renderer con."""
+        if self.pid is None:
+            return None
+        rss = process_tree_rss(self.pid)
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss, rss)
+        return rss
+
+    def recycle_context(self, context_index: int):
+        try:
+            self.contexts[context_index].close()
+        except PlaywrightError:
+            pass
+        self.contexts[context_index] = new_stealth_context(self.browser)
+        self.context_pages[context_index] = 0
+        self.context_over_memory[context_index] = False
+
+    def close(self):
+        try:
+            self.browser.close()
+        except PlaywrightError:
+            pass
+
+
+def new_stealth_context(browser):
+    """Tạo context với user agent ngẫu nhiên và script ẩn dấu hiệu tự động hoá."""
+    context = browser.new_context(
+        user_agent=random.choice(USER_AGENTS),
+        viewport={"width": 1920, "height": 1080},
+        locale="en-US",
+    )
+    context.add_init_script(STEALTH_INIT_SCRIPT)
+    return context
+
+
+class BrowserPool:
+    """
+    Pool trình duyệt Chromium sống lâu, thuộc sở hữu của CrawlWorker.
+
+    - Giữ sẵn `size` trình duyệt, mỗi trình duyệt có `contexts_per_browser` context.
+    - Mỗi URL dùng một page mới, page luôn được đóng ngay sau khi bóc tách xong.
+    - Context được tạo lại sau `max_pages_per_context` trang hoặc khi JS heap của page
+      vượt `max_context_heap_mb`.
+    - Trình duyệt được khởi động lại sau `max_pages_per_browser` trang, khi RSS của
+      trình duyệt (kể cả renderer) vượt `max_browser_rss_mb`, hoặc khi bị crash.
+      Bộ nhớ được kiểm tra mỗi `memory_check_interval` trang.
+
+    Playwright sync API gắn với thread tạo ra nó, vì vậy pool phải được tạo,
+    sử dụng và đóng trong cùng một thread (CrawlThread.run).
+    """
+
+    def __init__(self, size: int = 1, contexts_per_browser: int = 1,
+                 max_pages_per_browser: int = 100, headless: bool = True,
+                 max_pages_per_context: int = 50, max_browser_rss_mb: float = 1024,
+                 max_context_heap_mb: float = 256, memory_check_interval: int = 5):
+        self.size = max(1, int(size))
+        self.contexts_per_browser = max(1, int(contexts_per_browser))
+        self.max_pages_per_browser = max(1, int(max_pages_per_browser))
+        self.max_pages_per_context = max(1, int(max_pages_per_context))
+        self.max_browser_rss = max_browser_rss_mb * MB if max_browser_rss_mb else None
+        self.max_context_heap = max_context_heap_mb * MB if max_context_heap_mb else None
+        self.memory_check_interval = max(1, int(memory_check_interval))
+        self.headless = headless
+
+        self._playwright = None
+        self._slots: list[BrowserSlot | None] = []
+        self._next_slot = 0
+        self.browser_restarts = 0
+        self.context_recycles = 0
+        self.peak_browser_rss = 0
+
+    def start(self):
+        """Khởi động Playwright và làm nóng các trình duyệt."""
+        if self._playwright is not None:
+            return
+        self._playwright = sync_playwright().start()
+        self._slots = [self._launch_slot() for _ in range(self.size)]
+        print(f"[v] Đã khởi động {self.size} trình duyệt Chromium")
+
+    def _launch_slot(self) -> BrowserSlot:
+        before = browser_root_pids()
+        browser = self._playwright.chromium.launch(headless=self.headless)
+        return BrowserSlot(browser, self.contexts_per_browser, find_new_browser_pid(before))
+
+    def _restart_slot(self, index: int, reason: str):
+        print(f"[>] Khởi động lại trình duyệt #{index}: {reason}")
+        old_slot = self._slots[index]
+        if old_slot:
+            self.peak_browser_rss = max(self.peak_browser_rss, old_slot.peak_rss)
+            old_slot.close()
+            self.browser_restarts += 1
+        self._slots[index] = self._launch_slot()
+
+    def _memory_check_due(self, slot: BrowserSlot) -> bool:
+        return slot.pages_served > 0 and slot.pages_served % self.memory_check_interval == 0
+
+    def _checkout(self):
+        """Chọn slot/context tiếp theo theo vòng tròn, tái tạo context/trình duyệt nếu cần."""
+        if self._playwright is None:
+            self.start()
+
+        index = self._next_slot
+        self._next_slot = (self._next_slot + 1) % self.size
+
+        slot = self._slots[index]
+        if slot is None or not slot.is_alive():
+            self._restart_slot(index, "trình duyệt bị crash hoặc mất kết nối")
+        elif slot.pages_served >= self.max_pages_per_browser:
+            self._restart_slot(index, f"đã phục vụ {slot.pages_served} trang")
+        elif self.max_browser_rss and self._memory_check_due(slot):
+            rss = slot.rss()
+            if rss is not None and rss > self.max_browser_rss:
+                self._restart_slot(index, f"RSS {rss / MB:.0f} MB vượt ngưỡng {self.max_browser_rss / MB:.0f} MB")
+        slot = self._slots[index]
+
+        context_index = slot.next_context
+        slot.next_context = (slot.next_context + 1) % len(slot.contexts)
+
+        if slot.context_over_memory[context_index]:
+            self._recycle_context(slot, context_index, "JS heap vượt ngưỡng")
+        elif slot.context_pages[context_index] >= self.max_pages_per_context:
+            self._recycle_context(slot, context_index, f"đã mở {slot.context_pages[context_index]} trang")
+
+        page = slot.contexts[context_index].new_page()
+        slot.context_pages[context_index] += 1
+        return index, context_index, page
+
+    def _recycle_context(self, slot: BrowserSlot, context_index: int, reason: str):
+        print(f"[>] Tạo lại context #{context_index}: {reason}")
+        slot.recycle_context(context_index)
+        self.context_recycles += 1
+
+    def _check_page_heap(self, slot: BrowserSlot, context_index: int, page):
+        try:
+            heap = page.evaluate(JS_HEAP_SCRIPT)
+        except PlaywrightError:
+            return
+        if heap and heap > self.max_context_heap:
+            slot.context_over_memory[context_index] = True
+
+    @contextmanager
+    def page(self):
+        """
+        Mượn một page mới từ pool. Page luôn bị đóng khi ra khỏi khối with
+        (kể cả khi lỗi) để renderer giải phóng bộ nhớ ngay.
+        """
+        index, context_index, page = self._checkout()
+        slot = self._slots[index]
+        failed = False
+        try:
+            yield page
+        except Exception:
+            failed = True
+            raise
+        finally:
+            slot.pages_served += 1
+            if not failed and self.max_context_heap and self._memory_check_due(slot):
+                self._check_page_heap(slot, context_index, page)
+            try:
+                page.close()
+            except PlaywrightError:
+                pass
+            if failed and not slot.is_alive():
+                self._slots[index] = None
+
+    def memory_summary(self) -> str:
+        peak = max([self.peak_browser_rss] + [slot.peak_rss for slot in self._slots if slot])
+        summary = f"khởi động lại trình duyệt {self.browser_restarts} lần, tạo lại context {self.context_recycles} lần"
+        if peak:
+            summary += f", RSS trình duyệt cao nhất {peak / MB:.0f} MB"
+        return summary
+
+    def close(self):
+        """Đóng toàn bộ trình duyệt và dừng Playwright."""
+        for slot in self._slots:
+            if slot:
+                slot.close()
+        self._slots = []
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except PlaywrightError:
+                pass
+            self._playwright = None
+            print(f"[v] Đã đóng pool trình duyệt ({self.memory_summary()})")
@@ -0,0 +1,63 @@
+try:
+    import os, re, time, hashlib, sqlite3, threading
+    from services.crawl_service.snapshot_store import normalize_url
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+# Ghi vào cột Note của Excel khi sản phẩm không đổi so với lần xử lý trước
+UNCHANGED_NOTE = "unchanged"
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def crawl_output_hash(crawl_output: dict) -> str:
+    """
+    Hash của dữ liệu đã bóc tách sau khi chuẩn hoá: gộp khoảng trắng, bỏ dòng trống,
+    để thay đổi không đáng kể trong HTML (thụt lề, xuống dòng) không bị coi là sản phẩm đổi.
+    """
+    lines = (WHITESPACE_PATTERN.sub(" ", line).strip() for line in crawl_output.get("text", "").splitlines())
+    text = "\n".join(line for line in lines if line)
+    images = "\n".join(url.strip() for url in crawl_output.get("images", []))
+    return hashlib.sha256(f"{text}\n\x00\n{images}".encode("utf-8")).hexdigest()
+
+
+class ChangeDetector:
+    """
+    Ghi nhớ hash nội dung của từng URL ở lần xử lý thành công gần nhất (SQLite), để khi
+    cào lại danh sách định kỳ, sản phẩm không đổi được bỏ qua bước LLM và ghi CSV.
+
+    Hash chỉ được ghi sau khi LLM và CSV thành công, nên sản phẩm lỗi ở lần trước
+    vẫn được xử lý lại dù nội dung không đổi.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS content_hashes (
+                url_key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                processed_at REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def is_unchanged(self, url: str, digest: str) -> bool:
+        with self._lock:
+            row = self._db.execute("SELECT content_hash FROM content_hashes WHERE url_key = ?",
+                                   (normalize_url(url),)).fetchone()
+        return row is not None and row[0] == digest
+
+    def record(self, url: str, digest: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO content_hashes VALUES (?, ?, ?, ?)",
+                (normalize_url(url), url, digest, time.time()),
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
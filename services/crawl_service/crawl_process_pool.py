@@ -0,0 +1,105 @@
+try:
+    import zlib, queue, multiprocessing
+    from collections import Counter
+    from services.crawl_service.rate_limiter import link_domain
+    from utils.retry_policy import ClassifiedError
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+
+def _worker_main(worker_id: int, headless: bool, offline: bool, task_queue, result_queue):
+    """Vòng lặp của process con: nhận link, cào bằng CrawlWorker riêng, gửi kết quả về process cha."""
+    from services.crawl_service.crawl_worker import CrawlWorker
+
+    crawl_worker = CrawlWorker(headless=headless, offline=offline)
+    try:
+        while True:
+            link = task_queue.get()
+            if link is None:
+                break
+            try:
+                crawl_output = crawl_worker.crawl_product(link['url'])
+                result_queue.put((worker_id, link, crawl_output, None))
+            except Exception as e:
+                # Exception của playwright/httpx không chắc pickle được, chỉ gửi loại lỗi + nội dung
+                result_queue.put((worker_id, link, None, ClassifiedError.from_exception(e)))
+    finally:
+        crawl_worker.close()
+
+
+class CrawlProcessPool:
+    """
+    Chạy CrawlWorker trong nhiều process để tận dụng nhiều nhân CPU.
+
+    - Mỗi process có trình duyệt Playwright, HttpFetcher và CrawlWorker riêng;
+      phần tải trang và bóc tách (tốn CPU) chạy song song thật sự, không bị GIL.
+    - Link được chia theo domain: mỗi domain chỉ thuộc một process (gán tham lam
+      theo số link để cân tải), nên rate limit / circuit breaker theo domain vẫn đúng.
+    - Mỗi process chỉ nhận một link một lúc; process cha quyết định link nào được gửi
+      đi và là nơi duy nhất ghi kết quả (LLM, CSV, Excel).
+    """
+
+    def __init__(self, num_workers: int, headless: bool = True, offline: bool = False):
+        self.num_workers = max(1, int(num_workers))
+        self.headless = headless
+        self.offline = offline
+        # spawn: fork từ process đang chạy Qt/Playwright không an toàn
+        self._context = multiprocessing.get_context("spawn")
+        self._result_queue = self._context.Queue()
+        self._task_queues = []
+        self._processes = []
+        self._domain_owner: dict[str, int] = {}
+
+    def assign_domains(self, links: list[dict]):
+        """Gán domain cho process: domain nhiều link nhất vào process đang ít việc nhất."""
+        loads = [0] * self.num_workers
+        for domain, count in Counter(link_domain(link) for link in links).most_common():
+            worker_id = loads.index(min(loads))
+            self._domain_owner[domain] = worker_id
+            loads[worker_id] += count
+
+    def worker_for(self, link: dict) -> int:
+        domain = link_domain(link)
+        worker_id = self._domain_owner.get(domain)
+        if worker_id is None:
+            worker_id = zlib.crc32(domain.encode("utf-8")) % self.num_workers
+            self._domain_owner[domain] = worker_id
+        return worker_id
+
+    def start(self):
+        for worker_id in range(self.num_workers):
+            task_queue = self._context.Queue()
+            process = self._context.Process(
+                target=_worker_main,
+                args=(worker_id, self.headless, self.offline, task_queue, self._result_queue),
+                name=f"crawl-worker-{worker_id}",
+                daemon=True,
+            )
+            process.start()
+            self._task_queues.append(task_queue)
+            self._processes.append(process)
+        print(f"[>] Đã khởi động {self.num_workers} process cào dữ liệu")
+
+    def submit(self, worker_id: int, link: dict):
+        self._task_queues[worker_id].put(link)
+
+    def get_result(self, timeout: float):
+        """Chờ kết quả kế tiếp: (worker_id, link, crawl_output, error) hoặc None nếu hết thời gian."""
+        try:
+            return self._result_queue.get(timeout=timeout)
+        except queue.Empty:
+            for process in self._processes:
+                if not process.is_alive():
+                    raise RuntimeError(f"Process {process.name} đã dừng bất thường (exit code {process.exitcode})")
+            return None
+
+    def close(self):
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for process in self._processes:
+            process.join(timeout=15)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._task_queues.clear()
+        self._processes.clear()
@@ -1,22 +1,75 @@
 try:
-    import os, time, json, random
-    from bs4 import BeautifulSoup
+    import os, json, time
     from urllib.parse import urlparse
-    from playwright.sync_api import sync_playwright
+    from utils.app_config import get_section
     from utils.resource_path import resource_path as path_to
+    from services.crawl_service.browser_pool import BrowserPool
+    from services.crawl_service.http_fetcher import HttpFetcher
+    from services.crawl_service.request_blocker import RequestBlocker
+    from services.crawl_service.page_loader import PhaseTimer, load_page, detect_block_page, looks_like_block_page
+    from services.crawl_service.rate_limiter import ThrottledError, THROTTLE_STATUSES
+    from services.crawl_service.extractor import (EXTRACTION_HTML, HtmlExtractor, extraction_mode,
+                                                  extract_in_page, format_extracted, image_selector_for,
+                                                  serialize_crawl_output, deserialize_crawl_output)
+    from services.crawl_service.snapshot_store import SnapshotStore, KIND_HTML, KIND_EXTRACTED
+    from services.crawl_service.site_index import SiteIndex
 except ImportError as e:
     raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
 
 CRAWL_CONFIG_PATH = path_to("CRAWL/config/crawl-config.json")
 CRAWL_INPUT_FILE = path_to("io/input/product_links_template.xlsx")
 
+# Khoảng thời gian tối thiểu giữa hai lần kiểm tra mtime của crawl-config.json
+CONFIG_RELOAD_CHECK_INTERVAL = 2
+
 # Nếu chưa có file cấu hình cào dữ liệu thì báo lỗi
 if not os.path.exists(CRAWL_CONFIG_PATH):
     raise FileNotFoundError(f"Không tìm thấy file cấu hình cào dữ liệu: {CRAWL_CONFIG_PATH}")
 
 class CrawlWorker:
-    def __init__(self):
+    def __init__(self, headless: bool = True, offline: bool = False):
+        self.config_mtime = os.path.getmtime(CRAWL_CONFIG_PATH)
         self.config_list = self.load_crawl_config()
+        self.site_index = SiteIndex(self.config_list)
+        self._last_reload_check = time.monotonic()
+
+        pool_settings = get_section("browser_pool")
+        self.browser_pool = BrowserPool(
+            size=pool_settings.get("size", 1),
+            contexts_per_browser=pool_settings.get("contexts_per_browser", 1),
+            max_pages_per_browser=pool_settings.get("max_pages_per_browser", 100),
+            headless=headless,
+            max_pages_per_context=pool_settings.get("max_pages_per_context", 50),
+            max_browser_rss_mb=pool_settings.get("max_browser_rss_mb", 1024),
+            max_context_heap_mb=pool_settings.get("max_context_heap_mb", 256),
+            memory_check_interval=pool_settings.get("memory_check_interval", 5),
+        )
+        self.http_fetcher = HttpFetcher()
+        self.last_phase_timings: dict[str, float] = {}
+        default_settings = get_section("default_settings")
+        self.extraction_mode = default_settings.get("extraction_mode", "in_page")
+        self.parser_backend = default_settings.get("parser_backend", "lxml")
+        self._extractors: dict[tuple[str, str, str | None], HtmlExtractor] = {}
+
+        # Snapshot trên đĩa: chế độ offline chỉ bóc tách lại từ snapshot, không tải trang.
+        # Lần chạy thường chỉ ghi snapshot, chỉ đọc lại khi đặt ttl_hours > 0
+        snapshot_settings = get_section("snapshot_store")
+        self.offline = offline
+        self.store_html = snapshot_settings.get("store_html", True)
+        self.snapshot_ttl_hours = snapshot_settings.get("ttl_hours", 0)
+        self.snapshot_store = None
+        if snapshot_settings.get("enabled", False) or offline:
+            self.snapshot_store = SnapshotStore(
+                path_to(snapshot_settings.get("path", "CRAWL/io/snapshots")),
+                ttl_hours=self.snapshot_ttl_hours,
+            )
+
+    def close(self):
+        """Giải phóng pool trình duyệt, HTTP client và kho snapshot, gọi khi CrawlThread kết thúc."""
+        self.browser_pool.close()
+        self.http_fetcher.close()
+        if self.snapshot_store:
+            self.snapshot_store.close()
 
     def load_crawl_config(self):
         """Đọc JSON cấu hình crawl."""
@@ -29,12 +82,36 @@ class CrawlWorker:
         except json.JSONDecodeError as e:
             raise ValueError(f"Lỗi JSON: {e}")
 
+    def reload_config_if_changed(self):
+        """Nạp lại crawl-config.json khi file thay đổi, để job đang chạy nhận site mới."""
+        now = time.monotonic()
+        if now - self._last_reload_check < CONFIG_RELOAD_CHECK_INTERVAL:
+            return
+        self._last_reload_check = now
+
+        try:
+            mtime = os.path.getmtime(CRAWL_CONFIG_PATH)
+        except OSError:
+            return
+        if mtime == self.config_mtime:
+            return
+
+        try:
+            config_list = self.load_crawl_config()
+        except ValueError as e:
+            # File đang được sửa dở: giữ cấu hình cũ, thử lại ở lần sau
+            print(f"[x] Không nạp lại được cấu hình crawl: {e}")
+            return
+
+        self.config_mtime = mtime
+        self.config_list = config_list
+        self.site_index = SiteIndex(config_list)
+        print(f"[v] Đã nạp lại cấu hình crawl ({len(config_list)} site)")
+
     def get_site_config_by_domain(self, domain: str):
-        """Tìm config website khớp với domain."""
-        for site in self.config_list:
-            if site["domain"] in domain:
-                return site
-        return None
+        """Tìm config website khớp với domain (theo hậu tố hostname)."""
+        self.reload_config_if_changed()
+        return self.site_index.lookup(domain)
 
     def product_selector_elements(self, site_config):
         """Trả về selector mô tả sản phẩm."""
@@ -42,7 +119,7 @@ class CrawlWorker:
             return site_config.get("product_selector")
         return None
 
-    def crawl_product(self, url: str) -> str | None:
+    def crawl_product(self, url: str) -> dict | None:
         url_domain = urlparse(url).netloc
         site_config = self.get_site_config_by_domain(url_domain)
 
@@ -55,62 +132,140 @@ class CrawlWorker:
             print("[x] Không có product_selector trong config")
             return None
 
-        with sync_playwright() as p:
-            user_agents = [
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115 Safari/537.36",
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/15 Safari/605.1.15",
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/117.0",
-            ]
-            ua = random.choice(user_agents)
-
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent=ua,
-                viewport={"width": 1920, "height": 1080},
-                locale="en-US",
-            )
+        if self.reads_snapshots():
+            crawl_result = self.crawl_product_snapshot(url, site_config)
+            if crawl_result:
+                print(f"[v] Đã lấy dữ liệu {url} từ snapshot!")
+                return crawl_result
+            if self.offline:
+                print(f"[x] Không có snapshot HTML dùng được cho {url} (chế độ offline)")
+                return None
 
-            page = context.new_page()
-            page.add_init_script("""
-                Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
-                Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3, 4, 5] });
-                Object.defineProperty(navigator, 'languages', { get: () => ['en-US', 'en'] });
-            """)
+        # Site render phía server: thử tải trực tiếp qua HTTP trước
+        if not site_config.get("requires_js", True):
+            crawl_result = self.crawl_product_http(url, site_config)
+            if crawl_result:
+                print(f"[v] Đã cào dữ liệu từ {url_domain} thành công (HTTP)!")
+                return crawl_result
+            print("[>] HTTP không lấy được selector, chuyển sang trình duyệt.")
 
-            print(f"[>] Đang tải {url}")
-            page.goto(url, timeout=60000)
-            page.wait_for_load_state("networkidle")
+        crawl_result = self.crawl_product_browser(url, site_config)
+        if crawl_result is None:
+            return None
 
-            # Cuộn trang để load nội dung
-            for _ in range(5):
-                page.mouse.wheel(0, random.randint(800, 1500))
-                time.sleep(random.uniform(0.8, 1.5))
+        print(f"[v] Đã cào dữ liệu từ {url_domain} thành công!")
+        return crawl_result
 
-            try:
-                page.wait_for_selector(product_selector, timeout=15000)
-            except:
-                print("[x] Không tìm thấy selector, sẽ lấy toàn bộ HTML để kiểm tra.")
+    def crawl_product_snapshot(self, url: str, site_config: dict) -> dict | None:
+        """
+        Lấy dữ liệu từ snapshot còn hạn: snapshot HTML được bóc tách lại bằng selector hiện tại,
+        snapshot khối đã bóc tách được dùng nguyên (trừ chế độ offline, vốn để sửa selector).
+        """
+        snapshot = self.snapshot_store.get(url, KIND_HTML, ignore_ttl=self.offline)
+        if snapshot:
+            return self.extract_product_data(snapshot.content, site_config, snapshot.url)
+        if not self.offline:
+            snapshot = self.snapshot_store.get(url, KIND_EXTRACTED)
+            if snapshot:
+                return deserialize_crawl_output(snapshot.content)
+        return None
 
-            html = page.content()
-            browser.close()
+    def reads_snapshots(self) -> bool:
+        """Có dùng snapshot thay vì tải trang không: luôn dùng khi offline, lần chạy thường chỉ khi ttl_hours > 0."""
+        return self.snapshot_store is not None and (self.offline or self.snapshot_ttl_hours > 0)
 
-        soup = BeautifulSoup(html, "html.parser")
-        desc_tag = soup.select_one(product_selector)
+    def wants_html_snapshot(self) -> bool:
+        """Có cần lấy toàn bộ HTML đã render để lưu snapshot không."""
+        return self.snapshot_store is not None and self.store_html
 
-        if not desc_tag:
-            print("[x] Không tìm thấy phần tử mô tả!")
+    def save_snapshot(self, url: str, html: str | None, crawl_output: dict | None, status: int | None):
+        """Lưu HTML đã render (ưu tiên) hoặc khối đã bóc tách vào kho snapshot."""
+        if not self.snapshot_store:
+            return
+        try:
+            if html:
+                self.snapshot_store.put(url, html, KIND_HTML, status)
+            elif crawl_output:
+                self.snapshot_store.put(url, serialize_crawl_output(crawl_output), KIND_EXTRACTED, status)
+        except Exception as e:
+            print(f"[x] Lỗi khi lưu snapshot {url}: {e}")
+
+    def crawl_product_http(self, url: str, site_config: dict) -> dict | None:
+        """Tải HTML qua HTTP và bóc tách, trả về None nếu lỗi hoặc không thấy selector."""
+        timer = PhaseTimer()
+        self.last_phase_timings = timer.phases
+        try:
+            with timer.phase("fetch"):
+                html = self.http_fetcher.fetch(url)
+        except ThrottledError:
+            raise
+        except Exception as e:
+            print(f"[x] Lỗi khi tải {url} qua HTTP: {e}")
             return None
+        with timer.phase("extract"):
+            crawl_output = self.extract_product_data(html, site_config, url)
+        if crawl_output:
+            self.save_snapshot(url, html, crawl_output, 200)
+        return crawl_output
 
-        result_lines = []
-        for elem in desc_tag.descendants:
-            if elem.name == "img" and elem.get("src"):
-                result_lines.append(elem["src"])
-            elif elem.name is None:
-                text = elem.strip()
-                if text:
-                    result_lines.append(text)
+    def crawl_product_browser(self, url: str, site_config: dict) -> dict | None:
+        """Tải trang bằng Chromium trong pool và bóc tách product_selector."""
+        product_selector = site_config["product_selector"]
+        mode = extraction_mode(site_config, self.extraction_mode)
+        blocker = RequestBlocker.from_site_config(site_config)
+        timer = PhaseTimer()
+        self.last_phase_timings = timer.phases
+        html = None
+        extracted = None
+        blocked = False
 
-        crawl_result = "\n".join(result_lines)
-        print(f"[v] Đã cào dữ liệu từ {url_domain} thành công!")
+        with self.browser_pool.page() as page:
+            if blocker:
+                page.route("**/*", blocker.handle_route)
+            try:
+                status = load_page(page, url, site_config, timer)
+                with timer.phase("extract"):
+                    if mode == EXTRACTION_HTML or self.wants_html_snapshot():
+                        html = page.content()
+                    if mode != EXTRACTION_HTML:
+                        extracted = extract_in_page(page, product_selector, image_selector_for(site_config))
+                        blocked = extracted is None and detect_block_page(page)
+            finally:
+                if blocker:
+                    print(f"[>] {url}: {blocker.stats.summary()}")
+                print(f"[>] Thời gian tải {url}: {timer.summary()}")
 
-        return crawl_result
+        if status in THROTTLE_STATUSES:
+            raise ThrottledError(urlparse(url).netloc, f"HTTP {status}")
+
+        if mode == EXTRACTION_HTML:
+            # Chế độ debug: parse toàn bộ HTML bằng HtmlExtractor
+            crawl_output = self.extract_product_data(html, site_config, url)
+            blocked = crawl_output is None and looks_like_block_page(html)
+        else:
+            if extracted is None and not blocked:
+                print("[x] Không tìm thấy phần tử mô tả!")
+            crawl_output = format_extracted(extracted, url)
+
+        if blocked:
+            raise ThrottledError(urlparse(url).netloc, "captcha")
+
+        self.save_snapshot(url, html, crawl_output, status)
+        return crawl_output
+
+    def get_extractor(self, site_config: dict) -> HtmlExtractor:
+        """Trả về HtmlExtractor của site, selector chỉ được compile một lần."""
+        key = (site_config["product_selector"], site_config.get("parser_backend", self.parser_backend),
+               image_selector_for(site_config))
+        extractor = self._extractors.get(key)
+        if extractor is None:
+            extractor = HtmlExtractor(*key)
+            self._extractors[key] = extractor
+        return extractor
+
+    def extract_product_data(self, html: str, site_config: dict, page_url: str) -> dict | None:
+        """Lấy text bên trong product_selector và URL ảnh theo image_selector (tuyệt đối theo page_url)."""
+        extracted = self.get_extractor(site_config).extract(html)
+        if extracted is None:
+            print("[x] Không tìm thấy phần tử mô tả!")
+        return format_extracted(extracted, page_url)
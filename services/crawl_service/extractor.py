@@ -0,0 +1,239 @@
+try:
+    import re
+    import json
+    import soupsieve
+    from bs4 import BeautifulSoup, SoupStrainer, NavigableString
+    from bs4.element import PreformattedString
+    from services.crawl_service.image_extractor import (IN_PAGE_IMAGE_CANDIDATES_JS, default_image_selector,
+                                                        select_images, soup_image_candidates,
+                                                        lexbor_image_candidates)
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml  # noqa: F401
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+EXTRACTION_IN_PAGE = "in_page"
+EXTRACTION_HTML = "html"
+
+BACKEND_HTML_PARSER = "html.parser"
+BACKEND_LXML = "lxml"
+BACKEND_SELECTOLAX = "selectolax"
+PARSER_BACKENDS = (BACKEND_HTML_PARSER, BACKEND_LXML, BACKEND_SELECTOLAX)
+
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+
+# Compound selector đơn giản đứng đầu selector: tag, tag.class hoặc tag#id
+SIMPLE_COMPOUND_RE = re.compile(r"^([a-zA-Z][a-zA-Z0-9-]*)?(?:([.#])([a-zA-Z_][\w-]*))?$")
+# Combinator con cháu (" ") hoặc con trực tiếp (">") ngăn cách các compound của selector
+DESCENDANT_COMBINATOR_RE = re.compile(r"\s*>\s*|\s+")
+
+# Duyệt cây DOM dưới selector ngay trong trang, theo đúng thứ tự tài liệu, lấy các
+# text node (đã strip), bỏ qua script/style/noscript. Ảnh được thu thập riêng theo
+# image_selector (thuộc tính thô, URL được chọn ở Python bằng image_extractor).
+IN_PAGE_EXTRACT_SCRIPT = """
+({ selector, imageSelector }) => {
+    const root = document.querySelector(selector);
+    if (!root) return null;
+""" + IN_PAGE_IMAGE_CANDIDATES_JS + """
+    const skipped = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);
+    const lines = [];
+    const walker = document.createTreeWalker(
+        root,
+        NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT,
+        {
+            acceptNode: (node) =>
+                node.nodeType === Node.ELEMENT_NODE && skipped.has(node.tagName)
+                    ? NodeFilter.FILTER_REJECT
+                    : NodeFilter.FILTER_ACCEPT,
+        }
+    );
+
+    let node = walker.nextNode();
+    while (node) {
+        if (node.nodeType === Node.TEXT_NODE) {
+            const text = node.nodeValue.trim();
+            if (text) lines.push(text);
+        }
+        node = walker.nextNode();
+    }
+    return { lines, images: collectImageCandidates(imageSelector), base_url: document.baseURI };
+}
+"""
+
+
+def extraction_mode(site_config: dict, default_mode: str = EXTRACTION_IN_PAGE) -> str:
+    """
+    Chế độ bóc tách của site:
+    - "in_page": chạy IN_PAGE_EXTRACT_SCRIPT trong trình duyệt, chỉ trả về text và URL ảnh
+    - "html": lấy toàn bộ HTML (page.content) rồi parse bằng BeautifulSoup, dùng khi debug
+    """
+    return site_config.get("extraction_mode", default_mode)
+
+
+def format_extracted(extracted: dict | None, page_url: str) -> dict | None:
+    """
+    Chuyển kết quả bóc tách thành crawl output: {"text": các dòng text, "images": URL ảnh}.
+    Ảnh được tách riêng khỏi text để không gửi URL thừa cho LLM.
+    """
+    if not extracted:
+        return None
+    return {
+        "text": "\n".join(extracted["lines"]),
+        "images": select_images(extracted.get("images"), extracted.get("base_url") or page_url),
+    }
+
+
+def serialize_crawl_output(crawl_output: dict) -> str:
+    return json.dumps(crawl_output, ensure_ascii=False)
+
+
+def deserialize_crawl_output(content: str) -> dict:
+    """Đọc crawl output từ snapshot; snapshot cũ chỉ lưu chuỗi text."""
+    try:
+        crawl_output = json.loads(content)
+    except ValueError:
+        crawl_output = None
+    if isinstance(crawl_output, dict) and "text" in crawl_output:
+        return crawl_output
+    return {"text": content, "images": []}
+
+
+def image_selector_for(site_config: dict) -> str:
+    return site_config.get("image_selector") or default_image_selector(site_config["product_selector"])
+
+
+def extract_in_page(page, product_selector: str, image_selector: str | None = None) -> dict | None:
+    """Bóc tách trong trang (sync API), None nếu không thấy selector."""
+    return page.evaluate(IN_PAGE_EXTRACT_SCRIPT, {
+        "selector": product_selector,
+        "imageSelector": image_selector or default_image_selector(product_selector),
+    })
+
+
+async def extract_in_page_async(page, product_selector: str, image_selector: str | None = None) -> dict | None:
+    """Phiên bản async của extract_in_page()."""
+    return await page.evaluate(IN_PAGE_EXTRACT_SCRIPT, {
+        "selector": product_selector,
+        "imageSelector": image_selector or default_image_selector(product_selector),
+    })
+
+
+def backend_available(backend: str) -> bool:
+    if backend == BACKEND_LXML:
+        return LXML_AVAILABLE
+    if backend == BACKEND_SELECTOLAX:
+        return LexborHTMLParser is not None
+    return backend == BACKEND_HTML_PARSER
+
+
+def _first_compound(selector: str) -> str:
+    return DESCENDANT_COMBINATOR_RE.split(selector.strip(), maxsplit=1)[0]
+
+
+def subtree_strainer(selector: str) -> SoupStrainer | None:
+    """
+    Tạo SoupStrainer để chỉ parse cây con khớp với compound đầu tiên của selector.
+    Chỉ áp dụng khi selector dùng combinator con cháu (" " hoặc ">"), vì khi đó mọi
+    phần tử khớp đều nằm trong cây con của compound đầu tiên.
+    """
+    if "," in selector or "+" in selector or "~" in selector:
+        return None
+    match = SIMPLE_COMPOUND_RE.match(_first_compound(selector))
+    if not match or not (match.group(1) or match.group(3)):
+        return None
+
+    name, kind, value = match.groups()
+    attrs = {}
+    if kind == ".":
+        # Lúc strain, class có thể vẫn là chuỗi gốc "a b" chưa được tách thành list
+        attrs["class"] = lambda classes: bool(classes) and value in (
+            classes.split() if isinstance(classes, str) else classes)
+    elif kind == "#":
+        attrs["id"] = value
+    return SoupStrainer(name or True, attrs=attrs)
+
+
+class HtmlExtractor:
+    """
+    Bóc tách text dưới product_selector và ứng viên ảnh theo image_selector từ HTML tĩnh.
+
+    Selector được compile một lần khi tạo extractor (CrawlWorker cache extractor
+    theo từng site), backend parser chọn qua `parser_backend`:
+    - "html.parser": BeautifulSoup thuần Python
+    - "lxml": BeautifulSoup với tree builder lxml (C)
+    - "selectolax": selectolax/lexbor, engine selector viết bằng C
+    Với hai backend BeautifulSoup, nếu selector cho phép thì chỉ parse cây con liên quan
+    (khi image_selector nằm ngoài cây con đó thì parse toàn bộ trang).
+    """
+
+    def __init__(self, product_selector: str, backend: str = BACKEND_LXML, image_selector: str | None = None):
+        if not backend_available(backend):
+            print(f"[x] Backend parser '{backend}' chưa được cài, dùng {BACKEND_HTML_PARSER}.")
+            backend = BACKEND_HTML_PARSER
+
+        self.product_selector = product_selector
+        self.image_selector = image_selector or default_image_selector(product_selector)
+        self.backend = backend
+        self.strainer = None
+        self.compiled_selector = None
+        self.compiled_image_selector = None
+
+        if backend != BACKEND_SELECTOLAX:
+            self.compiled_selector = soupsieve.compile(product_selector)
+            self.compiled_image_selector = soupsieve.compile(self.image_selector)
+            if _first_compound(self.image_selector) == _first_compound(product_selector):
+                self.strainer = subtree_strainer(product_selector)
+
+    def extract(self, html: str) -> dict | None:
+        """
+        Trả về {"lines": [...], "images": [ứng viên ảnh]} như IN_PAGE_EXTRACT_SCRIPT,
+        None nếu không thấy selector.
+        """
+        if self.backend == BACKEND_SELECTOLAX:
+            return self._extract_selectolax(html)
+        return self._extract_soup(html)
+
+    def _extract_soup(self, html: str) -> dict | None:
+        soup = BeautifulSoup(html, self.backend, parse_only=self.strainer)
+        desc_tag = self.compiled_selector.select_one(soup)
+        if not desc_tag:
+            return None
+
+        lines = []
+        for elem in desc_tag.descendants:
+            if isinstance(elem, NavigableString):
+                if isinstance(elem, PreformattedString) or elem.parent.name in SKIPPED_TAGS:
+                    continue
+                text = elem.strip()
+                if text:
+                    lines.append(text)
+        images = soup_image_candidates(self.compiled_image_selector.select(soup))
+        return {"lines": lines, "images": images}
+
+    def _extract_selectolax(self, html: str) -> dict | None:
+        parser = LexborHTMLParser(html)
+        desc_node = parser.css_first(self.product_selector)
+        if desc_node is None:
+            return None
+
+        lines = []
+        nodes = desc_node.traverse(include_text=True)
+        next(nodes)  # bỏ qua chính desc_node, giống .descendants của BeautifulSoup
+        for node in nodes:
+            if node.tag == "-text":
+                if node.parent is not None and node.parent.tag in SKIPPED_TAGS:
+                    continue
+                text = node.text_content.strip()
+                if text:
+                    lines.append(text)
+        images = lexbor_image_candidates(parser.css(self.image_selector))
+        return {"lines": lines, "images": images}
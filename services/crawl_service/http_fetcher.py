@@ -0,0 +1,88 @@
+try:
+    import random
+    import httpx
+    from urllib.parse import urlparse
+    from services.crawl_service.browser_pool import USER_AGENTS
+    from services.crawl_service.rate_limiter import ThrottledError, THROTTLE_STATUSES, parse_retry_after
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HttpFetcher:
+    """
+    Tải HTML trực tiếp qua HTTP (không cần trình duyệt) cho các site có requires_js = false.
+
+    Dùng chung một client keep-alive cho mọi request; gzip luôn được hỗ trợ,
+    brotli và HTTP/2 được bật tự động khi đã cài `brotli` / `h2`.
+    """
+
+    def __init__(self, timeout: float = 30, max_connections: int = 20):
+        self.timeout = timeout
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self.headers = {
+            "User-Agent": random.choice(USER_AGENTS),
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+        }
+        self._client = None
+        self._async_client = None
+
+    def _client_kwargs(self) -> dict:
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "timeout": self.timeout,
+            "limits": self.limits,
+            "headers": self.headers,
+            "follow_redirects": True,
+        }
+
+    @staticmethod
+    def _check_response(url: str, response):
+        if response.status_code in THROTTLE_STATUSES:
+            raise ThrottledError(urlparse(url).netloc, f"HTTP {response.status_code}",
+                                 parse_retry_after(response.headers.get("retry-after")))
+        response.raise_for_status()
+
+    def fetch(self, url: str) -> str:
+        """
+        Tải HTML đồng bộ. Raise ThrottledError khi gặp 429/503,
+        httpx.HTTPStatusError với các mã lỗi khác.
+        """
+        if self._client is None:
+            self._client = httpx.Client(**self._client_kwargs())
+        response = self._client.get(url)
+        self._check_response(url, response)
+        return response.text
+
+    def iter_bytes(self, url: str, chunk_size: int = 64 * 1024):
+        """Tải dạng stream, trả về từng chunk bytes (dùng cho sitemap lớn)."""
+        if self._client is None:
+            self._client = httpx.Client(**self._client_kwargs())
+        with self._client.stream("GET", url) as response:
+            self._check_response(url, response)
+            yield from response.iter_bytes(chunk_size)
+
+    async def fetch_async(self, url: str) -> str:
+        """Phiên bản async của fetch() dùng cho AsyncCrawlEngine."""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(**self._client_kwargs())
+        response = await self._async_client.get(url)
+        self._check_response(url, response)
+        return response.text
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def close_async(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
@@ -0,0 +1,183 @@
+try:
+    import re
+    from urllib.parse import urljoin, urldefrag
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+SRC_ATTRIBUTE = "src"
+# Thuộc tính lazy-load phổ biến, thường chứa ảnh thật trong khi src chỉ là placeholder
+LAZY_SRC_ATTRIBUTES = ("data-src", "data-lazy", "data-lazy-src", "data-original", "data-zoom-image")
+SRCSET_ATTRIBUTES = ("srcset", "data-srcset", "data-lazy-srcset")
+IMAGE_ATTRIBUTES = (SRC_ATTRIBUTE,) + LAZY_SRC_ATTRIBUTES + SRCSET_ATTRIBUTES
+
+PLACEHOLDER_PATTERN = re.compile(
+    r"(^|[/_.-])(blank|spacer|placeholder|transparent|pixel|1x1|loader|loading|lazy[-_]?load)[^/]*\.(gif|png|svg|jpe?g|webp)$",
+    re.IGNORECASE,
+)
+
+# Thu thập thuộc tính ảnh thô trong trang (dùng chung cho IN_PAGE_EXTRACT_SCRIPT),
+# việc chọn URL tốt nhất làm ở Python để đường HTML và đường trình duyệt cho cùng kết quả.
+IN_PAGE_IMAGE_CANDIDATES_JS = """
+const collectImageCandidates = (imageSelector) => {
+    const attributeNames = %s;
+    const candidates = [];
+    const addImage = (img) => {
+        const attrs = {};
+        for (const name of attributeNames) {
+            const value = img.getAttribute(name);
+            if (value) attrs[name] = value;
+        }
+        const sources = [];
+        if (img.parentElement && img.parentElement.tagName === 'PICTURE') {
+            for (const source of img.parentElement.querySelectorAll('source')) {
+                const srcset = source.getAttribute('srcset') || source.getAttribute('data-srcset');
+                if (srcset) sources.push(srcset);
+            }
+        }
+        const natural = img.complete && img.naturalWidth ? [img.naturalWidth, img.naturalHeight] : null;
+        candidates.push({ attrs, sources, natural });
+    };
+    for (const element of document.querySelectorAll(imageSelector)) {
+        if (element.tagName === 'IMG') addImage(element);
+        else element.querySelectorAll('img').forEach(addImage);
+    }
+    return candidates;
+};
+""" % ("[" + ", ".join(f"'{name}'" for name in IMAGE_ATTRIBUTES) + "]")
+
+
+def default_image_selector(product_selector: str) -> str:
+    return f"{product_selector} img"
+
+
+def parse_srcset(value: str) -> list[tuple[str, float | None, float | None]]:
+    """
+    Tách srcset thành [(url, width, density)] theo quy tắc của HTML:
+    URL là chuỗi không có khoảng trắng (có thể chứa dấu phẩy), sau đó là descriptor
+    "800w" hoặc "2x" tuỳ chọn, các ứng viên cách nhau bởi dấu phẩy.
+    """
+    candidates = []
+    position = 0
+    length = len(value)
+    while position < length:
+        while position < length and (value[position].isspace() or value[position] == ","):
+            position += 1
+        if position >= length:
+            break
+        end = position
+        while end < length and not value[end].isspace():
+            end += 1
+        url = value[position:end]
+        position = end
+
+        descriptor = ""
+        if url.endswith(","):
+            url = url.rstrip(",")
+        else:
+            comma = value.find(",", position)
+            comma = length if comma == -1 else comma
+            descriptor = value[position:comma].strip()
+            position = comma + 1
+
+        width = density = None
+        match = re.fullmatch(r"(\d+(?:\.\d+)?)([wx])", descriptor)
+        if match:
+            number = float(match.group(1))
+            width, density = (number, None) if match.group(2) == "w" else (None, number)
+        if url:
+            candidates.append((url, width, density))
+    return candidates
+
+
+def is_placeholder(url: str) -> bool:
+    return url.startswith("data:") or bool(PLACEHOLDER_PATTERN.search(url.split("?", 1)[0]))
+
+
+def best_image_url(candidate: dict, base_url: str) -> str | None:
+    """
+    Chọn URL lớn nhất của một ảnh: ưu tiên ứng viên srcset có width lớn nhất,
+    sau đó theo mật độ (2x > 1x); ở cùng mức, URL lazy-load được ưu tiên hơn src
+    vì src thường chỉ là placeholder. Trả về URL tuyệt đối, None nếu chỉ có placeholder.
+    """
+    attrs = candidate.get("attrs") or {}
+    natural = candidate.get("natural")
+    # Ảnh đã tải mà chỉ 1-2px là pixel giữ chỗ
+    src_is_pixel = bool(natural) and natural[0] <= 2 and natural[1] <= 2
+
+    ranked = []
+    srcsets = [attrs[name] for name in SRCSET_ATTRIBUTES if attrs.get(name)]
+    for srcset in list(candidate.get("sources") or []) + srcsets:
+        for url, width, density in parse_srcset(srcset):
+            if width is not None:
+                ranked.append(((2, width, 0), url))
+            else:
+                ranked.append(((1, density or 1.0, 0), url))
+    for name in LAZY_SRC_ATTRIBUTES:
+        if attrs.get(name):
+            ranked.append(((1, 1.0, 1), attrs[name]))
+    if attrs.get(SRC_ATTRIBUTE) and not src_is_pixel:
+        ranked.append(((1, 1.0, 0), attrs[SRC_ATTRIBUTE]))
+
+    for _, url in sorted(ranked, key=lambda item: item[0], reverse=True):
+        url = url.strip()
+        if not url or is_placeholder(url):
+            continue
+        absolute = urldefrag(urljoin(base_url, url))[0]
+        if absolute.startswith(("http://", "https://")):
+            return absolute
+    return None
+
+
+def select_images(candidates: list[dict], base_url: str) -> list[str]:
+    """URL tuyệt đối của các ảnh (đã bỏ placeholder, bỏ trùng, giữ thứ tự xuất hiện)."""
+    images = []
+    seen = set()
+    for candidate in candidates or []:
+        url = best_image_url(candidate, base_url)
+        if url and url not in seen:
+            seen.add(url)
+            images.append(url)
+    return images
+
+
+def _soup_candidate(img) -> dict:
+    attrs = {name: img.get(name) for name in IMAGE_ATTRIBUTES if img.get(name)}
+    sources = []
+    # lxml không biết <source> là thẻ rỗng nên img có thể bị lồng trong source, tìm picture theo tổ tiên
+    picture = img.find_parent("picture")
+    if picture is not None:
+        for source in picture.find_all("source"):
+            srcset = source.get("srcset") or source.get("data-srcset")
+            if srcset:
+                sources.append(srcset)
+    return {"attrs": attrs, "sources": sources, "natural": None}
+
+
+def soup_image_candidates(elements) -> list[dict]:
+    """Ứng viên ảnh từ các phần tử BeautifulSoup khớp image_selector (thẻ img hoặc khối chứa img)."""
+    candidates = []
+    for element in elements:
+        images = [element] if element.name == "img" else element.find_all("img")
+        candidates.extend(_soup_candidate(img) for img in images)
+    return candidates
+
+
+def _lexbor_candidate(img) -> dict:
+    attributes = img.attributes
+    attrs = {name: attributes.get(name) for name in IMAGE_ATTRIBUTES if attributes.get(name)}
+    sources = []
+    if img.parent is not None and img.parent.tag == "picture":
+        for source in img.parent.css("source"):
+            srcset = source.attributes.get("srcset") or source.attributes.get("data-srcset")
+            if srcset:
+                sources.append(srcset)
+    return {"attrs": attrs, "sources": sources, "natural": None}
+
+
+def lexbor_image_candidates(nodes) -> list[dict]:
+    """Như soup_image_candidates() nhưng cho node selectolax."""
+    candidates = []
+    for node in nodes:
+        images = [node] if node.tag == "img" else node.css("img")
+        candidates.extend(_lexbor_candidate(img) for img in images)
+    return candidates
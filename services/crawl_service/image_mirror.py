@@ -0,0 +1,233 @@
+try:
+    import os, csv, time, random, asyncio, hashlib, sqlite3, mimetypes
+    import httpx
+    from urllib.parse import urlparse
+    from services.crawl_service.browser_pool import USER_AGENTS
+    from services.crawl_service.http_fetcher import HTTP2_AVAILABLE
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+# Các cột CSV Shopify chứa URL ảnh
+IMAGE_COLUMNS = ("Image Src", "Variant Image")
+
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/avif": ".avif",
+    "image/svg+xml": ".svg",
+}
+
+
+class MirrorStats:
+    def __init__(self):
+        self.downloaded = 0
+        self.deduplicated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_downloaded = 0
+
+    def summary(self) -> str:
+        return (f"{self.downloaded} ảnh mới, {self.deduplicated} trùng nội dung, "
+                f"{self.skipped} đã có từ trước, {self.failed} lỗi, "
+                f"{self.bytes_downloaded / (1024 * 1024):.1f} MB đã tải")
+
+
+def image_extension(content_type: str | None, url: str) -> str:
+    content_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if content_type in IMAGE_EXTENSIONS:
+        return IMAGE_EXTENSIONS[content_type]
+    extension = os.path.splitext(urlparse(url).path)[1].lower()
+    if extension and mimetypes.guess_type("x" + extension)[0] in IMAGE_EXTENSIONS:
+        return ".jpg" if extension == ".jpeg" else extension
+    return ".img"
+
+
+class ImageMirror:
+    """
+    Tải ảnh sản phẩm về thư mục output để không phụ thuộc CDN của nhà cung cấp
+    (chặn hotlink hoặc chậm khi Shopify import).
+
+    - Tải song song bằng một httpx.AsyncClient dùng chung (keep-alive, HTTP/2 nếu có `h2`),
+      tối đa `max_concurrent` request cùng lúc và `max_per_host` request mỗi host.
+    - File được đặt tên theo SHA-256 nội dung: cùng một ảnh xuất hiện ở nhiều sản phẩm
+      (hoặc nhiều URL) chỉ lưu một lần. Hash chỉ biết được sau khi tải, nên việc gộp này
+      tiết kiệm dung lượng đĩa chứ không tiết kiệm băng thông: cùng URL chỉ tải một lần,
+      nhưng cùng ảnh ở các URL khác nhau vẫn bị tải lại.
+    - Manifest SQLite (URL -> hash, đường dẫn) được ghi sau mỗi ảnh, nên chạy lại
+      sau khi bị dừng sẽ bỏ qua các URL đã tải.
+    - Tham chiếu ảnh được thay bằng `public_base_url` + đường dẫn tương đối của file
+      (hoặc đường dẫn tương đối nếu chưa cấu hình `public_base_url`).
+    """
+
+    def __init__(self, output_folder: str, folder_name: str = "images", public_base_url: str = "",
+                 max_concurrent: int = 16, max_per_host: int = 4, timeout: float = 30):
+        self.output_folder = output_folder
+        self.folder_name = folder_name
+        self.image_dir = os.path.join(output_folder, folder_name)
+        self.public_base_url = public_base_url.rstrip("/")
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_per_host = max(1, int(max_per_host))
+        self.timeout = timeout
+        self.stats = MirrorStats()
+        os.makedirs(self.image_dir, exist_ok=True)
+
+        self._db = sqlite3.connect(os.path.join(self.image_dir, "manifest.sqlite3"))
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                path TEXT NOT NULL,
+                mirrored_at REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def reference_for(self, relative_path: str) -> str:
+        """Giá trị ghi vào CSV thay cho URL gốc."""
+        relative_path = relative_path.replace(os.sep, "/")
+        if self.public_base_url:
+            return f"{self.public_base_url}/{relative_path}"
+        return relative_path
+
+    def is_mirrored_reference(self, value: str) -> bool:
+        if self.public_base_url:
+            return value.startswith(self.public_base_url + "/")
+        return value.startswith(self.folder_name + "/")
+
+    def lookup(self, url: str) -> str | None:
+        """Đường dẫn tương đối của ảnh đã tải (file vẫn còn trên đĩa), None nếu chưa có."""
+        row = self._db.execute("SELECT path FROM images WHERE url = ?", (url,)).fetchone()
+        if row and os.path.exists(os.path.join(self.output_folder, row[0])):
+            return row[0]
+        return None
+
+    def _record(self, url: str, digest: str, relative_path: str):
+        self._db.execute(
+            "INSERT OR REPLACE INTO images (url, content_hash, path, mirrored_at) VALUES (?, ?, ?, ?)",
+            (url, digest, relative_path, time.time()),
+        )
+        self._db.commit()
+
+    async def _download(self, client, url: str, host_limit: asyncio.Semaphore,
+                        global_limit: asyncio.Semaphore) -> str:
+        """Tải một ảnh (stream, vừa tải vừa băm) và trả về đường dẫn tương đối của file."""
+        parsed = urlparse(url)
+        # Nhiều CDN chặn hotlink theo Referer, gửi kèm trang chủ của chính host ảnh
+        headers = {"Referer": f"{parsed.scheme}://{parsed.netloc}/"}
+        async with host_limit, global_limit:
+            async with client.stream("GET", url, headers=headers) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("content-type")
+                if content_type and not content_type.lower().startswith("image/"):
+                    raise ValueError(f"Không phải ảnh ({content_type})")
+
+                digest = hashlib.sha256()
+                temp_path = os.path.join(self.image_dir, f".download-{os.getpid()}-{id(response)}")
+                size = 0
+                try:
+                    with open(temp_path, "wb") as f:
+                        async for chunk in response.aiter_bytes():
+                            digest.update(chunk)
+                            f.write(chunk)
+                            size += len(chunk)
+                    content_hash = digest.hexdigest()
+                    relative_path = os.path.join(self.folder_name, content_hash[:2],
+                                                 content_hash + image_extension(content_type, url))
+                    target = os.path.join(self.output_folder, relative_path)
+                    if os.path.exists(target):
+                        self.stats.deduplicated += 1
+                    else:
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        os.replace(temp_path, target)
+                        self.stats.downloaded += 1
+                        self.stats.bytes_downloaded += size
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+
+        self._record(url, content_hash, relative_path)
+        return relative_path
+
+    async def mirror_async(self, urls) -> dict[str, str]:
+        """Tải các URL chưa có trong manifest; trả về {URL gốc: tham chiếu mới} cho mọi URL tải được."""
+        references = {}
+        pending = []
+        for url in dict.fromkeys(urls):
+            relative_path = self.lookup(url)
+            if relative_path:
+                references[url] = self.reference_for(relative_path)
+                self.stats.skipped += 1
+            else:
+                pending.append(url)
+        if not pending:
+            return references
+
+        global_limit = asyncio.Semaphore(self.max_concurrent)
+        host_limits: dict[str, asyncio.Semaphore] = {}
+        limits = httpx.Limits(max_connections=self.max_concurrent,
+                              max_keepalive_connections=self.max_concurrent)
+        headers = {"User-Agent": random.choice(USER_AGENTS), "Accept": "image/avif,image/webp,image/*,*/*;q=0.8"}
+
+        async with httpx.AsyncClient(http2=HTTP2_AVAILABLE, timeout=self.timeout, limits=limits,
+                                     headers=headers, follow_redirects=True) as client:
+            async def mirror_one(url: str):
+                host = urlparse(url).netloc
+                host_limit = host_limits.setdefault(host, asyncio.Semaphore(self.max_per_host))
+                try:
+                    references[url] = self.reference_for(
+                        await self._download(client, url, host_limit, global_limit))
+                except Exception as e:
+                    self.stats.failed += 1
+                    print(f"[x] Không tải được ảnh {url}: {e}")
+
+            await asyncio.gather(*(mirror_one(url) for url in pending))
+        return references
+
+    def mirror(self, urls) -> dict[str, str]:
+        return asyncio.run(self.mirror_async(urls))
+
+    def rewrite_csv(self, csv_file: str) -> int:
+        """
+        Tải mọi ảnh được tham chiếu trong file CSV Shopify rồi ghi đè các cột ảnh
+        bằng tham chiếu tới bản đã tải. Ảnh tải lỗi giữ nguyên URL gốc.
+        Trả về số ô đã được thay.
+        """
+        with open(csv_file, "r", newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames or []
+            rows = list(reader)
+
+        columns = [column for column in IMAGE_COLUMNS if column in fieldnames]
+        urls = [
+            row[column] for row in rows for column in columns
+            if row.get(column, "").startswith(("http://", "https://"))
+            and not self.is_mirrored_reference(row[column])
+        ]
+        if not urls:
+            return 0
+
+        print(f"[>] Đang tải {len(set(urls))} ảnh về {self.image_dir}")
+        references = self.mirror(urls)
+
+        replaced = 0
+        for row in rows:
+            for column in columns:
+                reference = references.get(row.get(column, ""))
+                if reference:
+                    row[column] = reference
+                    replaced += 1
+
+        # Ghi ra file tạm rồi thay thế để không làm hỏng CSV nếu bị dừng giữa chừng
+        temp_file = csv_file + ".tmp"
+        with open(temp_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(temp_file, csv_file)
+        print(f"[v] Đã tải ảnh: {self.stats.summary()}")
+        return replaced
@@ -0,0 +1,99 @@
+try:
+    import os, time
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+
+# Tên process trình duyệt do Playwright khởi động (chrome, chromium, chrome-headless-shell, ...)
+BROWSER_PROCESS_MARKERS = ("chrom", "headless_shell")
+
+# usedJSHeapSize của page (API riêng của Chromium, null với trình duyệt khác)
+JS_HEAP_SCRIPT = "() => (performance.memory ? performance.memory.usedJSHeapSize : null)"
+
+
+def _is_browser_process(proc) -> bool:
+    name = proc.name().lower()
+    return any(marker in name for marker in BROWSER_PROCESS_MARKERS)
+
+
+def browser_root_pids() -> set[int]:
+    """PID các process trình duyệt gốc (process cha không phải trình duyệt) thuộc process hiện tại."""
+    if psutil is None:
+        return set()
+    roots = set()
+    for proc in psutil.Process().children(recursive=True):
+        try:
+            if not _is_browser_process(proc):
+                continue
+            parent = proc.parent()
+            if parent is None or not _is_browser_process(parent):
+                roots.add(proc.pid)
+        except psutil.Error:
+            continue
+    return roots
+
+
+def find_new_browser_pid(before: set[int]) -> int | None:
+    """So sánh với danh sách trước khi launch để tìm PID trình duyệt vừa khởi động."""
+    new_pids = browser_root_pids() - before
+    return new_pids.pop() if len(new_pids) == 1 else None
+
+
+def process_tree_rss(pid: int | None = None) -> int | None:
+    """
+    Tổng RSS (bytes) của process và toàn bộ process con (renderer, GPU, ...).
+    Bộ nhớ dùng chung giữa các process bị tính nhiều lần nên đây là ước lượng trên.
+    """
+    if psutil is None:
+        return None
+    try:
+        root = psutil.Process(pid or os.getpid())
+        total = root.memory_info().rss
+        for child in root.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+    except psutil.Error:
+        return None
+
+
+class MemoryMonitor:
+    """
+    Theo dõi RSS của cả cây process (Python, Playwright driver, trình duyệt, process con
+    ở chế độ nhiều process) trong một job, lấy mẫu tối đa mỗi `interval` giây.
+    """
+
+    def __init__(self, pid: int | None = None, interval: float = 2.0):
+        self.pid = pid
+        self.interval = interval
+        self.peak_bytes = 0
+        self.last_bytes = 0
+        self._last_sample_at = 0.0
+
+    @property
+    def available(self) -> bool:
+        return psutil is not None
+
+    def sample(self, force: bool = False) -> int | None:
+        now = time.monotonic()
+        if not force and now - self._last_sample_at < self.interval:
+            return self.last_bytes
+        self._last_sample_at = now
+        rss = process_tree_rss(self.pid)
+        if rss is not None:
+            self.last_bytes = rss
+            self.peak_bytes = max(self.peak_bytes, rss)
+        return rss
+
+    def summary(self) -> str:
+        if not self.available:
+            return "không đo được bộ nhớ (chưa cài psutil)"
+        return f"RSS hiện tại {self.last_bytes / MB:.0f} MB, đỉnh {self.peak_bytes / MB:.0f} MB"
@@ -0,0 +1,226 @@
+"""
+Các bước xử lý trang dùng chung cho CrawlWorker (sync) và AsyncCrawlEngine (async).
+
+Logic chính được viết bằng JavaScript và chạy trong trang qua page.evaluate,
+nhờ vậy bản sync và async chỉ khác nhau ở lời gọi await.
+"""
+import re
+import time
+from contextlib import contextmanager
+
+DEFAULT_WAIT_UNTIL = "domcontentloaded"
+DEFAULT_GOTO_TIMEOUT = 60
+DEFAULT_SELECTOR_TIMEOUT = 15
+DEFAULT_SCROLL_MAX_SECONDS = 8
+DEFAULT_SCROLL_SETTLE_MS = 400
+
+# Cuộn từng màn hình một, dừng khi cây DOM dưới selector không còn lớn thêm,
+# khi đã tới cuối trang hoặc khi hết thời gian cho phép.
+ADAPTIVE_SCROLL_SCRIPT = """
+async ({ selector, maxMs, settleMs }) => {
+    const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+    const measure = () => {
+        const root = (selector && document.querySelector(selector)) || document.body;
+        return root.getElementsByTagName('*').length + ':' + (root.textContent || '').length;
+    };
+    const atBottom = () =>
+        window.innerHeight + window.scrollY >= document.documentElement.scrollHeight - 2;
+
+    const start = performance.now();
+    let last = measure();
+    let stableRounds = 0;
+    let steps = 0;
+    let reason = 'timeout';
+
+    while (performance.now() - start < maxMs) {
+        window.scrollBy(0, window.innerHeight);
+        steps += 1;
+        await sleep(settleMs);
+
+        const current = measure();
+        if (current === last) {
+            stableRounds += 1;
+        } else {
+            stableRounds = 0;
+            last = current;
+        }
+
+        if (atBottom() && stableRounds >= 1) { reason = 'bottom'; break; }
+        if (stableRounds >= 2) { reason = 'stable'; break; }
+    }
+    return { steps, elapsedMs: Math.round(performance.now() - start), reason };
+}
+"""
+
+
+def scroll_arguments(site_config: dict) -> dict | None:
+    """Tham số cho ADAPTIVE_SCROLL_SCRIPT, None nếu site không cần cuộn (scroll_to_load = false)."""
+    if not site_config.get("scroll_to_load", False):
+        return None
+    return {
+        "selector": site_config.get("product_selector"),
+        "maxMs": int(float(site_config.get("scroll_max_seconds", DEFAULT_SCROLL_MAX_SECONDS)) * 1000),
+        "settleMs": int(site_config.get("scroll_settle_ms", DEFAULT_SCROLL_SETTLE_MS)),
+    }
+
+
+def adaptive_scroll(page, site_config: dict) -> dict | None:
+    """Cuộn trang (sync API) nếu site bật scroll_to_load, trả về thống kê của lần cuộn."""
+    arguments = scroll_arguments(site_config)
+    if arguments is None:
+        return None
+    return page.evaluate(ADAPTIVE_SCROLL_SCRIPT, arguments)
+
+
+async def adaptive_scroll_async(page, site_config: dict) -> dict | None:
+    """Phiên bản async của adaptive_scroll()."""
+    arguments = scroll_arguments(site_config)
+    if arguments is None:
+        return None
+    return await page.evaluate(ADAPTIVE_SCROLL_SCRIPT, arguments)
+
+
+# Dấu hiệu trang chặn bot / captcha, chỉ kiểm tra khi không tìm thấy product_selector
+BLOCK_PAGE_PATTERN = r"captcha|are you a robot|verify you are human|unusual traffic|cf-challenge|access denied"
+BLOCK_PAGE_SELECTORS = "iframe[src*='captcha'], #challenge-form, .g-recaptcha, .h-captcha, #cf-challenge-running"
+
+BLOCK_PAGE_SCRIPT = """
+({ pattern, selectors }) => {
+    if (document.querySelector(selectors)) return true;
+    const text = document.title + ' ' + (document.body ? document.body.innerText.slice(0, 5000) : '');
+    return new RegExp(pattern, 'i').test(text);
+}
+"""
+
+
+def looks_like_block_page(html: str) -> bool:
+    """Kiểm tra HTML tĩnh có phải trang captcha / chặn truy cập không."""
+    return re.search(BLOCK_PAGE_PATTERN, html[:200_000], re.IGNORECASE) is not None
+
+
+def detect_block_page(page) -> bool:
+    return page.evaluate(BLOCK_PAGE_SCRIPT, {"pattern": BLOCK_PAGE_PATTERN, "selectors": BLOCK_PAGE_SELECTORS})
+
+
+async def detect_block_page_async(page) -> bool:
+    return await page.evaluate(BLOCK_PAGE_SCRIPT, {"pattern": BLOCK_PAGE_PATTERN, "selectors": BLOCK_PAGE_SELECTORS})
+
+
+# Chờ tới khi nội dung dưới selector không đổi trong stableMs mili giây
+TEXT_STABLE_SCRIPT = """
+({ selector, stableMs }) => {
+    const el = document.querySelector(selector);
+    if (!el) return false;
+    const snapshot = el.getElementsByTagName('*').length + ':' + (el.textContent || '').length;
+    const now = performance.now();
+    if (window.__crawlSnapshot !== snapshot) {
+        window.__crawlSnapshot = snapshot;
+        window.__crawlStableSince = now;
+        return false;
+    }
+    return now - window.__crawlStableSince >= stableMs;
+}
+"""
+
+
+class PhaseTimer:
+    """Đo thời gian từng giai đoạn tải trang (goto, selector, scroll, ...) để tinh chỉnh site."""
+
+    def __init__(self):
+        self.phases: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + (time.perf_counter() - start) * 1000
+
+    def summary(self) -> str:
+        return " ".join(f"{name}={ms:.0f}ms" for name, ms in self.phases.items())
+
+
+def readiness_options(site_config: dict) -> dict:
+    """
+    Chiến lược xác định trang "sẵn sàng" của một site:
+    - wait_until: sự kiện của page.goto, mặc định "domcontentloaded" (không chờ networkidle)
+    - goto_timeout / selector_timeout: số giây tối đa cho từng giai đoạn
+    - text_stable_ms: nếu > 0, chờ nội dung product_selector ổn định trong bấy nhiêu ms
+    """
+    return {
+        "wait_until": site_config.get("wait_until", DEFAULT_WAIT_UNTIL),
+        "goto_timeout": int(float(site_config.get("goto_timeout", DEFAULT_GOTO_TIMEOUT)) * 1000),
+        "selector_timeout": int(float(site_config.get("selector_timeout", DEFAULT_SELECTOR_TIMEOUT)) * 1000),
+        "text_stable_ms": int(site_config.get("text_stable_ms", 0)),
+    }
+
+
+def load_page(page, url: str, site_config: dict, timer: PhaseTimer) -> int | None:
+    """Tải trang (sync API) tới khi product_selector dùng được để bóc tách, trả về HTTP status."""
+    product_selector = site_config["product_selector"]
+    options = readiness_options(site_config)
+
+    print(f"[>] Đang tải {url}")
+    with timer.phase("goto"):
+        response = page.goto(url, timeout=options["goto_timeout"], wait_until=options["wait_until"])
+
+    with timer.phase("selector"):
+        try:
+            page.wait_for_selector(product_selector, state="attached", timeout=options["selector_timeout"])
+        except Exception:
+            print("[x] Không tìm thấy selector trong thời gian chờ, vẫn thử bóc tách.")
+
+    # Cuộn trang để load nội dung lazy-load (chỉ khi site bật scroll_to_load)
+    with timer.phase("scroll"):
+        scroll_stats = adaptive_scroll(page, site_config)
+    if scroll_stats:
+        print(f"[>] Đã cuộn {scroll_stats['steps']} lần ({scroll_stats['reason']})")
+
+    if options["text_stable_ms"] > 0:
+        with timer.phase("stable"):
+            try:
+                page.wait_for_function(
+                    TEXT_STABLE_SCRIPT,
+                    arg={"selector": product_selector, "stableMs": options["text_stable_ms"]},
+                    polling=100, timeout=options["selector_timeout"],
+                )
+            except Exception:
+                print("[x] Nội dung chưa ổn định, tiếp tục bóc tách.")
+
+    return response.status if response else None
+
+
+async def load_page_async(page, url: str, site_config: dict, timer: PhaseTimer) -> int | None:
+    """Phiên bản async của load_page()."""
+    product_selector = site_config["product_selector"]
+    options = readiness_options(site_config)
+
+    print(f"[>] Đang tải {url}")
+    with timer.phase("goto"):
+        response = await page.goto(url, timeout=options["goto_timeout"], wait_until=options["wait_until"])
+
+    with timer.phase("selector"):
+        try:
+            await page.wait_for_selector(product_selector, state="attached", timeout=options["selector_timeout"])
+        except Exception:
+            print("[x] Không tìm thấy selector trong thời gian chờ, vẫn thử bóc tách.")
+
+    with timer.phase("scroll"):
+        scroll_stats = await adaptive_scroll_async(page, site_config)
+    if scroll_stats:
+        print(f"[>] Đã cuộn {scroll_stats['steps']} lần ({scroll_stats['reason']})")
+
+    if options["text_stable_ms"] > 0:
+        with timer.phase("stable"):
+            try:
+                await page.wait_for_function(
+                    TEXT_STABLE_SCRIPT,
+                    arg={"selector": product_selector, "stableMs": options["text_stable_ms"]},
+                    polling=100, timeout=options["selector_timeout"],
+                )
+            except Exception:
+                print("[x] Nội dung chưa ổn định, tiếp tục bóc tách.")
+
+    return response.status if response else None
+
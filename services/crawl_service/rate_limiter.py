@@ -0,0 +1,234 @@
+try:
+    import time, random, asyncio, threading
+    from collections import deque, OrderedDict
+    from urllib.parse import urlparse
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+THROTTLE_STATUSES = {429, 503}
+
+
+class ThrottledError(Exception):
+    """Site trả về 429/503 hoặc trang captcha: domain cần được giảm tốc."""
+
+    def __init__(self, domain: str, reason: str, retry_after: float | None = None):
+        super().__init__(f"{domain} đang giới hạn truy cập ({reason})")
+        self.domain = domain
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Đọc header Retry-After dạng số giây (bỏ qua dạng ngày giờ)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class DomainBucket:
+    def __init__(self, rate: float, burst: int):
+        self.base_rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.multiplier = 1.0
+        self.cooldown_until = 0.0
+        self.throttle_count = 0
+
+    @property
+    def rate(self) -> float:
+        return self.base_rate * self.multiplier
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        self.refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.cooldown_until - now)
+
+
+class DomainRateLimiter:
+    """
+    Giới hạn tốc độ theo từng domain bằng token bucket.
+
+    - Mỗi domain có bucket riêng với tốc độ `rate` request/giây (mặc định 1 / delay
+      của giao diện) và dung lượng `burst`; `rate_for(domain)` cho phép từng site
+      ghi đè tốc độ (key `rate_per_second` trong crawl-config.json).
+    - Khi gặp 429/503/captcha: tốc độ domain giảm một nửa và domain nghỉ một khoảng
+      backoff tăng dần theo lũy thừa 2 (hoặc theo Retry-After nếu có).
+    - Mỗi lần thành công tốc độ tăng lại dần theo `recovery_factor` tới mức ban đầu.
+    Domain đang nghỉ không chặn các domain khác.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, backoff_seconds: float = 30,
+                 max_backoff_seconds: float = 600, recovery_factor: float = 1.25,
+                 min_multiplier: float = 0.05, rate_for=None):
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, int(burst))
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.recovery_factor = recovery_factor
+        self.min_multiplier = min_multiplier
+        self.rate_for = rate_for
+        self._buckets: dict[str, DomainBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, domain: str) -> DomainBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            rate = self.rate_for(domain) if self.rate_for else None
+            bucket = DomainBucket(max(float(rate), 0.001) if rate else self.rate, self.burst)
+            self._buckets[domain] = bucket
+        return bucket
+
+    def wait_time(self, domain: str) -> float:
+        """Số giây phải chờ trước khi domain có token."""
+        with self._lock:
+            return self._bucket(domain).wait_time(time.monotonic())
+
+    def try_acquire(self, domain: str) -> float:
+        """Lấy một token nếu có ngay, trả về 0; ngược lại trả về số giây cần chờ."""
+        with self._lock:
+            bucket = self._bucket(domain)
+            wait = bucket.wait_time(time.monotonic())
+            if wait <= 0:
+                bucket.tokens -= 1
+            return wait
+
+    def acquire(self, domain: str, sleep=time.sleep):
+        while True:
+            wait = self.try_acquire(domain)
+            if wait <= 0:
+                return
+            sleep(wait)
+
+    async def acquire_async(self, domain: str):
+        while True:
+            wait = self.try_acquire(domain)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record_success(self, domain: str):
+        with self._lock:
+            bucket = self._bucket(domain)
+            bucket.throttle_count = 0
+            bucket.multiplier = min(1.0, bucket.multiplier * self.recovery_factor)
+
+    def record_throttled(self, domain: str, retry_after: float | None = None) -> float:
+        """Giảm tốc domain sau khi bị chặn, trả về số giây domain phải nghỉ."""
+        with self._lock:
+            bucket = self._bucket(domain)
+            bucket.throttle_count += 1
+            bucket.multiplier = max(self.min_multiplier, bucket.multiplier / 2)
+            backoff = retry_after
+            if backoff is None:
+                backoff = min(self.max_backoff_seconds,
+                              self.backoff_seconds * 2 ** (bucket.throttle_count - 1))
+                backoff *= random.uniform(0.8, 1.2)
+            now = time.monotonic()
+            bucket.cooldown_until = max(bucket.cooldown_until, now + backoff)
+            bucket.tokens = 0
+            bucket.updated_at = now
+            return backoff
+
+
+def link_domain(link: dict) -> str:
+    return urlparse(link["url"]).netloc.lower()
+
+
+# Số link tối đa lấy thêm vào hàng đợi mỗi lần khi link được tìm thấy dần trong lúc cào
+REFILL_SIZE = 50
+
+
+class LinkScheduler:
+    """
+    Lập lịch cho vòng lặp tuần tự: trả về link kế tiếp của domain sẵn sàng sớm nhất,
+    giữ nguyên thứ tự các link trong cùng một domain. Domain đang nghỉ không làm
+    các domain khác phải chờ.
+
+    Link cần thử lại được `push` vào cuối hàng đợi của domain kèm thời điểm sớm nhất
+    được chạy, nên vòng lặp không phải ngủ chờ link lỗi.
+    """
+
+    def __init__(self, links: list[dict], limiter: DomainRateLimiter, needs_token: bool = True):
+        self.limiter = limiter
+        self.needs_token = needs_token
+        self._queues: OrderedDict[str, deque] = OrderedDict()
+        for link in links:
+            self.push(link, needs_token=needs_token)
+
+    def push(self, link: dict, delay: float = 0.0, needs_token: bool = True):
+        """
+        Thêm link vào cuối hàng đợi domain, chạy được sau `delay` giây.
+        `needs_token=False` cho các bước không gửi request tới site (vd. gọi lại LLM).
+        """
+        ready_at = time.monotonic() + delay
+        self._queues.setdefault(link_domain(link), deque()).append((ready_at, needs_token, link))
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _wait_time(self, domain: str, now: float) -> float:
+        ready_at, needs_token, _ = self._queues[domain][0]
+        wait = ready_at - now
+        if needs_token:
+            wait = max(wait, self.limiter.wait_time(domain))
+        return wait
+
+    def pop_ready(self) -> tuple[dict | None, float]:
+        """
+        Lấy link sẵn sàng sớm nhất mà không chờ: trả về (link, 0) nếu có,
+        ngược lại (None, số giây tới khi có link sẵn sàng).
+        """
+        if not self._queues:
+            return None, 0.0
+
+        now = time.monotonic()
+        waits = {domain: self._wait_time(domain, now) for domain in self._queues}
+        domain = min(waits, key=waits.get)
+        if waits[domain] > 0:
+            return None, waits[domain]
+
+        queue = self._queues[domain]
+        _, needs_token, link = queue.popleft()
+        if not queue:
+            del self._queues[domain]
+        if needs_token:
+            self.limiter.try_acquire(domain)
+        return link, 0.0
+
+    def iter_ready(self, sleep, should_stop=lambda: False, more_links=None):
+        """
+        :param more_links: callable(limit) trả về các link mới tìm thấy (tối đa `limit`),
+            None khi không còn link nào nữa (vd. đã duyệt xong sitemap)
+        """
+        while True:
+            if should_stop():
+                return
+
+            if more_links is not None and len(self) < REFILL_SIZE:
+                new_links = more_links(REFILL_SIZE - len(self))
+                if new_links is None:
+                    more_links = None
+                else:
+                    for link in new_links:
+                        self.push(link, needs_token=self.needs_token)
+
+            if not self._queues:
+                if more_links is None:
+                    return
+                sleep(0.2)
+                continue
+
+            link, wait = self.pop_ready()
+            if link is None:
+                # Ngủ từng đoạn ngắn để vẫn phản hồi được yêu cầu dừng
+                sleep(min(wait, 0.5))
+                continue
+            yield link
@@ -0,0 +1,106 @@
+DEFAULT_BLOCKED_RESOURCE_TYPES = ["image", "media", "font"]
+
+DEFAULT_BLOCKED_URL_PATTERNS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "connect.facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "tiktok.com/i18n/pixel",
+    # Chỉ khớp hostname bắt đầu bằng "analytics." (vd. https://analytics.example.com/...),
+    # không chặn nhầm đường dẫn của site như /js/analytics.bundle.js
+    "//analytics.",
+    "/gtag/js",
+]
+
+# Dung lượng trung bình của từng loại resource, dùng để ước tính số byte tiết kiệm
+# (request bị chặn thì không tải nên không biết kích thước thật)
+ESTIMATED_RESOURCE_BYTES = {
+    "image": 80_000,
+    "media": 500_000,
+    "font": 40_000,
+    "script": 50_000,
+    "stylesheet": 30_000,
+}
+DEFAULT_ESTIMATED_BYTES = 10_000
+
+
+class BlockStats:
+    """Thống kê request bị chặn / được phép trên một trang."""
+
+    def __init__(self):
+        self.blocked_requests = 0
+        self.allowed_requests = 0
+        self.estimated_bytes_saved = 0
+        self.blocked_by_type: dict[str, int] = {}
+
+    def record_blocked(self, resource_type: str):
+        self.blocked_requests += 1
+        self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+        self.estimated_bytes_saved += ESTIMATED_RESOURCE_BYTES.get(resource_type, DEFAULT_ESTIMATED_BYTES)
+
+    def summary(self) -> str:
+        by_type = ", ".join(f"{k}={v}" for k, v in sorted(self.blocked_by_type.items()))
+        return (f"chặn {self.blocked_requests}/{self.blocked_requests + self.allowed_requests} request"
+                f" ({by_type or 'không có'}), ước tính tiết kiệm ~{self.estimated_bytes_saved // 1024} KB"
+                f" (theo dung lượng trung bình)")
+
+
+class RequestBlocker:
+    """
+    Chặn request không cần thiết (ảnh, font, media, tracker) bằng page.route.
+
+    Chính sách lấy từ key `block_resources` của site trong crawl-config.json:
+        "block_resources": {
+            "resource_types": ["image", "media", "font"],
+            "url_patterns": ["google-analytics.com"]
+        }
+    Bỏ trống key để dùng danh sách mặc định, đặt `false` để tắt chặn cho site đó.
+    URL ảnh vẫn được đọc từ thuộc tính src nên chặn ảnh không làm mất dữ liệu.
+    """
+
+    def __init__(self, resource_types, url_patterns):
+        self.resource_types = set(resource_types)
+        self.url_patterns = list(url_patterns)
+        self.stats = BlockStats()
+
+    @classmethod
+    def from_site_config(cls, site_config: dict):
+        """Tạo blocker theo cấu hình site, trả về None nếu site tắt chặn."""
+        policy = site_config.get("block_resources", {})
+        if policy is False:
+            return None
+        if not isinstance(policy, dict):
+            policy = {}
+        return cls(
+            policy.get("resource_types", DEFAULT_BLOCKED_RESOURCE_TYPES),
+            policy.get("url_patterns", DEFAULT_BLOCKED_URL_PATTERNS),
+        )
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.resource_types:
+            return True
+        return any(pattern in url for pattern in self.url_patterns)
+
+    def handle_route(self, route):
+        """Handler cho playwright.sync_api."""
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.stats.record_blocked(request.resource_type)
+            route.abort()
+        else:
+            self.stats.allowed_requests += 1
+            route.continue_()
+
+    async def handle_route_async(self, route):
+        """Handler cho playwright.async_api."""
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.stats.record_blocked(request.resource_type)
+            await route.abort()
+        else:
+            self.stats.allowed_requests += 1
+            await route.continue_()
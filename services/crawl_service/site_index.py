@@ -0,0 +1,43 @@
+class SiteIndex:
+    """
+    Chỉ mục hostname -> cấu hình site, dạng trie theo nhãn domain đảo ngược
+    ("shop.example.com" -> com -> example -> shop).
+
+    Tra cứu chỉ tốn O(số nhãn của hostname) thay vì quét toàn bộ danh sách site,
+    và chỉ khớp theo ranh giới nhãn: "example.com" khớp "example.com" và
+    "shop.example.com" nhưng không khớp "notexample.com.vn". Khi nhiều domain
+    cùng khớp, domain dài nhất (cụ thể nhất) được chọn.
+    """
+
+    def __init__(self, websites: list[dict]):
+        self._root: dict = {}
+        for site in websites:
+            domain = self.normalize_host(site.get("domain", ""))
+            if not domain:
+                continue
+            node = self._root
+            for label in reversed(domain.split(".")):
+                node = node.setdefault(label, {})
+            # Giữ site khai báo trước nếu trùng domain, giống cách quét tuần tự cũ
+            node.setdefault(None, site)
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        """Bỏ scheme/user/port, dấu chấm cuối và hạ chữ thường."""
+        host = host.strip().lower()
+        if "://" in host:
+            host = host.split("://", 1)[1]
+        host = host.split("/", 1)[0].rsplit("@", 1)[-1]
+        if not host.startswith("["):
+            host = host.split(":", 1)[0]
+        return host.rstrip(".")
+
+    def lookup(self, host: str) -> dict | None:
+        node = self._root
+        match = None
+        for label in reversed(self.normalize_host(host).split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            match = node.get(None, match)
+        return match
@@ -0,0 +1,151 @@
+try:
+    import os, time, hashlib, sqlite3, threading
+    from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+    import zlib
+
+KIND_HTML = "html"
+KIND_EXTRACTED = "extracted"
+
+TRACKING_PARAMS = {"fbclid", "gclid", "msclkid", "yclid", "_ga", "ref", "srsltid"}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Chuẩn hoá URL để làm khoá snapshot: hạ chữ thường scheme/host, bỏ fragment,
+    bỏ tham số tracking (utm_*, fbclid, ...), sắp xếp query và bỏ dấu / cuối path.
+    """
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), host, path, urlencode(query), ""))
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class Snapshot:
+    def __init__(self, url: str, kind: str, status: int | None, fetched_at: float,
+                 content_hash: str, content: str):
+        self.url = url
+        self.kind = kind
+        self.status = status
+        self.fetched_at = fetched_at
+        self.content_hash = content_hash
+        self.content = content
+
+    def age_seconds(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class SnapshotStore:
+    """
+    Kho snapshot trang đã tải trên đĩa, để chạy lại job hoặc sửa selector không phải tải lại.
+
+    - Nội dung (HTML đã render hoặc khối đã bóc tách) nén zstd (fallback zlib), lưu theo
+      content hash nên các trang trùng nội dung chỉ tốn một blob.
+    - Chỉ mục SQLite: URL đã chuẩn hoá -> loại nội dung, thời điểm tải, status, hash.
+    - Snapshot quá `ttl_hours` bị coi là hết hạn (trừ khi đọc ở chế độ offline).
+
+    Có thể dùng từ nhiều thread (AsyncCrawlEngine + thread xử lý kết quả).
+    """
+
+    def __init__(self, root_dir: str, ttl_hours: float = 168):
+        self.root_dir = root_dir
+        self.blob_dir = os.path.join(root_dir, "blobs")
+        self.ttl_seconds = ttl_hours * 3600
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root_dir, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                url_key TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                status INTEGER,
+                fetched_at REAL NOT NULL,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (url_key, kind)
+            )
+        """)
+        self._db.commit()
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest + (".zst" if zstandard else ".z"))
+
+    def _write_blob(self, digest: str, content: str):
+        path = self._blob_path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = content.encode("utf-8")
+        data = zstandard.ZstdCompressor(level=6).compress(data) if zstandard else zlib.compress(data, 6)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read_blob(self, digest: str) -> str | None:
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        data = zstandard.ZstdDecompressor().decompress(data) if zstandard else zlib.decompress(data)
+        return data.decode("utf-8")
+
+    def put(self, url: str, content: str, kind: str = KIND_HTML, status: int | None = None) -> str:
+        """Lưu snapshot của URL, trả về content hash."""
+        digest = content_hash(content)
+        self._write_blob(digest, content)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), kind, url, status, time.time(), digest),
+            )
+            self._db.commit()
+        return digest
+
+    def get(self, url: str, kind: str = KIND_HTML, ignore_ttl: bool = False) -> Snapshot | None:
+        """Đọc snapshot còn hạn của URL, None nếu chưa có hoặc đã hết hạn."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, fetched_at, content_hash FROM snapshots WHERE url_key = ? AND kind = ?",
+                (normalize_url(url), kind),
+            ).fetchone()
+        if row is None:
+            return None
+
+        stored_url, status, fetched_at, digest = row
+        if not ignore_ttl and time.time() - fetched_at > self.ttl_seconds:
+            return None
+
+        content = self._read_blob(digest)
+        if content is None:
+            return None
+        return Snapshot(stored_url, kind, status, fetched_at, digest, content)
+
+    def iter_urls(self, kind: str = KIND_HTML):
+        """Liệt kê URL gốc của mọi snapshot thuộc loại `kind`."""
+        with self._lock:
+            rows = self._db.execute("SELECT url FROM snapshots WHERE kind = ?", (kind,)).fetchall()
+        for (url,) in rows:
+            yield url
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,312 @@
+try:
+    import re, zlib, time, queue, threading
+    from datetime import datetime
+    from urllib.parse import urljoin, urlparse, urldefrag
+    from xml.etree.ElementTree import XMLPullParser
+    from bs4 import BeautifulSoup, SoupStrainer
+    from services.crawl_service.http_fetcher import HttpFetcher
+    from services.crawl_service.extractor import backend_available
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+GZIP_MAGIC = b"\x1f\x8b"
+SITEMAP_PATH_PATTERN = re.compile(r"sitemap|\.xml(\.gz)?$", re.IGNORECASE)
+MAX_SITEMAP_DEPTH = 3
+DEFAULT_CATEGORY_MAX_PAGES = 50
+
+
+class DiscoveredUrl:
+    def __init__(self, url: str, lastmod: datetime | None = None):
+        self.url = url
+        self.lastmod = lastmod
+
+
+def parse_lastmod(value: str | None) -> datetime | None:
+    """
+    Đọc lastmod dạng W3C datetime ("2024-05-01", "2024-05-01T10:00:00+07:00", "...Z"),
+    quy về giờ địa phương không có tzinfo để so sánh với cột "Crawled Time" của Excel.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def needs_recrawl(lastmod: datetime | None, is_crawled, crawled_time) -> bool:
+    """
+    Link đã có trong Excel có cần cào lại không: chưa cào thành công, hoặc
+    sitemap báo lastmod mới hơn lần cào trước. Không có lastmod thì coi như không đổi.
+    """
+    if is_crawled != True:  # noqa: E712 (pandas trả về numpy.bool_ hoặc NaN)
+        return True
+    if lastmod is None:
+        return False
+    try:
+        crawled_at = datetime.strptime(str(crawled_time), "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return True
+    return lastmod > crawled_at
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def iter_sitemap_xml(chunks):
+    """
+    Stream-parse nội dung sitemap từ các chunk bytes (tự giải nén nếu là gzip).
+    Trả về lần lượt (loại, loc, lastmod) với loại là "url" (urlset) hoặc "sitemap"
+    (sitemap index). Mỗi entry bị xoá khỏi cây ngay sau khi đọc nên bộ nhớ không
+    tăng theo số URL trong sitemap.
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    decompressor = None
+    first_chunk = True
+    root = None
+
+    def read_events():
+        nonlocal root
+        for event, elem in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            name = _local_name(elem.tag)
+            if name not in ("url", "sitemap"):
+                continue
+            loc = lastmod = None
+            for child in elem:
+                child_name = _local_name(child.tag)
+                if child_name == "loc":
+                    loc = (child.text or "").strip()
+                elif child_name == "lastmod":
+                    lastmod = child.text
+            if loc:
+                yield name, loc, parse_lastmod(lastmod)
+            root.clear()
+
+    for chunk in chunks:
+        if first_chunk:
+            first_chunk = False
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(wbits=31)
+        if decompressor is not None:
+            chunk = decompressor.decompress(chunk)
+        parser.feed(chunk)
+        yield from read_events()
+
+    if decompressor is not None:
+        parser.feed(decompressor.flush())
+    parser.close()
+    yield from read_events()
+
+
+class UrlDiscovery:
+    """
+    Tìm URL sản phẩm từ sitemap.xml, sitemap index (kể cả .xml.gz) hoặc trang danh mục.
+
+    - Sitemap được tải dạng stream và parse từng phần, bộ nhớ không phụ thuộc
+      số URL (sitemap nhà cung cấp có thể chứa hàng chục nghìn URL).
+    - Sitemap index được duyệt đệ quy (tối đa MAX_SITEMAP_DEPTH cấp).
+    - Trang danh mục được tải qua HTTP, lấy các thẻ <a> và đi theo rel="next"
+      tối đa `category_max_pages` trang.
+    - Chỉ giữ URL khớp `product_url_pattern` (regex) của site trong crawl-config.json.
+    """
+
+    def __init__(self, crawl_worker, http_fetcher: HttpFetcher | None = None):
+        self.crawl_worker = crawl_worker
+        self.http_fetcher = http_fetcher or crawl_worker.http_fetcher
+
+    def product_pattern(self, site_config: dict):
+        pattern = site_config.get("product_url_pattern")
+        if not pattern:
+            print(f"[x] Site {site_config.get('name')} chưa có product_url_pattern, giữ mọi URL tìm được")
+            return None
+        return re.compile(pattern)
+
+    def discover(self, source_url: str):
+        """Generator trả về DiscoveredUrl từ sitemap hoặc trang danh mục."""
+        domain = urlparse(source_url).netloc
+        site_config = self.crawl_worker.get_site_config_by_domain(domain)
+        if not site_config:
+            raise ValueError(f"Không tìm thấy config cho domain: {domain}")
+
+        pattern = self.product_pattern(site_config)
+        if SITEMAP_PATH_PATTERN.search(urlparse(source_url).path):
+            entries = self.iter_sitemap(source_url)
+        else:
+            entries = self.iter_category(source_url, site_config)
+
+        for entry in entries:
+            if pattern is None or pattern.search(entry.url):
+                yield entry
+
+    def iter_sitemap(self, sitemap_url: str, depth: int = 0):
+        print(f"[>] Đang đọc sitemap: {sitemap_url}")
+        # Sitemap con chỉ được đọc sau khi đóng stream của sitemap index
+        child_sitemaps = []
+        for kind, loc, lastmod in iter_sitemap_xml(self.http_fetcher.iter_bytes(sitemap_url)):
+            if kind == "url":
+                yield DiscoveredUrl(loc, lastmod)
+            else:
+                child_sitemaps.append(loc)
+
+        for loc in child_sitemaps:
+            if depth >= MAX_SITEMAP_DEPTH:
+                print(f"[x] Bỏ qua sitemap lồng quá sâu: {loc}")
+                continue
+            try:
+                yield from self.iter_sitemap(loc, depth + 1)
+            except Exception as e:
+                print(f"[x] Lỗi khi đọc sitemap {loc}: {e}")
+
+    def iter_category(self, category_url: str, site_config: dict):
+        max_pages = int(site_config.get("category_max_pages", DEFAULT_CATEGORY_MAX_PAGES))
+        strainer = SoupStrainer(["a", "link"])
+        features = "lxml" if backend_available("lxml") else "html.parser"
+        visited = set()
+        seen = set()
+        page_url = category_url
+
+        while page_url and page_url not in visited and len(visited) < max_pages:
+            print(f"[>] Đang đọc trang danh mục: {page_url}")
+            visited.add(page_url)
+            soup = BeautifulSoup(self.http_fetcher.fetch(page_url), features, parse_only=strainer)
+
+            next_url = None
+            for tag in soup.find_all(["a", "link"], href=True):
+                href = urldefrag(urljoin(page_url, tag["href"]))[0]
+                if "next" in (tag.get("rel") or []):
+                    next_url = href
+                if tag.name == "a" and href.startswith("http") and href not in seen:
+                    seen.add(href)
+                    yield DiscoveredUrl(href)
+            page_url = next_url
+
+
+class DiscoveryFeed:
+    """
+    Chạy UrlDiscovery trong thread nền và đưa link cần cào sang vòng cào ngay khi parser
+    tìm thấy, không chờ duyệt hết sitemap / trang danh mục.
+
+    - URL mới được thêm vào Excel theo từng đợt `batch_size` URL (hoặc sau `flush_seconds`
+      giây); file chỉ được lưu định kỳ (ExcelManager.save_interval) và một lần khi tìm xong.
+      URL đã có chỉ được cào lại khi chưa cào thành công hoặc lastmod mới hơn.
+    - Hàng đợi giới hạn `max_pending` link: vòng cào chậm thì thread tìm URL tạm dừng,
+      nên bộ nhớ không tăng theo số URL của sitemap.
+    - Thread dùng HttpFetcher riêng, không dùng chung client với vòng cào.
+    """
+
+    def __init__(self, crawl_worker, source_url: str, excel_manager, batch_size: int = 100,
+                 flush_seconds: float = 5, max_pending: int = 500):
+        self.http_fetcher = HttpFetcher()
+        self.discovery = UrlDiscovery(crawl_worker, self.http_fetcher)
+        self.source_url = source_url
+        self.excel_manager = excel_manager
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.found = 0
+        self.new = 0
+        self.recrawl = 0
+        self.unchanged = 0
+        self.error = None
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, max_pending))
+        self._done = threading.Event()
+        self._should_stop = lambda: False
+        self._thread = None
+
+    @property
+    def queued(self) -> int:
+        """Số link đã đưa sang vòng cào (mới + cần cào lại)."""
+        return self.new + self.recrawl
+
+    @property
+    def finished(self) -> bool:
+        """Đã duyệt xong và vòng cào đã lấy hết link."""
+        return self._done.is_set() and self._queue.empty()
+
+    def start(self, should_stop=lambda: False):
+        self._should_stop = should_stop
+        self._thread = threading.Thread(target=self._run, name="url-discovery", daemon=True)
+        self._thread.start()
+
+    def poll(self, limit: int | None = None) -> list[dict]:
+        """Lấy (không chờ) tối đa `limit` link đã tìm thấy."""
+        links = []
+        while limit is None or len(links) < limit:
+            try:
+                links.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return links
+
+    def _put(self, link: dict) -> bool:
+        while not self._should_stop():
+            try:
+                self._queue.put(link, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _flush(self, urls: list[str]) -> bool:
+        new_links = self.excel_manager.add_links(urls)
+        self.new += len(new_links)
+        urls.clear()
+        for link in new_links:
+            link['discovered'] = True
+            if not self._put(link):
+                return False
+        return True
+
+    def _run(self):
+        pending = []
+        pending_set = set()
+        last_flush = time.monotonic()
+        try:
+            for entry in self.discovery.discover(self.source_url):
+                if self._should_stop():
+                    return
+                self.found += 1
+                link = self.excel_manager.find_link(entry.url)
+                if link is None:
+                    if entry.url not in pending_set:
+                        pending.append(entry.url)
+                        pending_set.add(entry.url)
+                elif link.get('discovered'):
+                    # URL lặp lại trong sitemap, đã đưa sang vòng cào ở lần trước
+                    continue
+                elif needs_recrawl(entry.lastmod, link['is_crawled'], link['crawled_time']):
+                    link['discovered'] = True
+                    self.recrawl += 1
+                    if not self._put(link):
+                        return
+                else:
+                    self.unchanged += 1
+
+                if pending and (len(pending) >= self.batch_size
+                                or time.monotonic() - last_flush >= self.flush_seconds):
+                    pending_set.clear()
+                    if not self._flush(pending):
+                        return
+                    last_flush = time.monotonic()
+            if pending:
+                self._flush(pending)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.http_fetcher.close()
+            try:
+                self.excel_manager.flush()
+            except Exception as e:
+                print(f"[x] Lỗi khi lưu file Excel: {e}")
+            self._done.set()
+
+    def summary(self) -> str:
+        return (f"Tìm thấy {self.found} URL sản phẩm: {self.new} mới, "
+                f"{self.recrawl} cần cào lại, {self.unchanged} không đổi")
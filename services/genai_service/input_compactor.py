@@ -0,0 +1,128 @@
+try:
+    import re, threading
+    from collections import Counter
+    from urllib.parse import urlparse
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# Dòng có số hoặc dạng "Tên: giá trị" thường là thông số sản phẩm (Brand, SKU, 3.3V...),
+# nhiều sản phẩm cùng site có thể giống nhau nên không coi là boilerplate
+SPEC_LINE_PATTERN = re.compile(r"\d|\S\s*[:：]\s*\S")
+# Cắt thêm một chút so với tỉ lệ tính được để lần cắt đầu thường đã vừa ngân sách
+TRIM_MARGIN = 0.95
+
+
+class InputCompactor:
+    """
+    Rút gọn text sản phẩm trước khi đưa vào prompt để giảm token input của LLM:
+
+    - Gộp khoảng trắng trong từng dòng, bỏ dòng trống.
+    - Bỏ dòng lặp lại (nhãn điều hướng, bảng thông số lặp ở nhiều tab), giữ lần xuất hiện đầu.
+    - Bỏ boilerplate học theo từng site: sau khi đã thấy `boilerplate_min_pages` trang của một
+      domain, dòng xuất hiện trong ít nhất `boilerplate_ratio` số trang đó bị bỏ
+      (trừ dòng thông số: có chữ số hoặc dạng "Tên: giá trị").
+    - Giữ tối đa `max_images` ảnh cho mỗi sản phẩm.
+    - Cắt phần cuối text để không vượt `max_input_tokens`. Việc cắt dùng `estimate_tokens`
+      (không tốn request); text cuối cùng được đếm bằng `count_tokens` (tokenizer của model,
+      là một API call), nếu vẫn vượt thì cắt tiếp và đếm lại tới khi vừa ngân sách.
+
+    Kết quả phụ thuộc vào các trang đã thấy trước đó của cùng site, nên cache LLM phải khoá
+    theo text trước khi rút gọn.
+
+    Có thể dùng từ nhiều thread.
+    """
+
+    def __init__(self, count_tokens, estimate_tokens, max_input_tokens: int = 0, boilerplate_min_pages: int = 10,
+                 boilerplate_ratio: float = 0.8, max_images: int = 0):
+        self.count_tokens = count_tokens
+        self.estimate_tokens = estimate_tokens
+        self.max_input_tokens = max_input_tokens
+        self.boilerplate_min_pages = max(1, int(boilerplate_min_pages))
+        self.boilerplate_ratio = boilerplate_ratio
+        self.max_images = max_images
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self._pages: Counter = Counter()
+        self._line_pages: dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_lines(text: str) -> list[str]:
+        lines = (WHITESPACE_PATTERN.sub(" ", line).strip() for line in text.splitlines())
+        return [line for line in lines if line]
+
+    @staticmethod
+    def dedupe_lines(lines: list[str]) -> list[str]:
+        seen = set()
+        unique = []
+        for line in lines:
+            key = line.casefold()
+            if key not in seen:
+                seen.add(key)
+                unique.append(line)
+        return unique
+
+    def learn_and_strip(self, domain: str, lines: list[str]) -> list[str]:
+        """Ghi nhận các dòng của trang vào thống kê của domain rồi bỏ những dòng là boilerplate."""
+        with self._lock:
+            self._pages[domain] += 1
+            line_pages = self._line_pages.setdefault(domain, Counter())
+            line_pages.update({line.casefold() for line in lines})
+
+            pages = self._pages[domain]
+            if pages < self.boilerplate_min_pages:
+                return lines
+            threshold = pages * self.boilerplate_ratio
+            return [line for line in lines
+                    if SPEC_LINE_PATTERN.search(line) or line_pages[line.casefold()] < threshold]
+
+    @staticmethod
+    def cut_text(text: str, keep_chars: int) -> str:
+        """Giữ `keep_chars` ký tự đầu, ưu tiên cắt ở cuối dòng nếu không mất quá nửa phần giữ lại."""
+        keep_chars = max(0, min(keep_chars, len(text) - 1))
+        cut = text[:keep_chars]
+        newline = cut.rfind("\n")
+        if newline > keep_chars // 2:
+            cut = cut[:newline]
+        return cut
+
+    def fit_budget(self, text: str) -> str:
+        """Cắt phần cuối text (kể cả giữa một dòng dài) tới khi ước lượng không vượt max_input_tokens."""
+        tokens = self.estimate_tokens(text)
+        while text and tokens > self.max_input_tokens:
+            text = self.cut_text(text, int(len(text) * self.max_input_tokens / tokens * TRIM_MARGIN))
+            tokens = self.estimate_tokens(text)
+        return text
+
+    def compact(self, url: str, crawl_output: dict) -> tuple[dict, int, int]:
+        """Trả về (crawl output đã rút gọn, số token trước (ước lượng), số token sau)."""
+        text = crawl_output.get("text", "")
+        before = self.estimate_tokens(text)
+
+        lines = self.dedupe_lines(self.normalize_lines(text))
+        lines = self.learn_and_strip(urlparse(url).netloc.lower(), lines)
+        compacted = "\n".join(lines)
+        if self.max_input_tokens > 0:
+            compacted = self.fit_budget(compacted)
+
+        after = self.count_tokens(compacted) if compacted else 0
+        while 0 < self.max_input_tokens < after:
+            # Tokenizer thật đếm nhiều hơn ước lượng (text dày token như CJK): cắt theo tỉ lệ thật
+            # rồi đếm lại, mật độ token không đều nên không suy ra được số token sau khi cắt
+            keep_chars = int(len(compacted) * self.max_input_tokens / after * TRIM_MARGIN)
+            compacted = self.cut_text(compacted, keep_chars)
+            after = self.count_tokens(compacted) if compacted else 0
+
+        images = crawl_output.get("images", [])
+        if self.max_images > 0:
+            images = images[:self.max_images]
+
+        with self._lock:
+            self.tokens_before += before
+            self.tokens_after += after
+        return {**crawl_output, "text": compacted, "images": images}, before, after
+
+    def summary(self) -> str:
+        saved = (1 - self.tokens_after / self.tokens_before) * 100 if self.tokens_before else 0
+        return f"input LLM: {self.tokens_before} → {self.tokens_after} token (giảm {saved:.0f}%)"
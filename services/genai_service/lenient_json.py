@@ -0,0 +1,244 @@
+"""
+Parser JSON dễ dãi cho response của LLM, đọc response đúng một lượt (máy trạng thái với
+stack các object/array đang mở), thay cho chuỗi regex sửa JSON trước đây.
+
+Chấp nhận các lỗi hay gặp: text / markdown trước và sau JSON, trailing comma, thiếu dấu phẩy
+giữa các field, key không có nháy, chuỗi nháy đơn, xuống dòng / tab thật trong chuỗi, dấu `"`
+không escape trong chuỗi (ví dụ thuộc tính HTML trong Body), True/False/None kiểu Python và
+response bị cắt cụt giữa chừng. Chuỗi hợp lệ được giữ nguyên, kể cả `\\n` đã escape đúng.
+"""
+import re
+import json
+
+WHITESPACE = re.compile(r"\s*")
+NUMBER = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?")
+# Ký tự kết thúc một giá trị / key không có nháy
+BARE_VALUE_END = re.compile(r"[,}\]\n]")
+BARE_KEY_END = re.compile(r"[:,{}\[\]\n]")
+# Ký tự cần xử lý trong chuỗi: dấu nháy đóng hoặc escape
+STRING_SPECIAL = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+BARE_KEY_AHEAD = re.compile(r"[A-Za-z_$][\w$ -]*\s*:")
+LITERALS = {"true": True, "false": False, "null": None, "none": None}
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "'": "'"}
+
+# Trạng thái của object / array đang mở trên stack
+EXPECT_KEY = 0      # sau "{" hoặc ",": chờ key hoặc "}"
+EXPECT_COLON = 1    # đã có key, chờ ":"
+EXPECT_VALUE = 2    # chờ giá trị (của key, hoặc phần tử array)
+EXPECT_COMMA = 3    # đã có giá trị, chờ "," hoặc dấu đóng
+
+
+class TruncatedJSONError(json.JSONDecodeError):
+    """Response bị cắt cụt (thường do hết max_output_tokens); `partial` là phần đã parse được."""
+
+    def __init__(self, msg: str, doc: str, pos: int, partial):
+        super().__init__(msg, doc, pos)
+        self.partial = partial
+
+
+class _Frame:
+    __slots__ = ("container", "state", "key")
+
+    def __init__(self, container):
+        self.container = container
+        self.state = EXPECT_KEY if isinstance(container, dict) else EXPECT_VALUE
+        self.key = None
+
+
+class _LenientParser:
+    def __init__(self, text: str, start: int):
+        self.text = text
+        self.pos = start
+        self.truncated = False
+
+    def skip_whitespace(self):
+        self.pos = WHITESPACE.match(self.text, self.pos).end()
+
+    def closes_string(self, index: int, in_key: bool, in_list: bool) -> bool:
+        """
+        Dấu nháy tại `index` có phải nháy đóng không: chỉ đúng khi sau nó (bỏ khoảng trắng)
+        là ký tự cấu trúc hợp lý, nếu không thì đó là dấu nháy chưa escape nằm trong chuỗi.
+        """
+        text = self.text
+        ahead = WHITESPACE.match(text, index + 1).end()
+        if ahead >= len(text):
+            return True
+        char = text[ahead]
+        if in_key:
+            return char in ":,}]"
+        if char in "}]":
+            return True
+        if char == ",":
+            after = WHITESPACE.match(text, ahead + 1).end()
+            if after >= len(text) or in_list:
+                return True
+            # Trong object, sau dấu phẩy phải là key tiếp theo hoặc dấu đóng
+            return text[after] in "\"'}]" or BARE_KEY_AHEAD.match(text, after) is not None
+        # Thiếu dấu phẩy giữa hai field nằm trên hai dòng
+        if "\n" not in text[index + 1:ahead]:
+            return False
+        return char in "\"'" or BARE_KEY_AHEAD.match(text, ahead) is not None
+
+    def read_string(self, in_key: bool, in_list: bool) -> str:
+        text = self.text
+        quote = text[self.pos]
+        special = STRING_SPECIAL[quote]
+        position = self.pos + 1
+        chunks = []
+        while True:
+            match = special.search(text, position)
+            if match is None:
+                chunks.append(text[position:])
+                self.pos = len(text)
+                self.truncated = True
+                return "".join(chunks)
+            index = match.start()
+            chunks.append(text[position:index])
+            if text[index] == quote:
+                if self.closes_string(index, in_key, in_list):
+                    self.pos = index + 1
+                    return "".join(chunks)
+                chunks.append(quote)
+                position = index + 1
+                continue
+
+            # Escape sequence
+            if index + 1 >= len(text):
+                self.pos = len(text)
+                self.truncated = True
+                return "".join(chunks)
+            char = text[index + 1]
+            if char == "u":
+                code = text[index + 2:index + 6]
+                if len(code) == 4 and all(c in "0123456789abcdefABCDEF" for c in code):
+                    value = int(code, 16)
+                    position = index + 6
+                    # Cặp surrogate (ký tự ngoài BMP, ví dụ emoji)
+                    if 0xD800 <= value < 0xDC00 and text.startswith("\\u", position):
+                        low = text[position + 2:position + 6]
+                        if len(low) == 4 and all(c in "0123456789abcdefABCDEF" for c in low) \
+                                and 0xDC00 <= int(low, 16) < 0xE000:
+                            value = 0x10000 + ((value - 0xD800) << 10) + (int(low, 16) - 0xDC00)
+                            position += 6
+                    chunks.append(chr(value))
+                    continue
+                if index + 6 > len(text):
+                    self.pos = len(text)
+                    self.truncated = True
+                    return "".join(chunks)
+            # Escape không hợp lệ (\d, \x...) được giữ nguyên
+            chunks.append(ESCAPES.get(char, "\\" + char))
+            position = index + 2
+
+    def read_bare(self, pattern: re.Pattern) -> str:
+        match = pattern.search(self.text, self.pos)
+        end = match.start() if match else len(self.text)
+        token = self.text[self.pos:end].strip()
+        if match is None:
+            self.truncated = True
+        self.pos = end
+        return token
+
+    def read_bare_value(self):
+        token = self.read_bare(BARE_VALUE_END)
+        if token.lower() in LITERALS:
+            return LITERALS[token.lower()]
+        if NUMBER.fullmatch(token):
+            return json.loads(token)
+        return token
+
+    def read_key(self) -> str:
+        if self.text[self.pos] in "\"'":
+            return self.read_string(in_key=True, in_list=False)
+        return self.read_bare(BARE_KEY_END)
+
+    def parse(self):
+        text = self.text
+        root = {} if text[self.pos] == "{" else []
+        stack = [_Frame(root)]
+        self.pos += 1
+
+        while stack:
+            self.skip_whitespace()
+            if self.pos >= len(text):
+                self.truncated = True
+                break
+            frame = stack[-1]
+            char = text[self.pos]
+            is_dict = isinstance(frame.container, dict)
+
+            if frame.state == EXPECT_VALUE and is_dict and char in ",}]":
+                # Key không có giá trị: "a": ,
+                frame.container[frame.key] = None
+                frame.state = EXPECT_COMMA
+
+            # Dấu đóng (kể cả đóng sai loại) kết thúc container hiện tại; trailing comma bị bỏ qua
+            if char in "}]":
+                self.pos += 1
+                stack.pop()
+                if stack:
+                    stack[-1].state = EXPECT_COMMA
+                continue
+
+            if frame.state == EXPECT_COMMA:
+                if char == ",":
+                    self.pos += 1
+                    frame.state = EXPECT_KEY if is_dict else EXPECT_VALUE
+                    continue
+                # Thiếu dấu phẩy: coi như có
+                frame.state = EXPECT_KEY if is_dict else EXPECT_VALUE
+
+            if frame.state == EXPECT_KEY:
+                if char == ",":
+                    self.pos += 1
+                    continue
+                frame.key = self.read_key()
+                frame.state = EXPECT_COLON
+                continue
+
+            if frame.state == EXPECT_COLON:
+                if char in ":=":
+                    self.pos += 1
+                frame.state = EXPECT_VALUE
+                continue
+
+            # EXPECT_VALUE
+            if char == ",":
+                self.pos += 1
+                continue
+
+            if char in "{[":
+                value = {} if char == "{" else []
+                self.pos += 1
+            elif char in "\"'":
+                value = self.read_string(in_key=False, in_list=not is_dict)
+            else:
+                value = self.read_bare_value()
+
+            if is_dict:
+                frame.container[frame.key] = value
+                frame.key = None
+            else:
+                frame.container.append(value)
+            frame.state = EXPECT_COMMA
+            if char in "{[":
+                stack.append(_Frame(value))
+
+        return root
+
+
+def loads_lenient(text: str, allow_truncated: bool = True):
+    """
+    Parse JSON object / array đầu tiên trong `text`, chấp nhận các lỗi thường gặp của LLM.
+    Raise JSONDecodeError nếu không có JSON; TruncatedJSONError nếu response bị cắt cụt
+    và `allow_truncated` là False.
+    """
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        raise json.JSONDecodeError("Không tìm thấy JSON object hoặc array", text, 0)
+
+    parser = _LenientParser(text, min(starts))
+    value = parser.parse()
+    if parser.truncated and not allow_truncated:
+        raise TruncatedJSONError("JSON bị cắt cụt", text, len(text), value)
+    return value
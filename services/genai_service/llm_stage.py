@@ -0,0 +1,200 @@
+try:
+    import time, queue, heapq, itertools, threading
+    from utils.retry_policy import classify_error
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+DUPLICATE_HANDLE_NOTE = "Handle đã có trong CSV, không ghi thêm"
+
+class LLMStage:
+    """
+    Bước sau khi cào: chuyển dữ liệu sản phẩm sang JSON Shopify bằng LLM, ghi CSV và Excel.
+
+    Chạy song song với bước cào: `workers` thread lấy link từ một hàng đợi giới hạn
+    `queue_size` phần tử (đầy thì bước cào phải chờ, tránh dồn dữ liệu trong bộ nhớ),
+    nên trình duyệt tiếp tục tải trang trong khi Gemini đang xử lý.
+
+    - Mỗi thread gom tối đa `llm_worker.max_batch_products` link thành một request; nếu hàng
+      đợi chưa đủ, thread chờ thêm tối đa `batch_wait_seconds` giây rồi gửi phần đang có.
+    - Số request / token mỗi phút do QuotaLimiter của LLMWorker kiểm soát (dùng chung).
+    - Lỗi ở bước LLM (quota, JSON hỏng, ...) được thử lại theo RetryPolicy ngay trong stage,
+      dùng lại dữ liệu đã cào (`link['crawl_output']`) chứ không cào lại trang.
+    - Nếu có `compactor` (InputCompactor), text sản phẩm được rút gọn một lần trước khi gửi LLM.
+    - Ghi CSV / Excel được tuần tự hoá bằng một lock; chỉ khi dòng CSV thực sự được ghi
+      (không bị bỏ qua vì trùng Handle), hash nội dung (`link['content_hash']`) mới được lưu
+      vào ChangeDetector.
+    """
+
+    def __init__(self, llm_worker, convert_worker, excel_manager, retry_policy, change_detector=None,
+                 log=print, workers: int = 1, queue_size: int = 20, batch_wait_seconds: float = 2,
+                 should_stop=lambda: False, compactor=None):
+        self.llm_worker = llm_worker
+        self.convert_worker = convert_worker
+        self.excel_manager = excel_manager
+        self.retry_policy = retry_policy
+        self.change_detector = change_detector
+        self.log = log
+        self.num_workers = max(1, int(workers))
+        self.batch_wait_seconds = batch_wait_seconds
+        self.should_stop = should_stop
+        self.compactor = compactor
+        self.successful = 0
+        self.failed = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._retries: list[tuple[float, int, dict]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._output_lock = threading.Lock()
+        self._in_flight = 0
+        self._input_closed = False
+        self._stopped = False
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def batch_size(self) -> int:
+        return self.llm_worker.max_batch_products
+
+    def start(self):
+        for index in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"llm-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _stopping(self) -> bool:
+        return self._stopped or self.should_stop()
+
+    def submit(self, link: dict) -> bool:
+        """Đưa một link đã cào xong (có `crawl_output`) vào hàng đợi; chờ nếu hàng đợi đầy."""
+        while not self._stopping():
+            try:
+                self._queue.put(link, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(self):
+        """Báo hết link mới và chờ các thread xử lý xong (kể cả các lần thử lại) hoặc bị dừng."""
+        self._input_closed = True
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def stop(self):
+        """Dừng các thread ngay (job lỗi hoặc bị huỷ), link còn trong hàng đợi bị bỏ qua."""
+        self._stopped = True
+        self.drain()
+
+    def _finished(self) -> bool:
+        with self._lock:
+            return (self._input_closed and self._queue.empty()
+                    and not self._retries and self._in_flight == 0)
+
+    def _pop_due_retries(self, limit: int) -> list[dict]:
+        with self._lock:
+            now = time.monotonic()
+            links = []
+            while self._retries and self._retries[0][0] <= now and len(links) < limit:
+                links.append(heapq.heappop(self._retries)[2])
+            self._in_flight += len(links)
+            return links
+
+    def _next_batch(self) -> list[dict]:
+        """Lấy tối đa batch_size link: lần thử lại đã tới hạn trước, sau đó tới hàng đợi."""
+        batch = self._pop_due_retries(self.batch_size)
+        deadline = time.monotonic() + self.batch_wait_seconds
+        while len(batch) < self.batch_size:
+            # Chưa có link nào thì chờ ngắn để còn kiểm tra dừng / lần thử lại tới hạn
+            timeout = 0.5 if not batch else deadline - time.monotonic()
+            if batch and (timeout <= 0 or self._input_closed):
+                timeout = 0
+            try:
+                link = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._in_flight += 1
+            batch.append(link)
+        return batch
+
+    def _worker_loop(self):
+        while not self._stopping() and not self._finished():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self._convert(batch)
+            except Exception as e:
+                # Lỗi ngoài bước gọi LLM (vd. khi rút gọn input): cả batch được tính lỗi / thử lại,
+                # thread vẫn chạy tiếp
+                for link in batch:
+                    self._fail(link, e)
+            finally:
+                with self._lock:
+                    self._in_flight -= len(batch)
+
+    def _compact(self, link: dict):
+        """Rút gọn crawl output của link (chỉ lần đầu, các lần thử lại dùng lại kết quả)."""
+        if self.compactor is None or link.get('compacted'):
+            return
+        link['crawl_output'], before, after = self.compactor.compact(link['url'], link['crawl_output'])
+        link['compacted'] = True
+        self.log(f"Rút gọn input {link['url']}: {before} → {after} token")
+
+    def _convert(self, links: list[dict]):
+        for link in links:
+            if 'cache_key' not in link:
+                # Khoá cache theo text trước khi rút gọn: kết quả rút gọn phụ thuộc thứ tự các trang đã cào
+                link['cache_key'] = self.llm_worker.product_cache_key(link['crawl_output']['text'])
+        results = [self.llm_worker.cached_product(link['cache_key']) for link in links]
+        misses = [index for index, result in enumerate(results) if result is None]
+
+        # Chỉ rút gọn (và đếm token) sản phẩm chưa có trong cache
+        for index in misses:
+            self._compact(links[index])
+        if len(misses) > 1:
+            self.log(f"Đang chuyển đổi {len(misses)} sản phẩm trong một request LLM")
+        if misses:
+            try:
+                converted = self.llm_worker.generate_json_batch(
+                    [links[index]['crawl_output']['text'] for index in misses],
+                    [links[index]['cache_key'] for index in misses])
+            except Exception as e:
+                converted = [e] * len(misses)
+            for index, result in zip(misses, converted):
+                results[index] = result
+
+        for link, result in zip(links, results):
+            if isinstance(result, Exception):
+                self._fail(link, result)
+                continue
+            try:
+                with self._output_lock:
+                    written = self.convert_worker.append_to_csv(result, images=link['crawl_output']['images'])
+                    self.excel_manager.update_link(link['index'], True, "" if written else DUPLICATE_HANDLE_NOTE)
+                    # Dòng trùng Handle không được ghi: không lưu hash để lần sau vẫn xử lý lại sản phẩm
+                    if written and self.change_detector and link.get('content_hash'):
+                        self.change_detector.record(link['url'], link['content_hash'])
+                    self.successful += 1
+            except Exception as e:
+                self._fail(link, e)
+                continue
+            self.log(f"Đã chuyển đổi dữ liệu từ {link['url']} sang JSON")
+
+    def _fail(self, link: dict, error: Exception):
+        category = classify_error(error)
+        delay = self.retry_policy.next_delay(link, category)
+        if delay is None:
+            with self._output_lock:
+                self.failed += 1
+                try:
+                    self.excel_manager.update_link(link['index'], False, str(error))
+                except Exception as e:
+                    print(f"[x] Lỗi khi ghi trạng thái {link['url']} vào Excel: {e}")
+            self.log(f"Lỗi khi xử lý {link['url']}: {str(error)}")
+            return
+        self.log(f"Lỗi {category} tại {link['url']}: {str(error)}. "
+                 f"Thử lại lần {link['attempt']} sau {delay:.0f} giây")
+        with self._lock:
+            heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), link))
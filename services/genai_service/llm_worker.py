@@ -5,10 +5,30 @@ try:
     import os
     from dotenv import load_dotenv
     import google.generativeai as genai
-    from services.genai_service.prompt import generate_prompt
+    from utils.app_config import get_section
+    from utils.resource_path import resource_path as path_to
+    from services.genai_service.prompt import (generate_prompt, generate_batch_prompt, standard_prompt,
+                                               SHOPIFY_FIELDS, PRODUCT_RESPONSE_SCHEMA, BATCH_RESPONSE_SCHEMA)
+    from services.genai_service.lenient_json import loads_lenient
+    from services.genai_service.response_cache import LLMResponseCache, cache_key
+    from services.genai_service.quota_limiter import QuotaLimiter
+    from utils.retry_policy import classify_error, ERROR_LLM_QUOTA
 except ImportError as e:
     raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
 
+# Ước lượng thô số token (tiếng Anh/Việt lẫn HTML ~ 4 ký tự một token)
+CHARS_PER_TOKEN = 4
+# Chừa lại một phần max_output_tokens để response của batch không bị cắt cụt
+OUTPUT_TOKEN_HEADROOM = 0.9
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class MalformedResponseError(ValueError):
+    """Response của LLM là JSON hợp lệ nhưng sai cấu trúc (không phải object, thiếu field, sai số phần tử)."""
+
 
 class LLMWorker:
     def __init__(self, API_KEY):
@@ -20,7 +40,8 @@ class LLMWorker:
         genai.configure(api_key=self.API_KEY)
 
         # Cấu hình generation config để có kết quả ổn định hơn
-        generation_config = {
+        self.model_name = 'gemini-2.0-flash'
+        self.generation_config = {
             "temperature": 0.1,
             "top_p": 0.8,
             "top_k": 40,
@@ -28,173 +49,268 @@ class LLMWorker:
         }
 
         self.model = genai.GenerativeModel(
-            'gemini-2.0-flash',
-            generation_config=generation_config
+            self.model_name,
+            generation_config=self.generation_config
         )
 
-    def extract_json_from_response(self, text: str) -> str:
-        """
-        Trích xuất JSON từ response của AI model
-        """
-        if not text:
-            return ""
-
-        # Loại bỏ markdown code blocks
-        text = re.sub(r'```json\s*', '', text, flags=re.IGNORECASE)
-        text = re.sub(r'```\s*$', '', text, flags=re.MULTILINE)
-
-        # Tìm JSON object bắt đầu bằng {
-        start_idx = text.find('{')
-        if start_idx == -1:
-            return text.strip()
-
-        # Tìm JSON object kết thúc bằng } (đếm brackets)
-        brace_count = 0
-        end_idx = len(text)
-
-        for i in range(start_idx, len(text)):
-            if text[i] == '{':
-                brace_count += 1
-            elif text[i] == '}':
-                brace_count -= 1
-                if brace_count == 0:
-                    end_idx = i + 1
-                    break
-
-        json_str = text[start_idx:end_idx].strip()
-        return json_str
-
-    def fix_common_json_errors(self, json_str: str) -> str:
-        """
-        Sửa một số lỗi JSON phổ biến với logic cải thiện
-        """
-        try:
-            # Loại bỏ trailing commas
-            json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
-
-            # Fix unquoted property names (property: value -> "property": value)
-            # Tìm tất cả các property names không có quotes
-            json_str = re.sub(r'(?<=[{\s,])\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*:', r'"\1":', json_str)
-
-            # Convert single quotes to double quotes cho property names và values
-            # Nhưng cẩn thận với escaped quotes
-            json_str = re.sub(r"'([^'\\]*(?:\\.[^'\\]*)*)'", r'"\1"', json_str)
-
-            # Fix escaped newlines và các escape sequences khác
-            json_str = re.sub(r'\\n', r'\\\\n', json_str)  # Fix literal \n
-            json_str = re.sub(r'(?<!\\)\n', r'\\n', json_str)  # Escape actual newlines
-            json_str = re.sub(r'(?<!\\)\t', r'\\t', json_str)  # Escape tabs
-            json_str = re.sub(r'(?<!\\)\r', r'\\r', json_str)  # Escape carriage returns
-
-            # Fix unescaped quotes trong string values
-            # Tìm strings và escape quotes bên trong
-            def fix_quotes_in_strings(match):
-                content = match.group(1)
-                # Escape unescaped quotes inside the string
-                content = re.sub(r'(?<!\\)"', r'\\"', content)
-                return f'"{content}"'
-
-            json_str = re.sub(r'"([^"\\]*(?:\\.[^"\\]*)*)"', fix_quotes_in_strings, json_str)
-
-            return json_str
-        except Exception as e:
-            print(f"Lỗi khi fix JSON: {e}")
-            return json_str
+        # Ràng buộc response theo schema Shopify để parse thẳng bằng json.loads, không cần sửa JSON
+        self.structured_output = get_section("llm_structured_output").get("enabled", False)
 
-    def validate_and_fix_json(self, json_str: str, max_attempts: int = 3) -> dict:
-        """
-        Validate và fix JSON với nhiều attempts
-        """
-        for attempt in range(max_attempts):
-            try:
-                return json.loads(json_str)
-            except json.JSONDecodeError as e:
-                print(f"Attempt {attempt + 1}: JSON decode error: {e}")
-
-                if attempt == max_attempts - 1:
-                    # Last attempt, save debug info
-                    debug_file = f"debug_json_error_attempt_{attempt + 1}.txt"
-                    with open(debug_file, "w", encoding="utf-8") as f:
-                        f.write(f"ATTEMPT {attempt + 1} JSON:\n")
-                        f.write(json_str)
-                        f.write(f"\n\nJSON DECODE ERROR:\n{e}")
-                    raise e
+        # Temperature thấp nên response cho cùng prompt gần như cố định, dùng lại được
+        cache_settings = get_section("llm_cache")
+        self.cache = LLMResponseCache(
+            path_to(cache_settings.get("path", "CRAWL/io/llm_cache.sqlite3")),
+            max_size_mb=cache_settings.get("max_size_mb", 200),
+            enabled=cache_settings.get("enabled", False),
+        )
 
-                # Try more aggressive fixes
-                json_str = self.apply_aggressive_json_fixes(json_str, e)
+        # Gom nhiều sản phẩm vào một request để phần quy tắc của prompt chỉ gửi một lần
+        batch_settings = get_section("llm_batch")
+        self.batch_max_products = max(1, int(batch_settings.get("max_products", 1)))
+        self.batch_max_input_tokens = int(batch_settings.get("max_input_tokens", 24000))
+        self.batch_output_tokens_per_product = max(1, int(batch_settings.get("output_tokens_per_product", 2000)))
+
+        # Quota của API dùng chung cho mọi thread gọi LLM
+        quota_settings = get_section("llm_rate_limit")
+        self.quota_limiter = QuotaLimiter(
+            requests_per_minute=quota_settings.get("requests_per_minute", 0),
+            tokens_per_minute=quota_settings.get("tokens_per_minute", 0),
+        )
+        self.quota_pause_seconds = quota_settings.get("quota_pause_seconds", 30)
+        # Callable do CrawlThread gán để ngừng chờ quota khi job bị dừng
+        self.should_stop = lambda: False
 
-        raise ValueError("Could not fix JSON after maximum attempts")
+    def close(self):
+        self.cache.close()
 
-    def apply_aggressive_json_fixes(self, json_str: str, error: json.JSONDecodeError) -> str:
+    def count_tokens(self, text: str) -> int:
         """
-        Apply more aggressive JSON fixes based on specific error
+        Đếm token bằng tokenizer của model (API count_tokens, cũng là một request nên phải chờ
+        QuotaLimiter); lỗi hoặc bị dừng khi chờ quota thì dùng ước lượng.
         """
-        error_msg = str(error).lower()
-
-        if "expecting property name" in error_msg:
-            # More aggressive property name fixing
-            json_str = re.sub(r'([{\s,])\s*([a-zA-Z_$][a-zA-Z0-9_$]*)\s*:', r'\1"\2":', json_str)
-
-        elif "expecting ',' delimiter" in error_msg:
-            # Fix missing commas
-            json_str = re.sub(r'}\s*{', r'},{', json_str)
-            json_str = re.sub(r']\s*[{\[]', r'],{', json_str)
-
-        elif "unterminated string" in error_msg:
-            # Try to fix unterminated strings
-            lines = json_str.split('\n')
-            for i, line in enumerate(lines):
-                # Count quotes in line
-                quote_count = line.count('"') - line.count('\\"')
-                if quote_count % 2 != 0:  # Odd number of quotes
-                    lines[i] = line + '"'
-            json_str = '\n'.join(lines)
-
-        elif "expecting value" in error_msg:
-            # Fix common value issues
-            json_str = re.sub(r':\s*,', r': null,', json_str)
-            json_str = re.sub(r':\s*}', r': null}', json_str)
-
-        # Apply standard fixes again
-        return self.fix_common_json_errors(json_str)
-
-    def process_product_raw_data(self, message: str) -> str:
+        if not self.quota_limiter.acquire(0, self.should_stop):
+            return estimate_tokens(text)
+        try:
+            return self.model.count_tokens(text).total_tokens
+        except Exception:
+            return estimate_tokens(text)
+
+    def process_product_raw_data(self, message: str, miss_key: str | None = None) -> dict:
         """
         Gọi API Gemini với error handling tốt hơn
         :param message: string
+        :param miss_key: khoá cache của sản phẩm khi đã biết chưa có trong cache: không tra lại,
+            kết quả được lưu dưới khoá này
         :return: dict
         """
         if not message or not message.strip():
             raise ValueError("Dữ liệu đầu vào rỗng hoặc không hợp lệ")
 
         try:
-            prompt = generate_prompt(message)
-            response = self.model.generate_content(prompt)
+            return self.generate_content(generate_prompt(message), miss_key=miss_key)
+        except Exception as e:
+            print(f"Lỗi khi gọi API Gemini: {e}")
+            raise RuntimeError(f"Lỗi khi xử lý dữ liệu sản phẩm: {str(e)}")
 
-            if not response or not hasattr(response, 'text') or not response.text:
-                raise ValueError("API Gemini trả về response rỗng hoặc không hợp lệ")
+    def request_config(self, batch: bool = False) -> dict:
+        """Generation config của một request; chế độ structured output thêm JSON MIME type và schema."""
+        if not self.structured_output:
+            return self.generation_config
+        return {
+            **self.generation_config,
+            "response_mime_type": "application/json",
+            "response_schema": BATCH_RESPONSE_SCHEMA if batch else PRODUCT_RESPONSE_SCHEMA,
+        }
 
-            result = response.text.strip()
+    def parse_response(self, text: str):
+        """
+        Structured output chỉ cần json.loads; chế độ thường mới dùng parser dễ dãi khi JSON hỏng.
+        Response bị cắt cụt vẫn raise (TruncatedJSONError) để được gọi lại.
+        """
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            if self.structured_output:
+                raise
+        return loads_lenient(text, allow_truncated=False)
 
+    def generate_content(self, prompt: str, products: int = 1, batch: bool = False, miss_key: str | None = None):
+        """
+        Gọi Gemini và trả về JSON đã parse (dict, hoặc list nếu `batch`).
+        Prompt một sản phẩm đi qua cache (khoá theo prompt, hoặc `miss_key` nếu có); response của
+        batch không được cache theo cả prompt (thành phần batch thay đổi giữa các lần chạy) mà
+        generate_json_batch cache từng sản phẩm.
+        Request thật (cache miss) phải chờ QuotaLimiter; `products` dùng để ước lượng token output.
+        Response không parse được raise JSONDecodeError (lỗi malformed_json).
+        """
+        config = self.request_config(batch)
+        key = None if batch else miss_key or cache_key(prompt, self.model_name, config)
+        if key and not miss_key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return self.parse_response(cached)
+
+        tokens = estimate_tokens(prompt) + products * self.batch_output_tokens_per_product
+        if not self.quota_limiter.acquire(tokens, self.should_stop):
+            raise RuntimeError("Đã dừng trong khi chờ quota LLM")
+        try:
+            response = self.model.generate_content(prompt, generation_config=config)
+        except Exception as e:
+            if classify_error(e) == ERROR_LLM_QUOTA:
+                self.quota_limiter.pause(getattr(e, "retry_after", None) or self.quota_pause_seconds)
+            raise
+
+        if not response or not hasattr(response, 'text') or not response.text:
+            raise ValueError("API Gemini trả về response rỗng hoặc không hợp lệ")
+
+        result = response.text.strip()
+
+        if not self.structured_output:
             # Loai bỏ (```json) va (```) nếu có
             result = re.sub(r'```json\s*', '', result, flags=re.IGNORECASE)
             result = re.sub(r'```\s*$', '', result, flags=re.MULTILINE)
 
+        # Chỉ cache JSON hợp lệ, response lỗi phải được gọi lại khi thử lại
+        data = self.parse_response(result)
+        if key:
+            self.cache.put(key, self.model_name, result)
+        return data
 
-            return result
-
-        except Exception as e:
-            print(f"Lỗi khi gọi API Gemini: {e}")
-            raise RuntimeError(f"Lỗi khi xử lý dữ liệu sản phẩm: {str(e)}")
-
-    def generate_json_from_product(self, product_data: str) -> dict:
+    def generate_json_from_product(self, product_data: str, miss_key: str | None = None) -> dict:
         """
         Xử lý dữ liệu sản phẩm thô và trả về JSON chuẩn của Shopify
         :param product_data: string
+        :param miss_key: khoá cache của sản phẩm khi đã biết chưa có trong cache: không tra lại,
+            kết quả được lưu dưới khoá này
         :return: dict
         """
         try:
-            result = self.process_product_raw_data(product_data)
+            result = self.process_product_raw_data(product_data, miss_key)
             return result
         except Exception as e:
             raise RuntimeError(f"Lỗi khi xử lý dữ liệu sản phẩm: {str(e)}")
+
+    @staticmethod
+    def parse_product_json(data) -> dict:
+        """
+        Kiểm tra một sản phẩm trả về từ LLM và đưa về đúng thứ tự key Shopify
+        (key thiếu được điền chuỗi rỗng). Raise nếu không phải object hoặc thiếu Handle/Title.
+        """
+        if isinstance(data, str):
+            data = json.loads(data)
+        if not isinstance(data, dict):
+            raise MalformedResponseError(f"LLM trả về {type(data).__name__} thay vì JSON object")
+        missing = [field for field in ("Handle", "Title") if not data.get(field)]
+        if missing:
+            raise MalformedResponseError(f"LLM trả về JSON thiếu {', '.join(missing)}")
+        return {field: data.get(field, "") for field in SHOPIFY_FIELDS}
+
+    @property
+    def max_batch_products(self) -> int:
+        """Số sản phẩm tối đa một request, giới hạn thêm bởi max_output_tokens của model."""
+        output_budget = int(self.generation_config["max_output_tokens"] * OUTPUT_TOKEN_HEADROOM)
+        return max(1, min(self.batch_max_products, output_budget // self.batch_output_tokens_per_product))
+
+    def plan_batches(self, products: list[str]) -> list[list[int]]:
+        """Chia sản phẩm (theo chỉ số) thành các batch không vượt số sản phẩm và ngân sách token input."""
+        prefix_tokens = estimate_tokens(standard_prompt)
+        batches = []
+        current = []
+        current_tokens = prefix_tokens
+        for index, product in enumerate(products):
+            tokens = estimate_tokens(product)
+            if current and (len(current) >= self.max_batch_products
+                            or current_tokens + tokens > self.batch_max_input_tokens):
+                batches.append(current)
+                current = []
+                current_tokens = prefix_tokens
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def convert_product(self, product_data: str, miss_key: str | None = None):
+        """Chuyển một sản phẩm, trả về dict đã kiểm tra hoặc Exception (không raise)."""
+        try:
+            return self.parse_product_json(self.generate_json_from_product(product_data, miss_key))
+        except Exception as e:
+            return e
+
+    def product_cache_key(self, product_data: str) -> str:
+        """Khoá cache của một sản phẩm: giống khoá khi sản phẩm được gửi riêng lẻ."""
+        return cache_key(generate_prompt(product_data), self.model_name, self.request_config())
+
+    def cached_product(self, key: str) -> dict | None:
+        """Kết quả đã kiểm tra của sản phẩm trong cache, None nếu chưa có (hoặc không còn hợp lệ)."""
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        try:
+            return self.parse_product_json(self.parse_response(cached))
+        except Exception:
+            return None
+
+    def split_batch_response(self, items, count: int) -> list:
+        """Tách JSON array của batch thành từng sản phẩm (dict hoặc Exception), kiểm tra độc lập."""
+        if not isinstance(items, list) or len(items) != count:
+            size = len(items) if isinstance(items, list) else type(items).__name__
+            error = MalformedResponseError(f"LLM trả về {size} phần tử thay vì {count}")
+            return [error] * count
+
+        results = []
+        for item in items:
+            try:
+                results.append(self.parse_product_json(item))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def generate_json_batch(self, products: list[str], cache_keys: list[str] | None = None) -> list:
+        """
+        Chuyển nhiều sản phẩm sang JSON Shopify, gom tối đa max_batch_products sản phẩm
+        vào một request. Trả về list cùng thứ tự đầu vào: dict nếu thành công, Exception nếu lỗi.
+
+        Cache theo từng sản phẩm, không theo cả batch: sản phẩm đã có trong cache được lấy ra
+        trước, chỉ sản phẩm chưa có mới được gom batch, và mỗi phần tử hợp lệ của response batch
+        được lưu dưới khoá của chính sản phẩm đó (mặc định là khoá như khi gửi riêng lẻ).
+        Caller đã tự tra cache (vd. khoá theo text trước khi rút gọn) thì truyền `cache_keys`
+        của các sản phẩm chưa có, khi đó cache không bị tra lại.
+
+        Sản phẩm hỏng trong response của batch được gửi lại riêng lẻ; lỗi khi gọi API
+        (quota, mạng) áp dụng cho cả batch để không gửi thêm request ngay lập tức.
+        """
+        results = [None] * len(products)
+        if cache_keys is None:
+            cache_keys = [self.product_cache_key(product) for product in products]
+            results = [self.cached_product(key) for key in cache_keys]
+        misses = [index for index, result in enumerate(results) if result is None]
+
+        for planned in self.plan_batches([products[index] for index in misses]):
+            batch = [misses[position] for position in planned]
+            if len(batch) == 1:
+                results[batch[0]] = self.convert_product(products[batch[0]], miss_key=cache_keys[batch[0]])
+                continue
+
+            try:
+                prompt = generate_batch_prompt([products[i] for i in batch])
+                data = self.generate_content(prompt, len(batch), batch=True)
+                items = self.split_batch_response(data, len(batch))
+            except json.JSONDecodeError as e:
+                items = [e] * len(batch)
+            except Exception as e:
+                print(f"Lỗi khi gọi API Gemini cho batch {len(batch)} sản phẩm: {e}")
+                for index in batch:
+                    results[index] = e
+                continue
+
+            failed = sum(isinstance(item, Exception) for item in items)
+            if failed:
+                print(f"[x] {failed}/{len(batch)} sản phẩm trong batch lỗi, gửi lại riêng từng sản phẩm")
+            for index, item in zip(batch, items):
+                if isinstance(item, Exception):
+                    results[index] = self.convert_product(products[index], miss_key=cache_keys[index])
+                    continue
+                self.cache.put(cache_keys[index], self.model_name, json.dumps(item, ensure_ascii=False))
+                results[index] = item
+        return results
@@ -1,3 +1,5 @@
+import json
+
 standard_prompt = """
 Xử lý dữ liệu sản phẩm thô và chuyển đổi thành định dạng JSON chuẩn Shopify và dịch mô tả sản phẩm sang tiếng Việt.
 
@@ -12,7 +14,7 @@ YÊU CẦU QUAN TRỌNG NHẤT:
 PROCESSING RULES:
 1. Làm sạch dữ liệu, loại bỏ thông tin không cần thiết
 2. Nếu thiếu thông tin, điền chuỗi rỗng ""
-3. Image Src: chỉ lấy 1 trong các URL hình ảnh
+3. Image Src: để chuỗi rỗng "" (ảnh sản phẩm được lấy riêng)
 4. Body (HTML): giữ nguyên HTML tags, escape quotes thành \"
 5. Variant Inventory Qty: mặc định "20"
 6. Vendor: lấy từ thương hiệu/brand
@@ -88,6 +90,29 @@ VALIDATION CHECKLIST:
 PRODUCT DATA:
 """
 
+# Cấu trúc JSON Shopify lấy thẳng từ prompt để danh sách key chỉ khai báo một nơi
+_structure = standard_prompt.split("REQUIRED JSON STRUCTURE (EXACT ORDER):", 1)[1]
+SHOPIFY_TEMPLATE = json.loads(_structure[:_structure.index("}") + 1])
+SHOPIFY_FIELDS = list(SHOPIFY_TEMPLATE)
+
+# Response schema cho structured output của Gemini: mọi field Shopify đều là chuỗi và bắt buộc
+PRODUCT_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {field: {"type": "STRING"} for field in SHOPIFY_FIELDS},
+    "required": SHOPIFY_FIELDS,
+}
+BATCH_RESPONSE_SCHEMA = {"type": "ARRAY", "items": PRODUCT_RESPONSE_SCHEMA}
+
+BATCH_PRODUCT_MARKER = "### PRODUCT {index} ###"
+
+batch_instructions = """
+CHẾ ĐỘ NHIỀU SẢN PHẨM (áp dụng thay cho yêu cầu "một JSON object" ở trên):
+- Dữ liệu bên dưới gồm {count} sản phẩm độc lập, mỗi sản phẩm bắt đầu bằng dòng "### PRODUCT i ###"
+- Trả về CHÍNH XÁC một JSON array gồm {count} object, object thứ i ứng với PRODUCT i
+- Mỗi object tuân theo đúng REQUIRED JSON STRUCTURE ở trên
+- Không gộp, không bỏ sót, không đổi thứ tự sản phẩm
+"""
+
 
 def generate_prompt(product_data: str) -> str:
     """
@@ -112,6 +137,27 @@ def generate_prompt(product_data: str) -> str:
     )
 
 
+def generate_batch_prompt(products: list[str]) -> str:
+    """
+    Prompt cho nhiều sản phẩm trong một request: phần quy tắc và cấu trúc JSON
+    chỉ gửi một lần, model trả về JSON array theo đúng thứ tự sản phẩm.
+    """
+    if not products or any(not product or not product.strip() for product in products):
+        raise ValueError("Product data cannot be empty")
+
+    blocks = "\n\n".join(
+        BATCH_PRODUCT_MARKER.format(index=index) + "\n" + product.strip()
+        for index, product in enumerate(products, start=1)
+    )
+    return (
+            standard_prompt +
+            batch_instructions.format(count=len(products)) + "\n" +
+            blocks +
+            f"\n\nIMPORTANT: Return ONLY a JSON array of {len(products)} objects in product order. "
+            "No explanations, no markdown, no additional text."
+    )
+
+
 # Alternative more structured prompt for better results
 def generate_structured_prompt(product_data: str) -> str:
     """
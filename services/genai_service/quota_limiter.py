@@ -0,0 +1,70 @@
+try:
+    import time, threading
+    from collections import deque
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+WINDOW_SECONDS = 60
+
+
+class QuotaLimiter:
+    """
+    Giới hạn request gửi tới LLM theo quota của API: tối đa `requests_per_minute` request
+    và `tokens_per_minute` token (ước lượng input + output) trong mọi cửa sổ 60 giây trượt.
+
+    Dùng chung cho mọi thread của LLMStage. Khi API báo hết quota, `pause()` cho toàn bộ
+    thread nghỉ thay vì để từng thread tự gửi thêm request và lại bị từ chối.
+    Giá trị <= 0 nghĩa là không giới hạn.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._usage: deque[tuple[float, int]] = deque()
+        self._tokens_in_window = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        self.wait_seconds = 0.0
+
+    def _expire(self, now: float):
+        while self._usage and now - self._usage[0][0] >= WINDOW_SECONDS:
+            _, tokens = self._usage.popleft()
+            self._tokens_in_window -= tokens
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = max(0.0, self._paused_until - now)
+        if self.requests_per_minute > 0 and len(self._usage) >= self.requests_per_minute:
+            index = len(self._usage) - int(self.requests_per_minute)
+            wait = max(wait, self._usage[index][0] + WINDOW_SECONDS - now)
+        if self.tokens_per_minute > 0 and self._usage:
+            # Một request lớn hơn cả quota vẫn được gửi khi cửa sổ trống, tránh chờ mãi
+            excess = self._tokens_in_window + tokens - self.tokens_per_minute
+            for timestamp, used in self._usage:
+                if excess <= 0:
+                    break
+                excess -= used
+                wait = max(wait, timestamp + WINDOW_SECONDS - now)
+        return wait
+
+    def acquire(self, tokens: int, should_stop=lambda: False) -> bool:
+        """Chờ tới khi gửi được một request dùng `tokens` token; False nếu bị dừng giữa chừng."""
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                if should_stop():
+                    return False
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._wait_time(tokens, now)
+                if wait <= 0:
+                    self._usage.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    self.wait_seconds += now - start
+                    return True
+                # Chờ từng đoạn ngắn để còn kiểm tra should_stop
+                self._condition.wait(min(wait, 1.0))
+
+    def pause(self, seconds: float):
+        """Tạm dừng mọi request trong `seconds` giây (API vừa báo hết quota)."""
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
@@ -0,0 +1,104 @@
+try:
+    import os, json, time, hashlib, sqlite3, threading
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+
+def cache_key(prompt: str, model_name: str, generation_config: dict) -> str:
+    """Khoá cache: hash của toàn bộ prompt, tên model và generation config (sắp xếp key)."""
+    payload = json.dumps({"model": model_name, "config": generation_config, "prompt": prompt},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Cache response của Gemini trên đĩa (SQLite), dùng lại kết quả cho prompt giống hệt
+    (chạy lại job, URL trùng, cùng sản phẩm trên hai site).
+
+    - Khoá gồm prompt, model và generation config: đổi prompt hoặc cấu hình là cache miss.
+    - Khi tổng dung lượng response vượt `max_size_mb`, các mục lâu không dùng nhất bị xoá (LRU).
+    - `enabled = False` bỏ qua cache hoàn toàn (không đọc, không ghi).
+
+    Có thể dùng từ nhiều thread.
+    """
+
+    def __init__(self, db_path: str, max_size_mb: float = 200, enabled: bool = True):
+        self.enabled = enabled
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if not enabled:
+            return
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used_at)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, key: str, model_name: str, response: str):
+        if not self.enabled:
+            return
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, model_name, response, size, now, now))
+            self._total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """Xoá các response lâu không dùng nhất cho tới khi tổng dung lượng dưới giới hạn."""
+        while self._total_bytes > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY last_used_at LIMIT 100").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    return
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return "cache LLM đang tắt"
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return (f"cache LLM: {self.hits} hit / {self.misses} miss ({rate:.0f}%), "
+                f"{self._total_bytes / (1024 * 1024):.1f} MB")
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+            self._db = None
@@ -18,10 +18,28 @@ class JSONToCSVConverter:
         """
         return [data.get(h, "") for h in self.headers]
 
-    def append_to_csv(self, data):
+    def image_rows(self, data: Dict, images: list) -> list:
+        """
+        Gán ảnh đầu tiên vào dòng sản phẩm, các ảnh còn lại thành các dòng ảnh phụ
+        theo định dạng Shopify (chỉ có Handle, Image Src, Image Position).
+        """
+        data["Image Src"] = images[0]
+        data["Image Position"] = "1"
+        rows = []
+        for position, image in enumerate(images[1:], start=2):
+            rows.append(self.json_to_csv_row({
+                "Handle": data.get("Handle", ""),
+                "Image Src": image,
+                "Image Position": str(position),
+            }))
+        return rows
+
+    def append_to_csv(self, data, images: list | None = None) -> bool:
         """
         Ghi dòng CSV mới xuống cuối file, nếu Handle chưa tồn tại.
+        Trả về False nếu dòng bị bỏ qua vì trùng Handle.
         Nếu file chưa tồn tại thì tạo file mới với header lấy từ JSON truyền vào.
+        `images` là danh sách URL ảnh đã bóc tách riêng, ghi đè Image Src của JSON.
         """
         # Nếu data là string thì parse thành dict
         if isinstance(data, str):
@@ -30,6 +48,7 @@ class JSONToCSVConverter:
         if self.headers is None:
             self.headers = list(data.keys())
 
+        extra_rows = self.image_rows(data, images) if images else []
         row = self.json_to_csv_row(data)
         write_header = False
         existing_handles = set()
@@ -48,10 +67,12 @@ class JSONToCSVConverter:
         # Kiểm tra trùng Handle
         if data.get('Handle') in existing_handles:
             print(f"Handle {data.get('Handle')} đã tồn tại, bỏ qua.")
-            return
+            return False
 
         with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             if write_header:
                 writer.writerow(self.headers)
             writer.writerow(row)
+            writer.writerows(extra_rows)
+        return True
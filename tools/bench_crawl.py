@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline cho CrawlWorker: phục vụ trang sản phẩm đã lưu của từng site trong
+crawl-config.json bằng một web server cục bộ rồi cào lại, không cần truy cập shop thật.
+
+Sử dụng:
+    python tools/bench_crawl.py --fixtures <thư mục> --mode both --latency-ms 150
+    python tools/bench_crawl.py --site AAEON --pages 20 --lazy-ms 300 --third-party-ms 800 --json result.json
+
+Thư mục fixtures có dạng <fixtures>/<tên site>/*.html (HTML đã lưu, ví dụ từ snapshot).
+Site không có trang đã lưu được dùng trang tổng hợp sinh từ product_selector / image_selector.
+
+Web server giả lập:
+- `--latency-ms`: độ trễ phản hồi của trang HTML (TTFB).
+- `--lazy-ms`: nội dung lazy-load được thêm vào product_selector khi trang được cuộn
+  tới cuối, sau bấy nhiêu ms (chỉ trình duyệt + scroll_to_load mới lấy được).
+- `--third-party-ms`: script bên thứ ba chậm được chèn vào cuối trang (chặn DOMContentLoaded).
+
+Báo cáo: số trang/giây, p50/p95 từng giai đoạn (launch, goto, selector, scroll,
+stable, extract với trình duyệt; fetch, extract với HTTP), số trang lấy đủ nội dung
+lazy-load và RSS đỉnh của cả cây process (Python + trình duyệt, cần psutil).
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from services.crawl_service.crawl_worker import CrawlWorker
+from services.crawl_service.memory_monitor import MemoryMonitor, MB
+
+LAZY_MARKER = "BENCH-LAZY-CONTENT"
+THIRD_PARTY_PATH = "/third-party/tracker.js"
+PIXEL_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+# Thêm nội dung vào product_selector khi người dùng cuộn tới cuối trang (giống site lazy-load thật)
+LAZY_LOAD_SCRIPT = """
+<script>
+(() => {
+    const selector = %s;
+    const delayMs = %d;
+    let loaded = false;
+    const load = () => {
+        if (loaded) return;
+        const target = document.querySelector(selector);
+        if (!target) return;
+        loaded = true;
+        setTimeout(() => {
+            const block = document.createElement('div');
+            block.innerHTML = '<p>%s</p><table><tr><td>Spec</td><td>Value</td></tr></table>';
+            target.appendChild(block);
+        }, delayMs);
+    };
+    window.addEventListener('scroll', () => {
+        if (window.innerHeight + window.scrollY >= document.documentElement.scrollHeight - 200) load();
+    }, { passive: true });
+})();
+</script>
+"""
+
+SELECTOR_PART_PATTERN = re.compile(r"([#.]?)([A-Za-z0-9_-]+)")
+
+
+def element_for_compound(compound: str) -> tuple[str, str] | None:
+    """Thẻ mở / đóng khớp một compound selector đơn giản (tag#id.class), None nếu không dựng được."""
+    if not re.fullmatch(r"[A-Za-z0-9_#.-]+", compound):
+        return None
+    tag = "div"
+    element_id = None
+    classes = []
+    for prefix, name in SELECTOR_PART_PATTERN.findall(compound):
+        if prefix == "#":
+            element_id = name
+        elif prefix == ".":
+            classes.append(name)
+        else:
+            tag = name
+    attributes = ""
+    if element_id:
+        attributes += f' id="{element_id}"'
+    if classes:
+        attributes += f' class="{" ".join(classes)}"'
+    return f"<{tag}{attributes}>", f"</{tag}>"
+
+
+def wrap_selector(selector: str, inner: str) -> str | None:
+    """Dựng HTML lồng nhau khớp selector con cháu ("div.a div.b"), None nếu selector quá phức tạp."""
+    compounds = selector.split()
+    result = inner
+    for compound in reversed(compounds):
+        element = element_for_compound(compound)
+        if element is None:
+            return None
+        result = element[0] + result + element[1]
+    return result
+
+
+def synthetic_page(site: dict, index: int) -> str | None:
+    """Trang sản phẩm tổng hợp cho site chưa có trang đã lưu."""
+    description = "".join(
+        f"<p>Product {index} feature {line}: industrial grade component with extended temperature range.</p>"
+        for line in range(40)
+    )
+    specs = "".join(f"<tr><td>Spec {row}</td><td>Value {row * index}</td></tr>" for row in range(30))
+    images = "".join(
+        f'<img src="/img/spacer.gif" data-src="/img/{index}-{n}.png" '
+        f'srcset="/img/{index}-{n}-400.png 400w, /img/{index}-{n}-1200.png 1200w">'
+        for n in range(4)
+    )
+    product_selector = site["product_selector"]
+    image_selector = site.get("image_selector") or f"{product_selector} img"
+    image_container = image_selector[:-len(" img")] if image_selector.endswith(" img") else product_selector
+    inside = outside = ""
+    if image_container == product_selector:
+        inside = images
+    elif image_container.startswith(product_selector + " "):
+        inside = wrap_selector(image_container[len(product_selector):].strip(), images)
+    else:
+        outside = wrap_selector(image_container, images)
+
+    body = f"<h1>Product {index}</h1>{description}<table>{specs}</table>{inside or ''}"
+    product = wrap_selector(product_selector, body)
+    if product is None:
+        return None
+    product += outside or ""
+    navigation = "".join(f'<a href="/category/{n}">Category {n}</a>' for n in range(50))
+    return (f"<!DOCTYPE html><html><head><title>Product {index}</title></head>"
+            f"<body><nav>{navigation}</nav><main>{product}</main><footer>Footer</footer></body></html>")
+
+
+def load_fixtures(site: dict, fixtures_dir: Path | None, pages: int) -> list[str]:
+    if fixtures_dir:
+        site_dir = fixtures_dir / site["name"]
+        files = sorted(site_dir.glob("*.html")) if site_dir.is_dir() else []
+        if files:
+            return [f.read_text(encoding="utf-8", errors="replace") for f in files[:pages]]
+    documents = [synthetic_page(site, index) for index in range(pages)]
+    if any(document is None for document in documents):
+        print(f"[x] Bỏ qua {site['name']}: không có trang đã lưu và selector quá phức tạp để sinh trang")
+        return []
+    return documents
+
+
+class FixtureServer:
+    """Web server cục bộ phục vụ trang đã lưu với độ trễ, lazy-load và script chậm giả lập."""
+
+    def __init__(self, pages: dict[str, list[str]], sites: dict[str, dict], latency_ms: int,
+                 lazy_ms: int, third_party_ms: int):
+        self.pages = pages
+        self.sites = sites
+        self.latency_ms = latency_ms
+        self.lazy_ms = lazy_ms
+        self.third_party_ms = third_party_ms
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def url_for(self, site_name: str, index: int) -> str:
+        return f"{self.base_url}/site/{site_name}/{index}.html"
+
+    def render(self, site_name: str, document: str) -> str:
+        extra = ""
+        if self.lazy_ms >= 0:
+            selector = self.sites[site_name]["product_selector"]
+            extra += LAZY_LOAD_SCRIPT % (json.dumps(selector), self.lazy_ms, LAZY_MARKER)
+        if self.third_party_ms > 0:
+            extra += f'<script src="{THIRD_PARTY_PATH}"></script>'
+        if "</body>" in document:
+            return document.replace("</body>", extra + "</body>", 1)
+        return document + extra
+
+    def handle(self, request):
+        path = unquote(urlparse(request.path).path)
+        match = re.fullmatch(r"/site/(.+)/(\d+)\.html", path)
+        if match and match.group(1) in self.pages and int(match.group(2)) < len(self.pages[match.group(1)]):
+            time.sleep(self.latency_ms / 1000)
+            body = self.render(match.group(1), self.pages[match.group(1)][int(match.group(2))]).encode("utf-8")
+            content_type = "text/html; charset=utf-8"
+        elif path == THIRD_PARTY_PATH:
+            time.sleep(self.third_party_ms / 1000)
+            body = b"window.__benchTracker = true;"
+            content_type = "application/javascript"
+        elif path.startswith("/img/"):
+            body = PIXEL_PNG
+            content_type = "image/png"
+        else:
+            request.send_error(404)
+            return
+        request.send_response(200)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))]
+
+
+def run_mode(mode: str, targets: list[tuple[str, dict]], headless: bool) -> dict:
+    """Cào toàn bộ trang bằng một CrawlWorker mới ở chế độ "browser" hoặc "http"."""
+    crawl_worker = CrawlWorker(headless=headless)
+    # Không đọc/ghi vào kho snapshot thật
+    if crawl_worker.snapshot_store:
+        crawl_worker.snapshot_store.close()
+        crawl_worker.snapshot_store = None
+    monitor = MemoryMonitor(interval=0)
+    monitor.sample(force=True)
+
+    phases: dict[str, list[float]] = {}
+    page_times = []
+    found = complete = 0
+    try:
+        started = time.perf_counter()
+        if mode == "browser":
+            launch_start = time.perf_counter()
+            crawl_worker.browser_pool.start()
+            phases["launch"] = [(time.perf_counter() - launch_start) * 1000]
+            monitor.sample(force=True)
+
+        for url, site_config in targets:
+            page_start = time.perf_counter()
+            try:
+                if mode == "browser":
+                    crawl_output = crawl_worker.crawl_product_browser(url, site_config)
+                else:
+                    crawl_output = crawl_worker.crawl_product_http(url, site_config)
+            except Exception as e:
+                print(f"[x] Lỗi khi cào {url}: {e}")
+                crawl_output = None
+            page_times.append((time.perf_counter() - page_start) * 1000)
+            for name, ms in crawl_worker.last_phase_timings.items():
+                phases.setdefault(name, []).append(ms)
+            if crawl_output:
+                found += 1
+                complete += LAZY_MARKER in crawl_output["text"]
+            monitor.sample(force=True)
+        elapsed = time.perf_counter() - started
+    finally:
+        crawl_worker.close()
+
+    return {
+        "mode": mode,
+        "pages": len(targets),
+        "found": found,
+        "lazy_complete": complete,
+        "seconds": elapsed,
+        "pages_per_second": len(targets) / elapsed if elapsed else 0.0,
+        "phases": {
+            name: {"p50_ms": percentile(values, 0.5), "p95_ms": percentile(values, 0.95)}
+            for name, values in list(phases.items()) + [("page", page_times)] if values
+        },
+        "peak_rss_mb": monitor.peak_bytes / MB if monitor.available else None,
+    }
+
+
+def print_report(result: dict):
+    rss = f"{result['peak_rss_mb']:.0f} MB" if result["peak_rss_mb"] is not None else "n/a (chưa cài psutil)"
+    print(f"\n== {result['mode']}: {result['pages']} trang trong {result['seconds']:.1f}s "
+          f"({result['pages_per_second']:.2f} trang/s), tìm thấy selector {result['found']}, "
+          f"đủ nội dung lazy-load {result['lazy_complete']}, RSS đỉnh {rss}")
+    print(f"{'phase':<10} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, stats in result["phases"].items():
+        print(f"{name:<10} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cào dữ liệu offline với web server cục bộ")
+    parser.add_argument("--fixtures", type=Path, help="Thư mục <tên site>/*.html chứa trang đã lưu")
+    parser.add_argument("--site", action="append", help="Chỉ chạy site này (tên hoặc domain), lặp lại được")
+    parser.add_argument("--pages", type=int, default=10, help="Số trang tối đa mỗi site")
+    parser.add_argument("--mode", choices=["browser", "http", "both"], default="both")
+    parser.add_argument("--latency-ms", type=int, default=100, help="Độ trễ phản hồi trang HTML")
+    parser.add_argument("--lazy-ms", type=int, default=200,
+                        help="Độ trễ thêm nội dung lazy-load sau khi cuộn (-1 để tắt)")
+    parser.add_argument("--third-party-ms", type=int, default=0, help="Độ trễ của script bên thứ ba (0 để tắt)")
+    parser.add_argument("--headed", action="store_true", help="Hiện cửa sổ trình duyệt")
+    parser.add_argument("--json", type=Path, help="Ghi kết quả ra file JSON để so sánh giữa các lần chạy")
+    args = parser.parse_args()
+
+    with open(PROJECT_ROOT / "config" / "crawl-config.json", "r", encoding="utf-8") as f:
+        websites = json.load(f)["websites"]
+    if args.site:
+        websites = [site for site in websites if site["name"] in args.site or site["domain"] in args.site]
+    if not websites:
+        raise SystemExit("[x] Không có site nào để benchmark")
+
+    sites = {site["name"]: site for site in websites}
+    pages = {name: load_fixtures(site, args.fixtures, args.pages) for name, site in sites.items()}
+    pages = {name: documents for name, documents in pages.items() if documents}
+    server = FixtureServer(pages, sites, args.latency_ms, args.lazy_ms, args.third_party_ms)
+    server.start()
+    targets = [(server.url_for(name, index), sites[name])
+               for name, documents in pages.items() for index in range(len(documents))]
+    print(f"[>] Phục vụ {len(targets)} trang của {len(pages)} site tại {server.base_url} "
+          f"(trễ {args.latency_ms}ms, lazy-load {args.lazy_ms}ms, script bên thứ ba {args.third_party_ms}ms)")
+
+    modes = ["browser", "http"] if args.mode == "both" else [args.mode]
+    results = []
+    try:
+        for mode in modes:
+            results.append(run_mode(mode, targets, headless=not args.headed))
+    finally:
+        server.close()
+
+    for result in results:
+        print_report(result)
+    if args.json:
+        args.json.write_text(json.dumps({"args": {k: str(v) for k, v in vars(args).items()},
+                                         "results": results}, indent=2), encoding="utf-8")
+        print(f"\n[v] Đã ghi kết quả vào {args.json}")
+
+
+if __name__ == "__main__":
+    main()
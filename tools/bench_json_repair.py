@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+So sánh parser JSON dễ dãi (services/genai_service/lenient_json.py) với chuỗi regex sửa JSON
+trước đây của LLMWorker, trên một bộ response hỏng của Gemini: độ chính xác và thời gian parse.
+
+Sử dụng:
+    python tools/bench_json_repair.py
+    python tools/bench_json_repair.py --corpus <thư mục> --repeat 200 --large-kb 32 --json result.json
+
+Mỗi case trong corpus là `<tên>.txt` (response nguyên văn) và `<tên>.expected.json` (JSON đúng
+mong đợi; với response bị cắt cụt là phần dữ liệu có trong response). Thêm response hỏng
+thật (ví dụ từ log) vào corpus bằng cách đặt cặp file tương tự. `--large-kb` thêm một case
+tổng hợp có Body (HTML) lớn cỡ response 8k token để đo tốc độ.
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from services.genai_service.lenient_json import loads_lenient
+
+DEFAULT_CORPUS = Path(__file__).parent / "json_corpus"
+
+
+# ---------------------------------------------------------------------------
+# Chuỗi regex cũ, chép nguyên từ LLMWorker (chỉ bỏ print và file debug) để làm mốc so sánh
+# ---------------------------------------------------------------------------
+
+def extract_json_from_response(text: str) -> str:
+    """
+    Trích xuất JSON từ response của AI model
+    """
+    if not text:
+        return ""
+
+    # Loại bỏ markdown code blocks
+    text = re.sub(r'```json\s*', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'```\s*$', '', text, flags=re.MULTILINE)
+
+    # Tìm JSON object bắt đầu bằng {
+    start_idx = text.find('{')
+    if start_idx == -1:
+        return text.strip()
+
+    # Tìm JSON object kết thúc bằng } (đếm brackets)
+    brace_count = 0
+    end_idx = len(text)
+
+    for i in range(start_idx, len(text)):
+        if text[i] == '{':
+            brace_count += 1
+        elif text[i] == '}':
+            brace_count -= 1
+            if brace_count == 0:
+                end_idx = i + 1
+                break
+
+    json_str = text[start_idx:end_idx].strip()
+    return json_str
+
+
+
+def fix_common_json_errors(json_str: str) -> str:
+    """
+    Sửa một số lỗi JSON phổ biến với logic cải thiện
+    """
+    try:
+        # Loại bỏ trailing commas
+        json_str = re.sub(r',(\s*[}\]])', r'\1', json_str)
+
+        # Fix unquoted property names (property: value -> "property": value)
+        # Tìm tất cả các property names không có quotes
+        json_str = re.sub(r'(?<=[{\s,])\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*:', r'"\1":', json_str)
+
+        # Convert single quotes to double quotes cho property names và values
+        # Nhưng cẩn thận với escaped quotes
+        json_str = re.sub(r"'([^'\\]*(?:\\.[^'\\]*)*)'", r'"\1"', json_str)
+
+        # Fix escaped newlines và các escape sequences khác
+        json_str = re.sub(r'\\n', r'\\\\n', json_str)  # Fix literal \n
+        json_str = re.sub(r'(?<!\\)\n', r'\\n', json_str)  # Escape actual newlines
+        json_str = re.sub(r'(?<!\\)\t', r'\\t', json_str)  # Escape tabs
+        json_str = re.sub(r'(?<!\\)\r', r'\\r', json_str)  # Escape carriage returns
+
+        # Fix unescaped quotes trong string values
+        # Tìm strings và escape quotes bên trong
+        def fix_quotes_in_strings(match):
+            content = match.group(1)
+            # Escape unescaped quotes inside the string
+            content = re.sub(r'(?<!\\)"', r'\\"', content)
+            return f'"{content}"'
+
+        json_str = re.sub(r'"([^"\\]*(?:\\.[^"\\]*)*)"', fix_quotes_in_strings, json_str)
+
+        return json_str
+    except Exception:
+        return json_str
+
+
+
+def validate_and_fix_json(json_str: str, max_attempts: int = 3) -> dict:
+    """
+    Validate và fix JSON với nhiều attempts
+    """
+    for attempt in range(max_attempts):
+        try:
+            return json.loads(json_str)
+        except json.JSONDecodeError as e:
+            if attempt == max_attempts - 1:
+                raise e
+
+            # Try more aggressive fixes
+            json_str = apply_aggressive_json_fixes(json_str, e)
+
+    raise ValueError("Could not fix JSON after maximum attempts")
+
+
+
+def apply_aggressive_json_fixes(json_str: str, error: json.JSONDecodeError) -> str:
+    """
+    Apply more aggressive JSON fixes based on specific error
+    """
+    error_msg = str(error).lower()
+
+    if "expecting property name" in error_msg:
+        # More aggressive property name fixing
+        json_str = re.sub(r'([{\s,])\s*([a-zA-Z_$][a-zA-Z0-9_$]*)\s*:', r'\1"\2":', json_str)
+
+    elif "expecting ',' delimiter" in error_msg:
+        # Fix missing commas
+        json_str = re.sub(r'}\s*{', r'},{', json_str)
+        json_str = re.sub(r']\s*[{\[]', r'],{', json_str)
+
+    elif "unterminated string" in error_msg:
+        # Try to fix unterminated strings
+        lines = json_str.split('\n')
+        for i, line in enumerate(lines):
+            # Count quotes in line
+            quote_count = line.count('"') - line.count('\\"')
+            if quote_count % 2 != 0:  # Odd number of quotes
+                lines[i] = line + '"'
+        json_str = '\n'.join(lines)
+
+    elif "expecting value" in error_msg:
+        # Fix common value issues
+        json_str = re.sub(r':\s*,', r': null,', json_str)
+        json_str = re.sub(r':\s*}', r': null}', json_str)
+
+    # Apply standard fixes again
+    return fix_common_json_errors(json_str)
+
+
+def regex_chain(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    json_str = extract_json_from_response(text)
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        return validate_and_fix_json(fix_common_json_errors(json_str))
+
+
+def lenient(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return loads_lenient(text)
+
+
+PARSERS = {"regex": regex_chain, "lenient": lenient}
+
+
+# ---------------------------------------------------------------------------
+# Corpus và đo
+# ---------------------------------------------------------------------------
+
+def load_corpus(corpus_dir: Path) -> list[tuple[str, str, object]]:
+    cases = []
+    for path in sorted(corpus_dir.glob("*.txt")):
+        expected_path = path.with_name(path.stem + ".expected.json")
+        if not expected_path.exists():
+            print(f"[x] Bỏ qua {path.name}: thiếu {expected_path.name}")
+            continue
+        expected = json.loads(expected_path.read_text(encoding="utf-8"))
+        cases.append((path.stem, path.read_text(encoding="utf-8"), expected))
+    return cases
+
+
+def large_case(size_kb: int) -> tuple[str, str, object]:
+    """Response lớn: Body (HTML) nhiều dòng có newline thật, dấu nháy HTML và trailing comma."""
+    line = '<li>Thông số <b class="spec">"{i}"</b>: điện áp 3.3V, dòng 120mA</li>'
+    lines = []
+    while sum(len(item) + 1 for item in lines) < size_kb * 1024:
+        lines.append(line.format(i=len(lines)))
+    body = "<ul>\n" + "\n".join(lines) + "\n</ul>"
+    expected = {"Handle": "large-product", "Title": "Large product", "Body (HTML)": body, "Status": "active"}
+    text = ('{\n"Handle": "large-product",\n"Title": "Large product",\n'
+            f'"Body (HTML)": "{body}",\n"Status": "active",\n}}')
+    return f"large-{size_kb}kb", text, expected
+
+
+def bench_case(parse, text: str, expected, repeat: int) -> dict:
+    try:
+        correct = parse(text) == expected
+        error = None
+    except Exception as e:
+        correct = False
+        error = f"{type(e).__name__}: {e}"
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            parse(text)
+        except Exception:
+            pass
+    elapsed_ms = (time.perf_counter() - start) / repeat * 1000
+    return {"correct": correct, "error": error, "ms": elapsed_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh parser JSON dễ dãi với chuỗi regex sửa JSON")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS,
+                        help="Thư mục chứa <tên>.txt và <tên>.expected.json")
+    parser.add_argument("--repeat", type=int, default=100, help="Số lần parse mỗi case để đo thời gian")
+    parser.add_argument("--large-kb", type=int, default=32, help="Kích thước case tổng hợp (0 để tắt)")
+    parser.add_argument("--json", type=Path, help="Ghi kết quả ra file JSON để so sánh giữa các lần chạy")
+    args = parser.parse_args()
+
+    cases = load_corpus(args.corpus)
+    if args.large_kb > 0:
+        cases.append(large_case(args.large_kb))
+    if not cases:
+        raise SystemExit(f"[x] Không có case nào trong {args.corpus}")
+    print(f"[>] {len(cases)} case, lặp {args.repeat} lần mỗi case\n")
+
+    results = {}
+    print(f"{'case':<40} " + " ".join(f"{name + ' ms':>12} {'ok':>3}" for name in PARSERS))
+    for name, text, expected in cases:
+        results[name] = {parser_name: bench_case(parse, text, expected, args.repeat)
+                         for parser_name, parse in PARSERS.items()}
+        row = " ".join(f"{r['ms']:>12.3f} {'v' if r['correct'] else 'x':>3}" for r in results[name].values())
+        print(f"{name:<40} {row}")
+
+    print()
+    for parser_name in PARSERS:
+        correct = sum(results[name][parser_name]["correct"] for name in results)
+        total_ms = sum(results[name][parser_name]["ms"] for name in results)
+        print(f"[v] {parser_name:<8} đúng {correct}/{len(results)} case, tổng {total_ms:.2f} ms / lượt")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"[v] Đã ghi kết quả vào {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark các backend parser của HtmlExtractor trên các trang sản phẩm đã lưu.
+
+Sử dụng:
+    python tools/bench_parsers.py <thư mục .html> --selector "div.product-info"
+    python tools/bench_parsers.py <thư mục .html> --site AAEON --repeat 5
+
+Mỗi backend chạy trong một process riêng để đo bộ nhớ đỉnh (RSS) độc lập,
+bao gồm cả bộ nhớ cấp phát bởi thư viện C (lxml, lexbor). Cột "py peak KB"
+là đỉnh heap Python (tracemalloc) khi bóc tách trang lớn nhất.
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+import multiprocessing
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from services.crawl_service.extractor import HtmlExtractor, PARSER_BACKENDS, backend_available
+
+
+def peak_rss_kb() -> int:
+    """Bộ nhớ RSS đỉnh của process hiện tại (KB)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) // 1024
+
+
+def bench_backend(backend: str, selector: str, pages: list[str], repeat: int, queue):
+    # Nạp sẵn thư viện để RSS nền không tính vào chi phí parse
+    extractor = HtmlExtractor(selector, backend)
+    extractor.extract("<html></html>")
+    baseline_kb = peak_rss_kb()
+
+    timings = []
+    found = 0
+    for _ in range(repeat):
+        for html in pages:
+            start = time.perf_counter()
+            result = extractor.extract(html)
+            timings.append((time.perf_counter() - start) * 1000)
+            found += result is not None
+
+    # Đo heap Python riêng, sau khi đã đo thời gian (tracemalloc làm chậm parse)
+    tracemalloc.start()
+    extractor.extract(max(pages, key=len))
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    queue.put({
+        "backend": backend,
+        "median_ms": statistics.median(timings),
+        "p95_ms": sorted(timings)[int(len(timings) * 0.95) - 1] if len(timings) > 1 else timings[0],
+        "total_ms": sum(timings),
+        "found": found // repeat,
+        "peak_rss_kb": peak_rss_kb() - baseline_kb,
+        "python_peak_kb": python_peak // 1024,
+    })
+
+
+def load_selector(args) -> str:
+    if args.selector:
+        return args.selector
+    config_path = PROJECT_ROOT / "config" / "crawl-config.json"
+    with open(config_path, "r", encoding="utf-8") as f:
+        websites = json.load(f)["websites"]
+    for site in websites:
+        if site["name"] == args.site or site["domain"] == args.site:
+            return site["product_selector"]
+    raise SystemExit(f"[x] Không tìm thấy site '{args.site}' trong {config_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh tốc độ và bộ nhớ của các backend parser")
+    parser.add_argument("pages_dir", help="Thư mục chứa các file .html đã lưu")
+    parser.add_argument("--selector", help="product_selector dùng để bóc tách")
+    parser.add_argument("--site", help="Tên hoặc domain site trong crawl-config.json để lấy selector")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp qua toàn bộ trang")
+    args = parser.parse_args()
+
+    if not args.selector and not args.site:
+        parser.error("Cần --selector hoặc --site")
+
+    selector = load_selector(args)
+    files = sorted(Path(args.pages_dir).glob("*.html"))
+    if not files:
+        raise SystemExit(f"[x] Không có file .html nào trong {args.pages_dir}")
+    pages = [f.read_text(encoding="utf-8", errors="replace") for f in files]
+    total_kb = sum(len(p.encode("utf-8")) for p in pages) // 1024
+    print(f"[>] {len(pages)} trang ({total_kb} KB), selector: {selector}, lặp {args.repeat} lần\n")
+
+    # spawn để process con không thừa hưởng RSS của process cha
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    results = []
+    for backend in PARSER_BACKENDS:
+        if not backend_available(backend):
+            print(f"[x] Bỏ qua {backend}: chưa cài đặt")
+            continue
+        process = context.Process(target=bench_backend,
+                                   args=(backend, selector, pages, args.repeat, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    print(f"{'backend':<12} {'median ms':>10} {'p95 ms':>10} {'total ms':>10} {'found':>6} {'peak RSS KB':>12} {'py peak KB':>11}")
+    for r in results:
+        print(f"{r['backend']:<12} {r['median_ms']:>10.2f} {r['p95_ms']:>10.2f} {r['total_ms']:>10.0f} "
+              f"{r['found']:>6} {r['peak_rss_kb']:>12} {r['python_peak_kb']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os, json
+from utils.resource_path import resource_path as path_to
+
+APP_CONFIG_PATH = path_to("CRAWL/config/app-config.json")
+
+
+def load_app_config() -> dict:
+    """
+    Đọc JSON cấu hình ứng dụng (config/app-config.json).
+    Trả về dict rỗng nếu file không tồn tại để các worker dùng giá trị mặc định.
+    """
+    if not os.path.exists(APP_CONFIG_PATH):
+        return {}
+    try:
+        with open(APP_CONFIG_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Lỗi JSON trong {APP_CONFIG_PATH}: {e}")
+
+
+def get_section(name: str, config: dict | None = None) -> dict:
+    """Trả về một section (dict) trong cấu hình ứng dụng, rỗng nếu không có."""
+    if config is None:
+        config = load_app_config()
+    section = config.get(name)
+    return section if isinstance(section, dict) else {}
@@ -2,18 +2,33 @@ import pandas as pd
 from datetime import datetime
 from typing import List
 import os
+import time
+import threading
+
+# Ghi lại toàn bộ workbook tốn O(số dòng), nên thay đổi được gom lại và lưu tối đa
+# một lần mỗi ngần này giây (và một lần khi gọi flush() cuối job)
+SAVE_INTERVAL_SECONDS = 10
+
 
 class ExcelManager:
-    def __init__(self, excel_file_path: str):
+    def __init__(self, excel_file_path: str, save_interval: float = SAVE_INTERVAL_SECONDS):
         """
         Khởi tạo class với đường dẫn file Excel
 
         Args:
             excel_file_path (str): Đường dẫn tới file Excel
+            save_interval (float): Số giây tối thiểu giữa hai lần lưu file, 0 để lưu sau mỗi thay đổi
         """
         self.excel_file_path = excel_file_path
+        self.save_interval = save_interval
         self.df = None
         self.links = []
+        self._url_index = None
+        self._row_index = {}
+        self._dirty = False
+        self._last_save = time.monotonic()
+        # Bước cào và các thread LLM cùng cập nhật file
+        self._lock = threading.RLock()
         self._load_excel_file()
         self._load_links()
 
@@ -32,6 +47,9 @@ class ExcelManager:
 
             if missing_columns:
                 raise ValueError(f"Thiếu các cột: {missing_columns}")
+
+            # Cột trống hoàn toàn bị pandas đọc thành float64, không ghi được chuỗi vào
+            self.df[['Crawled Time', 'Note']] = self.df[['Crawled Time', 'Note']].astype(object)
         except Exception as e:
             raise RuntimeError(f"Lỗi khi đọc file Excel: {str(e)}")
 
@@ -43,19 +61,73 @@ class ExcelManager:
             self.links = []
             for _, row in sorted_df.iterrows():
                 if pd.notna(row['Product URL']):  # bỏ nan
-                    self.links.append({
+                    link = {
                         'index': row['index'],  # index trong DataFrame
                         'stt': row['STT'],
                         'url': row['Product URL'],
                         'is_crawled': row['Is Crawled'],
                         'crawled_time': row['Crawled Time'],
                         'note': row['Note']
-                    })
+                    }
+                    self.links.append(link)
+                    self._row_index[link['index']] = link
 
         except Exception as e:
             print(f"Lỗi khi load links: {str(e)}")
             raise
 
+    def find_link(self, url: str) -> dict | None:
+        """Tìm link theo URL (dùng cho chế độ tìm URL từ sitemap)"""
+        with self._lock:
+            if self._url_index is None:
+                self._url_index = {link['url']: link for link in self.links}
+            return self._url_index.get(url)
+
+    def add_links(self, urls: List[str]) -> List[dict]:
+        """
+        Thêm các URL mới vào cuối bảng (STT tăng dần); file Excel được lưu theo save_interval.
+
+        Returns:
+            List[dict]: Các link vừa thêm, cùng định dạng với get_list_of_links()
+        """
+        if not urls:
+            return []
+
+        with self._lock:
+            return self._add_links(urls)
+
+    def _add_links(self, urls: List[str]) -> List[dict]:
+        next_stt = int(self.df['STT'].max()) + 1 if len(self.df) and pd.notna(self.df['STT'].max()) else 1
+        new_rows = pd.DataFrame({
+            'STT': range(next_stt, next_stt + len(urls)),
+            'Product URL': urls,
+            'Is Crawled': False,
+            'Crawled Time': None,
+            'Note': None,
+        })
+        start_index = self.df.index.max() + 1 if len(self.df) else 0
+        new_rows.index = range(start_index, start_index + len(urls))
+        self.df = pd.concat([self.df, new_rows])
+
+        new_links = []
+        for df_index, row in new_rows.iterrows():
+            link = {
+                'index': df_index,
+                'stt': row['STT'],
+                'url': row['Product URL'],
+                'is_crawled': False,
+                'crawled_time': None,
+                'note': None
+            }
+            self.links.append(link)
+            self._row_index[df_index] = link
+            if self._url_index is not None:
+                self._url_index[link['url']] = link
+            new_links.append(link)
+
+        self._mark_dirty()
+        return new_links
+
     def get_list_of_links(self) -> List[dict]:
         """
         Trả về danh sách tất cả links theo thứ tự
@@ -67,10 +139,14 @@ class ExcelManager:
 
     def update_link(self, index: int, is_crawled: bool, note: str = ""):
         """
-        Cập nhật trạng thái crawl cho một link theo STT và lưu ngay vào file Excel gốc
+        Cập nhật trạng thái crawl cho một link theo STT; file Excel gốc được lưu theo save_interval
         """
+        with self._lock:
+            self._update_link(index, is_crawled, note)
+
+    def _update_link(self, index: int, is_crawled: bool, note: str):
         try:
-            link_to_update = next((link for link in self.links if link['index'] == index), None)
+            link_to_update = self._row_index.get(index)
             if link_to_update is None:
                 raise ValueError(f"Không tìm thấy link với INDEX = {index}")
 
@@ -87,8 +163,7 @@ class ExcelManager:
             self.df.at[df_index, 'Crawled Time'] = current_time
             self.df.at[df_index, 'Note'] = note
 
-            # Lưu lại vào file Excel gốc
-            self.save_to_excel()
+            self._mark_dirty()
 
             print(f"Đã cập nhật link STT {index}: Crawled={is_crawled}, Time={current_time}")
 
@@ -96,10 +171,24 @@ class ExcelManager:
             print(f"Lỗi khi cập nhật link STT {index}: {str(e)}")
             raise
 
+    def _mark_dirty(self):
+        """Ghi nhận có thay đổi; lưu file nếu đã quá save_interval giây kể từ lần lưu trước."""
+        self._dirty = True
+        if time.monotonic() - self._last_save >= self.save_interval:
+            self.save_to_excel()
+
+    def flush(self):
+        """Lưu các thay đổi chưa ghi xuống file (gọi khi xong bước tìm URL và khi kết thúc job)."""
+        with self._lock:
+            if self._dirty:
+                self.save_to_excel()
+
     def save_to_excel(self):
         """Lưu DataFrame đã cập nhật ngược lại file Excel"""
         try:
             self.df.to_excel(self.excel_file_path, index=False)
+            self._dirty = False
+            self._last_save = time.monotonic()
             print(f"Đã lưu dữ liệu vào file: {self.excel_file_path}")
         except Exception as e:
             print(f"Lỗi khi lưu file Excel: {str(e)}")
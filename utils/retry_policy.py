@@ -0,0 +1,211 @@
+try:
+    import json, time, random, threading
+except ImportError as e:
+    raise ImportError(f"Thiếu thư viện cần thiết: {e} => Sử dụng: pip install -r requirements.txt")
+
+ERROR_NETWORK = "network"
+ERROR_TIMEOUT = "timeout"
+ERROR_THROTTLED = "throttled"
+ERROR_SELECTOR_MISSING = "selector_missing"
+ERROR_LLM_QUOTA = "llm_quota"
+ERROR_MALFORMED_JSON = "malformed_json"
+ERROR_FATAL = "fatal"
+
+# Nhận diện lỗi theo tên class trong MRO để không phải import playwright/httpx/google ở đây
+TIMEOUT_ERROR_NAMES = {"TimeoutError", "TimeoutException", "DeadlineExceeded"}
+NETWORK_ERROR_NAMES = {"ConnectionError", "TransportError", "NetworkError", "RemoteProtocolError",
+                       "ServiceUnavailable", "InternalServerError"}
+QUOTA_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests"}
+NETWORK_MESSAGE_MARKERS = ("net::err_", "connection reset", "connection refused", "connection closed",
+                           "name or service not known", "temporary failure in name resolution")
+
+# Các loại lỗi được tính vào circuit breaker: dấu hiệu site đang sập hoặc chặn
+SITE_DOWN_CATEGORIES = {ERROR_NETWORK, ERROR_TIMEOUT, ERROR_THROTTLED}
+
+# Cấu hình mặc định theo loại lỗi: độ trễ gốc (giây) và số lần thử lại tối đa (None = theo GUI)
+DEFAULT_CATEGORY_SETTINGS = {
+    ERROR_NETWORK: {"base_delay": 5, "max_retries": None},
+    ERROR_TIMEOUT: {"base_delay": 10, "max_retries": None},
+    # Bucket của domain đã nghỉ theo backoff của rate limiter, chỉ cần xếp lại cuối hàng
+    ERROR_THROTTLED: {"base_delay": 1, "max_retries": None},
+    ERROR_SELECTOR_MISSING: {"base_delay": 15, "max_retries": 1},
+    ERROR_LLM_QUOTA: {"base_delay": 30, "max_retries": None},
+    ERROR_MALFORMED_JSON: {"base_delay": 1, "max_retries": 2},
+    ERROR_FATAL: {"base_delay": 0, "max_retries": 0},
+}
+
+
+class SelectorMissingError(Exception):
+    """Trang tải được nhưng không tìm thấy product_selector (có thể do trang chưa render xong)."""
+
+    def __init__(self, url: str):
+        super().__init__(f"Không tìm thấy phần tử mô tả sản phẩm tại {url}")
+        self.url = url
+
+
+class CircuitOpenError(Exception):
+    """Link bị hoãn quá nhiều lần vì domain đang bị circuit breaker tạm ngưng."""
+
+    def __init__(self, domain: str):
+        super().__init__(f"Domain {domain} bị tạm ngưng truy cập quá lâu, bỏ qua link")
+        self.domain = domain
+
+
+class ClassifiedError(Exception):
+    """Lỗi đã được phân loại sẵn, dùng để chuyển lỗi từ process con về (exception gốc có thể không pickle được)."""
+
+    def __init__(self, message: str, category: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.category = category
+        self.retry_after = retry_after
+
+    def __reduce__(self):
+        return ClassifiedError, (str(self), self.category, self.retry_after)
+
+    @classmethod
+    def from_exception(cls, error: BaseException) -> "ClassifiedError":
+        return cls(str(error), classify_error(error), getattr(error, "retry_after", None))
+
+
+def _error_chain(error: BaseException):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def classify_error(error: BaseException) -> str:
+    """Phân loại lỗi (kể cả lỗi gốc bị bọc qua `raise ... from`) để chọn chiến lược thử lại."""
+    for exc in _error_chain(error):
+        if isinstance(exc, ClassifiedError):
+            return exc.category
+        names = {cls.__name__ for cls in type(exc).__mro__}
+        message = str(exc).lower()
+        if "ThrottledError" in names:
+            return ERROR_THROTTLED
+        if isinstance(exc, SelectorMissingError):
+            return ERROR_SELECTOR_MISSING
+        if isinstance(exc, json.JSONDecodeError) or "MalformedResponseError" in names:
+            return ERROR_MALFORMED_JSON
+        if names & QUOTA_ERROR_NAMES or "quota" in message or "resource has been exhausted" in message:
+            return ERROR_LLM_QUOTA
+        if names & TIMEOUT_ERROR_NAMES or ("timeout" in message and "exceeded" in message):
+            return ERROR_TIMEOUT
+        if names & NETWORK_ERROR_NAMES or any(marker in message for marker in NETWORK_MESSAGE_MARKERS):
+            return ERROR_NETWORK
+        status_code = getattr(getattr(exc, "response", None), "status_code", None)
+        if isinstance(status_code, int) and status_code >= 500:
+            return ERROR_NETWORK
+    return ERROR_FATAL
+
+
+class RetryPolicy:
+    """
+    Quyết định có thử lại một link hay không và sau bao lâu.
+
+    Độ trễ tăng theo lũy thừa 2 từ `base_delay` của từng loại lỗi, có jitter
+    (ngẫu nhiên trong [50%, 100%]) để các link lỗi cùng lúc không dồn lại cùng lúc,
+    và bị chặn trên bởi `max_delay`. Số lần đã thử được lưu ngay trong dict link
+    (`attempt`) để link có thể được xếp lại cuối hàng đợi.
+    """
+
+    def __init__(self, max_retries: int, max_delay: float = 300, category_settings: dict | None = None):
+        self.max_retries = max(0, int(max_retries))
+        self.max_delay = max_delay
+        self.category_settings = {name: dict(values) for name, values in DEFAULT_CATEGORY_SETTINGS.items()}
+        for name, values in (category_settings or {}).items():
+            self.category_settings.setdefault(name, {}).update(values)
+
+    def max_retries_for(self, category: str) -> int:
+        limit = self.category_settings.get(category, {}).get("max_retries")
+        return self.max_retries if limit is None else min(self.max_retries, limit)
+
+    def next_delay(self, link: dict, category: str) -> float | None:
+        """Ghi nhận một lần thất bại; trả về số giây chờ trước khi thử lại, None nếu bỏ cuộc."""
+        attempt = link.get("attempt", 0) + 1
+        link["attempt"] = attempt
+        if attempt > self.max_retries_for(category):
+            return None
+        base_delay = self.category_settings.get(category, {}).get("base_delay", 5)
+        delay = min(self.max_delay, base_delay * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker theo domain: sau `failure_threshold` lỗi liên tiếp kiểu site sập
+    (mạng, timeout, bị chặn) domain bị "mở mạch" trong `reset_timeout` giây, mọi link
+    của domain được hoãn lại thay vì tiếp tục gửi request. Hết thời gian, một request
+    thăm dò được cho qua; nếu vẫn lỗi, thời gian mở mạch tăng gấp đôi (tối đa
+    `max_reset_timeout`). Mỗi link chỉ được hoãn tối đa `max_deferrals` lần để job
+    luôn kết thúc kể cả khi site sập mãi.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60, max_reset_timeout: float = 900,
+                 max_deferrals: int = 30):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.max_deferrals = max(1, int(max_deferrals))
+        self._failures: dict[str, int] = {}
+        self._open_until: dict[str, float] = {}
+        self._open_count: dict[str, int] = {}
+        self._probing: set[str] = set()
+        self._lock = threading.Lock()
+
+    def retry_in(self, domain: str) -> float:
+        """0 nếu được phép gửi request tới domain, ngược lại số giây còn phải chờ."""
+        with self._lock:
+            open_until = self._open_until.get(domain)
+            if open_until is None:
+                return 0.0
+            remaining = open_until - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if domain in self._probing:
+                # Đang có request thăm dò, các link khác chờ kết quả
+                return min(self.reset_timeout, 5.0)
+            self._probing.add(domain)
+            return 0.0
+
+    def defer(self, link: dict) -> bool:
+        """Ghi nhận một lần hoãn link vì mạch đang mở; False nếu link đã hết lượt hoãn."""
+        deferrals = link.get("deferrals", 0) + 1
+        link["deferrals"] = deferrals
+        return deferrals <= self.max_deferrals
+
+    def release_probe(self, domain: str):
+        """
+        Kết thúc lượt thăm dò mà không tính thành công hay lỗi site sập (vd. lỗi selector,
+        lỗi fatal): lần gọi `retry_in` sau sẽ cho một request thăm dò khác đi qua.
+        """
+        with self._lock:
+            self._probing.discard(domain)
+
+    def is_open(self, domain: str) -> bool:
+        with self._lock:
+            return domain in self._open_until
+
+    def record_success(self, domain: str):
+        with self._lock:
+            self._failures.pop(domain, None)
+            self._open_until.pop(domain, None)
+            self._open_count.pop(domain, None)
+            self._probing.discard(domain)
+
+    def record_failure(self, domain: str) -> bool:
+        """Ghi nhận một lỗi kiểu site sập; trả về True nếu mạch vừa bị mở."""
+        with self._lock:
+            failures = self._failures.get(domain, 0) + 1
+            self._failures[domain] = failures
+            probing = domain in self._probing
+            self._probing.discard(domain)
+            if failures < self.failure_threshold and not probing:
+                return False
+
+            open_count = self._open_count.get(domain, 0) + 1
+            self._open_count[domain] = open_count
+            timeout = min(self.max_reset_timeout, self.reset_timeout * 2 ** (open_count - 1))
+            self._open_until[domain] = time.monotonic() + timeout
+            return True
@@ -7,8 +7,22 @@ from PyQt6.QtCore import Qt, QSettings, QThread, pyqtSignal
 from PyQt6.QtGui import QFont
 
 from utils.excel_file import ExcelManager
-from services.genai_service.llm_worker import LLMWorker
+from utils.app_config import get_section
+from utils.resource_path import resource_path as path_to
+from services.genai_service.llm_worker import LLMWorker, estimate_tokens
+from services.genai_service.llm_stage import LLMStage
+from services.genai_service.input_compactor import InputCompactor
 from services.crawl_service.crawl_worker import CrawlWorker
+from services.crawl_service.async_crawl_engine import AsyncCrawlEngine
+from services.crawl_service.url_discovery import DiscoveryFeed
+from services.crawl_service.crawl_process_pool import CrawlProcessPool
+from services.crawl_service.memory_monitor import MemoryMonitor
+from services.crawl_service.image_mirror import ImageMirror
+from services.crawl_service.change_detector import ChangeDetector, crawl_output_hash, UNCHANGED_NOTE
+from services.crawl_service.rate_limiter import (DomainRateLimiter, LinkScheduler, REFILL_SIZE,
+                                                 ThrottledError, link_domain)
+from utils.retry_policy import (RetryPolicy, CircuitBreaker, CircuitOpenError, SelectorMissingError,
+                                classify_error, SITE_DOWN_CATEGORIES, ERROR_SELECTOR_MISSING, ERROR_THROTTLED)
 from services.parser_service.csv_parser import JSONToCSVConverter
 
 
@@ -18,87 +32,449 @@ class CrawlThread(QThread):
     log_message = pyqtSignal(str)
     finished_crawling = pyqtSignal(bool, str)
 
-    def __init__(self, excel_path, api_key, output_folder, delay, retry, headless):
+    def __init__(self, excel_path, api_key, output_folder, delay, retry, headless, offline=False,
+                 discovery_url=""):
         super().__init__()
         self.excel_path = excel_path
+        self.discovery_url = discovery_url
         self.api_key = api_key
         self.output_folder = output_folder
         self.delay = delay
         self.retry = retry
         self.headless = headless
+        self.offline = offline
         self.should_stop = False
 
     def run(self):
+        crawl_worker = None
+        excel_manager = None
+        llm_worker = None
+        self.llm_stage = None
+        self.change_detector = None
+        feed = None
         try:
             # Initialize workers
-            crawl_worker = CrawlWorker()
+            crawl_worker = CrawlWorker(headless=self.headless, offline=self.offline)
             llm_worker = LLMWorker(self.api_key)
             convert_worker = JSONToCSVConverter(self.output_folder)
 
             # Read links from Excel
             excel_manager = ExcelManager(self.excel_path)
-            list_of_links = excel_manager.get_list_of_links()
-            num_of_links = len(list_of_links)
-
-            if num_of_links == 0:
-                self.finished_crawling.emit(False, "Không tìm thấy link nào trong file Excel!")
-                return
-
-            successful_crawls = 0
-
-            for link in list_of_links:
-                if self.should_stop:
-                    self.log_message.emit("Quá trình thu thập đã bị dừng bởi người dùng")
-                    break
+            if self.discovery_url:
+                # Link tìm được từ sitemap / danh mục được đưa vào vòng cào trong lúc đang tìm
+                feed = DiscoveryFeed(crawl_worker, self.discovery_url, excel_manager)
+                list_of_links = []
+            else:
+                list_of_links = excel_manager.get_list_of_links()
+                if not list_of_links:
+                    self.finished_crawling.emit(False, "Không tìm thấy link nào trong file Excel!")
+                    return
+            self.total_links = len(list_of_links)
+
+            self.unchanged_products = 0
+            # Sản phẩm có nội dung giống lần xử lý trước được bỏ qua LLM và ghi CSV
+            change_settings = get_section("change_detection")
+            if change_settings.get("enabled", False):
+                self.change_detector = ChangeDetector(
+                    path_to(change_settings.get("path", "CRAWL/io/content_hashes.sqlite3")))
+            # RSS của cả cây process: Python, trình duyệt và các process cào con
+            self.memory_monitor = MemoryMonitor()
+            self.memory_monitor.sample(force=True)
+
+            default_settings = get_section("default_settings")
+            max_concurrent = int(default_settings.get("max_concurrent_requests", 1))
+
+            retry_settings = get_section("retry_policy")
+            category_settings = dict(retry_settings.get("categories", {}))
+            if self.offline:
+                # Offline chỉ đọc snapshot: thiếu selector sẽ lặp lại y hệt nên không thử lại
+                category_settings[ERROR_SELECTOR_MISSING] = {"max_retries": 0}
+            self.retry_policy = RetryPolicy(
+                self.retry,
+                max_delay=retry_settings.get("max_delay_seconds", 300),
+                category_settings=category_settings,
+            )
+            self.circuit_breaker = CircuitBreaker(
+                failure_threshold=retry_settings.get("circuit_breaker_threshold", 5),
+                reset_timeout=retry_settings.get("circuit_breaker_reset_seconds", 60),
+                max_reset_timeout=retry_settings.get("circuit_breaker_max_reset_seconds", 900),
+                max_deferrals=retry_settings.get("circuit_breaker_max_deferrals", 30),
+            )
+            # Rút gọn text sản phẩm trước khi đưa vào prompt
+            compaction_settings = get_section("llm_compaction")
+            compactor = None
+            if compaction_settings.get("enabled", False):
+                compactor = InputCompactor(
+                    llm_worker.count_tokens if compaction_settings.get("exact_token_count", True) else estimate_tokens,
+                    estimate_tokens,
+                    max_input_tokens=compaction_settings.get("max_input_tokens", 0),
+                    boilerplate_min_pages=compaction_settings.get("boilerplate_min_pages", 10),
+                    boilerplate_ratio=compaction_settings.get("boilerplate_ratio", 0.8),
+                    max_images=compaction_settings.get("max_images", 0),
+                )
+
+            # Bước LLM chạy song song với bước cào, nhận link qua hàng đợi giới hạn
+            stage_settings = get_section("llm_stage")
+            llm_worker.should_stop = lambda: self.should_stop
+            self.llm_stage = LLMStage(
+                llm_worker, convert_worker, excel_manager, self.retry_policy, self.change_detector,
+                log=self.log_message.emit,
+                workers=stage_settings.get("workers", 1),
+                queue_size=stage_settings.get("queue_size", 20),
+                batch_wait_seconds=stage_settings.get("batch_wait_seconds", 2),
+                should_stop=lambda: self.should_stop,
+                compactor=compactor,
+            )
+            self.llm_stage.start()
+
+            process_workers = int(default_settings.get("process_workers", 1))
+            if process_workers <= 0:
+                process_workers = os.cpu_count() or 1
+
+            more_links = None
+            if feed:
+                self.log_message.emit(f"Đang tìm URL sản phẩm từ {self.discovery_url}")
+                feed.start(lambda: self.should_stop)
+                more_links = self.discovered_links(feed)
+
+            if process_workers > 1:
+                self.run_multiprocess(crawl_worker, excel_manager, list_of_links, process_workers, more_links)
+            # Chế độ offline chỉ đọc snapshot trên đĩa nên không cần chạy song song
+            elif max_concurrent > 1 and not self.offline:
+                self.run_concurrent(
+                    crawl_worker, excel_manager, list_of_links, max_concurrent,
+                    int(default_settings.get("max_concurrent_per_domain", 2)), more_links
+                )
+            else:
+                self.run_serial(crawl_worker, excel_manager, list_of_links, more_links)
+
+            if feed:
+                if feed.error and not feed.queued:
+                    raise feed.error
+                if feed.error:
+                    self.log_message.emit(f"Lỗi khi tìm URL sản phẩm: {str(feed.error)}")
+                self.log_message.emit(feed.summary())
+                if not feed.queued and not self.should_stop:
+                    self.finished_crawling.emit(False, "Không có sản phẩm mới hoặc thay đổi từ sitemap/danh mục!")
+                    return
+
+            # Chờ bước LLM xử lý nốt các sản phẩm còn trong hàng đợi và các lần thử lại
+            self.log_message.emit("Đã cào xong, đang chờ chuyển đổi các sản phẩm còn lại...")
+            self.llm_stage.drain()
+
+            if not self.should_stop:
+                self.mirror_images(convert_worker.csv_file)
+
+            self.memory_monitor.sample(force=True)
+            self.log_message.emit(f"Bộ nhớ của job: {self.memory_monitor.summary()}")
+            self.progress_updated.emit(100)
+            if self.unchanged_products:
+                self.log_message.emit(f"{self.unchanged_products} sản phẩm không thay đổi, đã bỏ qua LLM")
+            self.log_message.emit(llm_worker.cache.summary())
+            if compactor:
+                self.log_message.emit(compactor.summary())
 
-                # Update progress
-                progress = int((link['index']+1 / num_of_links) * 100)
-                self.progress_updated.emit(progress)
+            if self.should_stop:
+                self.finished_crawling.emit(False,
+                                            f"Quá trình bị dừng. Đã thu thập {self.llm_stage.successful}/{self.total_links} sản phẩm.")
+            else:
+                self.finished_crawling.emit(True,
+                                            f"Hoàn tất! Đã thu thập {self.llm_stage.successful}/{self.total_links} sản phẩm thành công.")
 
-                if not link['url'].startswith("http"):
-                    self.log_message.emit(f"Link thứ {link['index']+1} không hợp lệ: {link['url']}")
-                    continue
+        except Exception as e:
+            self.finished_crawling.emit(False, f"Lỗi nghiêm trọng: {str(e)}")
 
+        finally:
+            if self.llm_stage:
+                self.llm_stage.stop()
+            # Excel chỉ được lưu định kỳ trong lúc chạy, ghi nốt các thay đổi còn lại
+            if excel_manager:
                 try:
-                    self.log_message.emit(f"Đang thu thập dữ liệu từ link {link['index']+1}/{num_of_links}")
-                    crawl_output = crawl_worker.crawl_product(link['url'])
-
-                    if not crawl_output:
-                        self.log_message.emit(f"Không thể thu thập dữ liệu từ {link['url']}")
-                        continue
-
-                    self.log_message.emit(f"Đã thu thập dữ liệu từ {link['url']}")
-                    llm_output = llm_worker.generate_json_from_product(crawl_output)
+                    excel_manager.flush()
+                except Exception as e:
+                    self.log_message.emit(f"Lỗi khi lưu file Excel: {str(e)}")
+            # Đóng pool trình duyệt trong chính thread đã tạo ra nó
+            if crawl_worker:
+                crawl_worker.close()
+            if self.change_detector:
+                self.change_detector.close()
+            if llm_worker:
+                llm_worker.close()
+
+    def discovered_links(self, feed):
+        """
+        Hàm lấy link mới từ DiscoveryFeed cho vòng cào: trả về các link hợp lệ vừa tìm thấy
+        (tối đa `limit`), None khi đã tìm xong và vòng cào đã lấy hết link.
+        """
+        def more_links(limit):
+            if feed.finished:
+                return None
+            links = self.filter_valid_links(feed.poll(limit))
+            self.total_links += len(links)
+            return links
+        return more_links
+
+    def emit_progress(self, done):
+        self.progress_updated.emit(int(done / max(self.total_links, 1) * 100))
+
+    def mirror_images(self, csv_file):
+        """Tải ảnh trong CSV về thư mục output và thay URL ảnh (bật bằng image_mirror.enabled)."""
+        settings = get_section("image_mirror")
+        if not settings.get("enabled", False) or not os.path.exists(csv_file):
+            return
+        self.log_message.emit("Đang tải ảnh sản phẩm về thư mục output...")
+        mirror = ImageMirror(
+            os.path.dirname(os.path.abspath(csv_file)),
+            folder_name=settings.get("folder", "images"),
+            public_base_url=settings.get("public_base_url", ""),
+            max_concurrent=settings.get("max_concurrent", 16),
+            max_per_host=settings.get("max_per_host", 4),
+            timeout=settings.get("timeout", 30),
+        )
+        try:
+            replaced = mirror.rewrite_csv(csv_file)
+            self.log_message.emit(f"Đã thay {replaced} tham chiếu ảnh: {mirror.stats.summary()}")
+        except Exception as e:
+            # Ảnh lỗi không làm hỏng kết quả đã cào, chạy lại job sẽ tải tiếp phần còn thiếu
+            self.log_message.emit(f"Lỗi khi tải ảnh: {str(e)}")
+        finally:
+            mirror.close()
+
+    def run_serial(self, crawl_worker, excel_manager, list_of_links, more_links=None):
+        """Cào lần lượt từng link; link lỗi được xếp lại cuối hàng đợi thay vì chờ tại chỗ."""
+        valid_links = self.filter_valid_links(list_of_links)
+        done = len(list_of_links) - len(valid_links)
+        rate_limiter = self.create_rate_limiter(crawl_worker)
+        # Offline chỉ đọc đĩa nên không cần giới hạn tốc độ
+        needs_token = not self.offline
+        scheduler = LinkScheduler(valid_links, rate_limiter, needs_token=needs_token)
+        links = scheduler.iter_ready(lambda seconds: self.msleep(int(seconds * 1000)),
+                                     lambda: self.should_stop, more_links)
+
+        for link in links:
+            if self.should_stop:
+                break
+
+            domain = link_domain(link)
+            crawl_output = link.get('crawl_output')
+            error = None
+            if crawl_output is None:
+                wait = 0 if self.offline else self.circuit_breaker.retry_in(domain)
+                if wait > 0 and self.circuit_breaker.defer(link):
+                    scheduler.push(link, wait, needs_token=needs_token)
+                    continue
+                if wait > 0:
+                    error = CircuitOpenError(domain)
+                else:
+                    try:
+                        self.log_message.emit(f"Đang thu thập dữ liệu từ link {link['index']+1}/{self.total_links}")
+                        crawl_output = crawl_worker.crawl_product(link['url'])
+                        rate_limiter.record_success(domain)
+                    except ThrottledError as e:
+                        backoff = rate_limiter.record_throttled(domain, e.retry_after)
+                        self.log_message.emit(f"{e}, tạm dừng domain {backoff:.0f} giây")
+                        error = e
+                    except Exception as e:
+                        error = e
+
+            retry_delay = self.process_crawl_output(link, crawl_output, error, excel_manager)
+            if retry_delay is not None:
+                scheduler.push(link, retry_delay, needs_token=needs_token and 'crawl_output' not in link)
+                continue
+
+            done += 1
+            self.emit_progress(done)
+
+        if self.should_stop:
+            self.log_message.emit("Quá trình thu thập đã bị dừng bởi người dùng")
+
+    def run_multiprocess(self, crawl_worker, excel_manager, list_of_links, num_workers, more_links=None):
+        """
+        Cào bằng nhiều process (mỗi process một trình duyệt và CrawlWorker riêng), chia theo domain.
+        Thread này điều phối rate limit / circuit breaker và là nơi duy nhất gọi LLM,
+        ghi CSV và cập nhật Excel.
+        """
+        valid_links = self.filter_valid_links(list_of_links)
+        counters = {"done": len(list_of_links) - len(valid_links), "remaining": len(valid_links)}
+        rate_limiter = self.create_rate_limiter(crawl_worker)
+        needs_token = not self.offline
+
+        if more_links is None:
+            num_workers = min(num_workers, max(1, len(valid_links)))
+        pool = CrawlProcessPool(num_workers, self.headless, self.offline)
+        pool.assign_domains(valid_links)
+        schedulers = [LinkScheduler([], rate_limiter) for _ in range(pool.num_workers)]
+        for link in valid_links:
+            schedulers[pool.worker_for(link)].push(link, needs_token=needs_token)
+        idle = set(range(pool.num_workers))
+
+        def finish(worker_id, link, crawl_output, error):
+            retry_delay = self.process_crawl_output(link, crawl_output, error, excel_manager)
+            if retry_delay is not None:
+                schedulers[worker_id].push(link, retry_delay,
+                                           needs_token=needs_token and 'crawl_output' not in link)
+                return
+            counters["remaining"] -= 1
+            counters["done"] += 1
+            self.emit_progress(counters["done"])
 
-                    if not llm_output:
-                        self.log_message.emit(f"Lỗi khi chuyển đổi dữ liệu từ {link['url']}")
-                        continue
+        self.log_message.emit(f"Đang thu thập {len(valid_links)} link bằng {pool.num_workers} process")
+        pool.start()
+        try:
+            # Giới hạn số link đang chờ trong các scheduler khi link được tìm thấy dần
+            max_waiting = pool.num_workers * REFILL_SIZE
+            while (counters["remaining"] or more_links) and not self.should_stop:
+                if more_links and counters["remaining"] < max_waiting:
+                    new_links = more_links(max_waiting - counters["remaining"])
+                    if new_links is None:
+                        more_links = None
+                    else:
+                        for link in new_links:
+                            schedulers[pool.worker_for(link)].push(link, needs_token=needs_token)
+                        counters["remaining"] += len(new_links)
+                next_wait = 0.5
+                for worker_id in sorted(idle):
+                    while worker_id in idle:
+                        link, wait = schedulers[worker_id].pop_ready()
+                        if link is None:
+                            if wait > 0:
+                                next_wait = min(next_wait, wait)
+                            break
+                        if 'crawl_output' in link:
+                            # Đã cào xong, chỉ cần gọi lại LLM nên không gửi sang process con
+                            finish(worker_id, link, link['crawl_output'], None)
+                            continue
+                        wait = 0 if self.offline else self.circuit_breaker.retry_in(link_domain(link))
+                        if wait > 0 and self.circuit_breaker.defer(link):
+                            schedulers[worker_id].push(link, wait, needs_token=needs_token)
+                            continue
+                        if wait > 0:
+                            finish(worker_id, link, None, CircuitOpenError(link_domain(link)))
+                            continue
+                        self.log_message.emit(f"Đang thu thập dữ liệu từ link {link['index']+1}/{self.total_links}")
+                        pool.submit(worker_id, link)
+                        idle.discard(worker_id)
+
+                result = pool.get_result(timeout=next_wait)
+                if result is None:
+                    continue
 
-                    self.log_message.emit(f"Đã chuyển đổi dữ liệu từ {link['url']} sang JSON")
-                    convert_worker.append_to_csv(llm_output)
-                    successful_crawls += 1
+                worker_id, link, crawl_output, error = result
+                idle.add(worker_id)
+                domain = link_domain(link)
+                if error is None:
+                    rate_limiter.record_success(domain)
+                elif error.category == ERROR_THROTTLED:
+                    backoff = rate_limiter.record_throttled(domain, error.retry_after)
+                    self.log_message.emit(f"{error}, tạm dừng domain {backoff:.0f} giây")
+                finish(worker_id, link, crawl_output, error)
+        finally:
+            pool.close()
+
+        if self.should_stop:
+            self.log_message.emit("Quá trình thu thập đã bị dừng bởi người dùng")
+
+    def process_crawl_output(self, link, crawl_output, error, excel_manager) -> float | None:
+        """
+        Xử lý kết quả cào của một link và chuyển link đã cào được sang LLMStage.
+        Trả về số giây chờ nếu cần cào lại (link được xếp lại cuối hàng đợi),
+        None khi việc cào đã xong (thành công, không đổi, hoặc hết lượt thử và lỗi đã ghi vào Excel).
+        Lỗi ở bước LLM được LLMStage tự thử lại bằng `crawl_output` đã lưu, không cào lại trang.
+        """
+        self.memory_monitor.sample()
+        try:
+            if 'crawl_output' not in link:
+                if error is not None:
+                    raise error
+                self.circuit_breaker.record_success(link_domain(link))
+                if not crawl_output:
+                    raise SelectorMissingError(link['url'])
+                link['crawl_output'] = crawl_output
+                self.log_message.emit(f"Đã thu thập dữ liệu từ {link['url']}")
+
+            digest = crawl_output_hash(link['crawl_output'])
+            if self.change_detector and self.change_detector.is_unchanged(link['url'], digest):
+                excel_manager.update_link(link['index'], True, UNCHANGED_NOTE)
+                self.unchanged_products += 1
+                self.log_message.emit(f"Sản phẩm không thay đổi, bỏ qua chuyển đổi: {link['url']}")
+                return None
+
+            # Chỉ gửi text cho LLM, danh sách ảnh đã bóc tách được ghi thẳng vào CSV
+            link['content_hash'] = digest
+            self.llm_stage.submit(link)
+            return None
 
-                    excel_manager.update_link(link['index'], True)
+        except Exception as e:
+            return self.schedule_retry(link, e, excel_manager)
+
+    def schedule_retry(self, link, error, excel_manager) -> float | None:
+        """Phân loại lỗi, cập nhật circuit breaker và quyết định thời điểm thử lại."""
+        category = classify_error(error)
+        domain = link_domain(link)
+        if category in SITE_DOWN_CATEGORIES and 'crawl_output' not in link:
+            if self.circuit_breaker.record_failure(domain):
+                self.log_message.emit(f"Tạm ngưng truy cập {domain} do lỗi liên tiếp")
+        elif not isinstance(error, CircuitOpenError):
+            # Lỗi không phải site sập (thiếu selector, fatal...) vẫn kết thúc lượt thăm dò,
+            # nếu không domain sẽ bị hoãn mãi
+            self.circuit_breaker.release_probe(domain)
+
+        delay = self.retry_policy.next_delay(link, category)
+        if delay is None:
+            excel_manager.update_link(link['index'], False, str(error))
+            self.log_message.emit(f"Lỗi khi xử lý {link['url']}: {str(error)}")
+            return None
+
+        self.log_message.emit(f"Lỗi {category} tại {link['url']}: {str(error)}. "
+                              f"Thử lại lần {link['attempt']} sau {delay:.0f} giây")
+        return delay
+
+    def filter_valid_links(self, list_of_links) -> list:
+        valid_links = []
+        for link in list_of_links:
+            if link['url'].startswith("http"):
+                valid_links.append(link)
+            else:
+                self.log_message.emit(f"Link thứ {link['index']+1} không hợp lệ: {link['url']}")
+        return valid_links
+
+    def create_rate_limiter(self, crawl_worker) -> DomainRateLimiter:
+        """
+        Token bucket theo domain: tốc độ mặc định là 1 request mỗi `delay` giây,
+        site có thể ghi đè bằng `rate_per_second` trong crawl-config.json.
+        """
+        settings = get_section("rate_limiter")
+        return DomainRateLimiter(
+            rate=1 / max(self.delay, 0.001),
+            burst=settings.get("burst", 1),
+            backoff_seconds=settings.get("backoff_seconds", 30),
+            max_backoff_seconds=settings.get("max_backoff_seconds", 600),
+            recovery_factor=settings.get("recovery_factor", 1.25),
+            rate_for=lambda domain: (crawl_worker.get_site_config_by_domain(domain) or {}).get("rate_per_second"),
+        )
 
-                    # Add delay between requests
-                    self.msleep(self.delay * 1000)
+    def run_concurrent(self, crawl_worker, excel_manager, list_of_links, max_concurrent, max_per_domain,
+                       more_links=None):
+        """Cào song song bằng AsyncCrawlEngine, xử lý kết quả theo thứ tự hoàn thành."""
+        valid_links = self.filter_valid_links(list_of_links)
 
-                except Exception as e:
-                    excel_manager.update_link(link['index'], False, str(e))
-                    self.log_message.emit(f"Lỗi khi xử lý {link['url']}: {str(e)}")
-                    continue
+        self.log_message.emit(f"Đang thu thập song song {len(valid_links)} link (tối đa {max_concurrent} trang cùng lúc)")
+        engine = AsyncCrawlEngine(crawl_worker, self.create_rate_limiter(crawl_worker),
+                                  max_concurrent, max_per_domain, headless=self.headless,
+                                  circuit_breaker=self.circuit_breaker)
+        counters = {"done": len(list_of_links) - len(valid_links)}
 
-            self.progress_updated.emit(100)
+        def on_result(link, crawl_output, error):
+            retry_delay = self.process_crawl_output(link, crawl_output, error, excel_manager)
+            if retry_delay is None:
+                counters["done"] += 1
+                self.emit_progress(counters["done"])
+            return retry_delay
 
-            if self.should_stop:
-                self.finished_crawling.emit(False,
-                                            f"Quá trình bị dừng. Đã thu thập {successful_crawls}/{num_of_links} sản phẩm.")
-            else:
-                self.finished_crawling.emit(True,
-                                            f"Hoàn tất! Đã thu thập {successful_crawls}/{num_of_links} sản phẩm thành công.")
+        engine.run(valid_links, on_result, lambda: self.should_stop, more_links)
 
-        except Exception as e:
-            self.finished_crawling.emit(False, f"Lỗi nghiêm trọng: {str(e)}")
+        if self.should_stop:
+            self.log_message.emit("Quá trình thu thập đã bị dừng bởi người dùng")
 
     def stop(self):
         self.should_stop = True
@@ -183,6 +559,16 @@ class MainWindow(QMainWindow):
         excel_layout.addWidget(self.browse_excel_btn)
         file_layout.addLayout(excel_layout)
 
+        # Sitemap / category discovery
+        discovery_layout = QHBoxLayout()
+        self.discovery_url_edit = QLineEdit()
+        self.discovery_url_edit.setPlaceholderText("(Tuỳ chọn) URL sitemap.xml hoặc trang danh mục để tự tìm link sản phẩm...")
+        self.discovery_url_edit.setToolTip("Link mới được thêm vào file Excel; link đã cào chỉ cào lại khi lastmod trong sitemap mới hơn")
+
+        discovery_layout.addWidget(QLabel("Sitemap:"))
+        discovery_layout.addWidget(self.discovery_url_edit)
+        file_layout.addLayout(discovery_layout)
+
         layout.addWidget(file_group)
 
         # API Configuration Group
@@ -241,7 +627,7 @@ class MainWindow(QMainWindow):
         self.delay_spin.setRange(1, 30)
         self.delay_spin.setValue(2)
         self.delay_spin.setSuffix(" giây")
-        self.delay_spin.setToolTip("Thời gian chờ giữa các yêu cầu để tránh bị chặn")
+        self.delay_spin.setToolTip("Thời gian chờ tối thiểu giữa các yêu cầu tới cùng một website")
 
         # Retry attempts
         self.retry_spin = QSpinBox()
@@ -255,11 +641,17 @@ class MainWindow(QMainWindow):
         self.headless_checkbox.setChecked(True)
         self.headless_checkbox.setToolTip("Chạy trình duyệt ở chế độ ẩn để tăng tốc độ")
 
+        # Offline re-extract mode
+        self.offline_checkbox = QCheckBox("Bóc tách lại từ snapshot")
+        self.offline_checkbox.setChecked(False)
+        self.offline_checkbox.setToolTip("Không tải trang, chỉ bóc tách lại dữ liệu từ snapshot đã lưu (dùng sau khi sửa selector)")
+
         settings_layout.addWidget(QLabel("Độ trễ:"))
         settings_layout.addWidget(self.delay_spin)
         settings_layout.addWidget(QLabel("Thử lại:"))
         settings_layout.addWidget(self.retry_spin)
         settings_layout.addWidget(self.headless_checkbox)
+        settings_layout.addWidget(self.offline_checkbox)
         settings_layout.addStretch()
 
         crawl_layout.addLayout(settings_layout)
@@ -452,7 +844,9 @@ class MainWindow(QMainWindow):
             self.output_folder_edit.text(),
             self.delay_spin.value(),
             self.retry_spin.value(),
-            self.headless_checkbox.isChecked()
+            self.headless_checkbox.isChecked(),
+            self.offline_checkbox.isChecked(),
+            self.discovery_url_edit.text().strip()
         )
 
         # Connect signals
@@ -518,6 +912,10 @@ class MainWindow(QMainWindow):
         self.headless_checkbox.setChecked(
             self.settings.value('headless', True, type=bool)
         )
+        self.offline_checkbox.setChecked(
+            self.settings.value('offline', False, type=bool)
+        )
+        self.discovery_url_edit.setText(self.settings.value('discovery_url', ''))
 
     def save_settings(self):
         # Save current settings
@@ -527,6 +925,8 @@ class MainWindow(QMainWindow):
         self.settings.setValue('delay', self.delay_spin.value())
         self.settings.setValue('retry', self.retry_spin.value())
         self.settings.setValue('headless', self.headless_checkbox.isChecked())
+        self.settings.setValue('offline', self.offline_checkbox.isChecked())
+        self.settings.setValue('discovery_url', self.discovery_url_edit.text())
 
     def closeEvent(self, event):
         # Stop crawling if running